@@ -1,46 +1,1685 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file, Response
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response, g, has_request_context
 import os
+import sys
+import time
 import threading
-import tkinter as tk
-from tkinter import scrolledtext, messagebox, filedialog, ttk
+import queue
+import argparse
+import json
+try:
+    import tkinter as tk
+    from tkinter import scrolledtext, messagebox, filedialog, simpledialog, ttk
+except ImportError:
+    # 无图形环境的服务器上只能以 --headless 方式运行
+    tk = None
 import psutil
 import socket
-from contextlib import closing
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, Counter, OrderedDict
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import ClosingIterator
 import mimetypes
 import uuid
 from datetime import datetime
 import zipfile
 import shutil
+import tempfile
 import re
+import sqlite3
+import bisect
+import struct
+from urllib.parse import quote
+import tarfile
+import zlib
+import bz2
+import lzma
+import errno
+from werkzeug.sansio.multipart import (MultipartDecoder, NeedData, Epilogue,
+                                       Field as MultipartField, File as MultipartFile,
+                                       Data as MultipartData)
+
+# zstd: Python 3.14的compression.zstd、backports.zstd或zstandard，都没有时不能浏览.tar.zst
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# Windows没有fcntl，复制文件时跳过reflink
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# linux/fs.h中的FICLONE: 整个文件的reflink克隆(btrfs、XFS、bcachefs等支持)
+FICLONE = 0x40049409
+
+def clone_file(src, dst):
+    """复制文件内容，返回使用的方式
+    
+    优先reflink(共享数据块，不论文件多大都瞬间完成)，其次copy_file_range(数据不经过用户态，
+    部分文件系统会自动转为reflink或服务器端复制)，都不支持时退回普通复制。
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return 'reflink'
+            except OSError:
+                pass
+        if hasattr(os, 'copy_file_range'):
+            try:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, 1 << 30))
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return 'copy_file_range'
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        return 'copy'
+
+def call_with_timeout(func, timeout, *args, default=None):
+    """在守护线程中调用func，超时或出错时返回default
+    
+    卡在失效网络挂载或DNS上的线程是守护线程，不会阻止进程退出。
+    """
+    result = [default]
+    
+    def run():
+        try:
+            result[0] = func(*args)
+        except Exception:
+            pass
+    
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return result[0] if not thread.is_alive() else default
+
+def probe_partitions(timeout=0.5):
+    """并行探测所有分区，返回 {挂载点: (剩余字节, 设备号, 是否可写)}
+    
+    每个分区一个线程，总共最多等待timeout秒，没有及时响应的分区被跳过。
+    """
+    results = {}
+    
+    def probe(mountpoint):
+        try:
+            usage = psutil.disk_usage(mountpoint)
+            results[mountpoint] = (usage.free, os.stat(mountpoint).st_dev, os.access(mountpoint, os.W_OK))
+        except OSError:
+            pass
+    
+    threads = []
+    for part in psutil.disk_partitions():
+        if 'cdrom' in part.opts or part.fstype == '':
+            continue
+        thread = threading.Thread(target=probe, args=(part.mountpoint,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0, deadline - time.monotonic()))
+    return dict(results)
+
+# 上次运行的配置(保存目录、端口、存储卷等)，启动时优先沿用，省去探测
+CONFIG_PATH = os.path.join(os.path.expanduser('~'), '.wormhole_transfer.json')
+
+def load_config():
+    try:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return config if isinstance(config, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_config(config):
+    try:
+        temp = f"{CONFIG_PATH}.{os.getpid()}.tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        os.replace(temp, CONFIG_PATH)
+    except OSError:
+        pass
+
+class HeadlessEntry:
+    """无界面模式下代替tk.Entry，只保存文本值"""
+
+    def __init__(self, value=''):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def delete(self, first, last=None):
+        self.value = ''
+
+    def insert(self, index, text):
+        self.value = str(text)
+
+class RequestTimings:
+    """可选的请求分阶段计时
+    
+    开启后每个请求记录各阶段耗时(解析、保存、日志等)，通过Server-Timing响应头返回，
+    最近的记录保存在环形缓冲区中供 /debug/timings 查询。
+    """
+
+    def __init__(self, enabled=False, capacity=500):
+        self.enabled = enabled
+        self.records = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def begin(self):
+        if self.enabled:
+            g.timing_start = time.perf_counter()
+            g.timing_phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        if not has_request_context() or 'timing_phases' not in g:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            g.timing_phases[name] = g.timing_phases.get(name, 0) + (time.perf_counter() - start) * 1000
+
+    def finish(self, response):
+        if 'timing_phases' not in g:
+            return response
+        total = (time.perf_counter() - g.timing_start) * 1000
+        phases = dict(g.timing_phases)
+        response.headers['Server-Timing'] = ', '.join(
+            [f"{name};dur={duration:.2f}" for name, duration in phases.items()] + [f"total;dur={total:.2f}"]
+        )
+        with self.lock:
+            self.records.append({
+                'time': datetime.now().isoformat(timespec='milliseconds'),
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round(total, 2),
+                'phases': {name: round(duration, 2) for name, duration in phases.items()}
+            })
+        return response
+
+    def snapshot(self, limit=100):
+        with self.lock:
+            records = list(self.records)
+        
+        # 按路由汇总各阶段的平均耗时
+        summary = {}
+        for record in records:
+            item = summary.setdefault(record['endpoint'] or record['path'], {'count': 0, 'total_ms': 0, 'phases': {}})
+            item['count'] += 1
+            item['total_ms'] += record['total_ms']
+            for name, duration in record['phases'].items():
+                item['phases'][name] = item['phases'].get(name, 0) + duration
+        for item in summary.values():
+            item['avg_total_ms'] = round(item.pop('total_ms') / item['count'], 2)
+            item['avg_phases_ms'] = {name: round(duration / item['count'], 2)
+                                     for name, duration in item.pop('phases').items()}
+        return {'enabled': self.enabled, 'summary': summary, 'records': records[-limit:]}
+
+def sample_stacks(seconds, interval=0.005):
+    """对所有线程做采样分析，返回折叠格式的调用栈计数(可直接生成火焰图)"""
+    counts = Counter()
+    me = threading.get_ident()
+    names = {}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for thread in threading.enumerate():
+            names[thread.ident] = thread.name
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+# 服务器自己的元数据目录(索引数据库等)，放在保存目录内，不出现在文件列表中
+META_DIR = '.wormhole'
+
+class SearchIndex:
+    """保存目录的持久化搜索索引(SQLite)
+    
+    files表记录路径、文件名、MIME类型、大小和修改时间；
+    SQLite支持FTS5 trigram时，路径上建全文索引，任意子串查询都走索引。
+    上传、删除、更新时增量维护，启动时后台全量扫描一次以纳入外部改动。
+    使用存储池时roots包含所有卷，各卷上的文件按相对路径合并索引。
+    dir_sizes表记录每个目录下(递归)的总大小、文件数和子目录数，随files表的
+    每次写入把增量加到所有上级目录，列目录和磁盘占用统计不需要再遍历。
+    """
+
+    BATCH = 1000
+
+    def __init__(self, save_dir, roots=None):
+        self.save_dir = os.path.abspath(save_dir)
+        self.roots = [os.path.abspath(root) for root in roots] if roots else [self.save_dir]
+        meta_dir = os.path.join(self.save_dir, META_DIR)
+        os.makedirs(meta_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(meta_dir, 'index.db'), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.scanning = False
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                is_dir INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                mime TEXT,
+                scan INTEGER NOT NULL DEFAULT 0
+            )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_name ON files(name)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_size ON files(size)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_mtime ON files(mtime)")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS dir_sizes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                files INTEGER NOT NULL,
+                dirs INTEGER NOT NULL
+            )""")
+            # 旧版本建的索引库没有目录汇总，等后台扫描时从files表整体算一次
+            self.sizes_stale = self.conn.execute("PRAGMA user_version").fetchone()[0] < 1
+            self.fts = self._create_fts()
+            self.conn.commit()
+
+    def _create_fts(self):
+        try:
+            self.conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS files_fts
+                USING fts5(path, content='files', content_rowid='id', tokenize='trigram')""")
+        except sqlite3.OperationalError:
+            # 旧版SQLite没有trigram分词器，子串查询退回LIKE全表扫描
+            return False
+        self.conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+                INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+                INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+            END;
+            CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF path ON files BEGIN
+                INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+                INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+            END;
+        """)
+        return True
+
+    def relative(self, path):
+        path = os.path.abspath(path)
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                return os.path.relpath(path, root)
+        return os.path.relpath(path, self.save_dir)
+
+    def _row(self, path, entry=None, scan=0):
+        """由磁盘路径生成一行记录，entry为os.scandir的结果时复用其stat"""
+        rel = self.relative(path)
+        if entry is not None:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            stat = entry.stat(follow_symlinks=False)
+        else:
+            is_dir = os.path.isdir(path)
+            stat = os.stat(path)
+        name = os.path.basename(rel)
+        mime = None if is_dir else mimetypes.guess_type(name)[0]
+        return (rel, name, int(is_dir), 0 if is_dir else stat.st_size, stat.st_mtime, mime, scan)
+
+    def _ancestors(self, rel):
+        """目录汇总的键: 'a/b/c' 的上级目录为 'a/b'、'a' 和保存目录本身('')"""
+        parts = rel.split(os.sep)[:-1]
+        return [os.sep.join(parts[:i]) for i in range(len(parts), -1, -1)]
+
+    def _accumulate(self, deltas, rel, size, files, dirs):
+        for parent in self._ancestors(rel):
+            delta = deltas.setdefault(parent, [0, 0, 0])
+            delta[0] += size
+            delta[1] += files
+            delta[2] += dirs
+
+    def _apply_sizes(self, deltas):
+        self.conn.executemany("""INSERT INTO dir_sizes(path, size, files, dirs) VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET size=size+excluded.size, files=files+excluded.files,
+                dirs=dirs+excluded.dirs""",
+            [(path, size, files, dirs) for path, (size, files, dirs) in deltas.items()
+             if size or files or dirs])
+
+    @staticmethod
+    def _upper(prefix):
+        """前缀范围查询的上界: 末字符的下一个字符
+        
+        SQLite按UTF-8字节比较，和码点顺序一致；以prefix开头的路径都落在[prefix, 上界)内。
+        不能用'\uffff'之类的固定字符，emoji等U+10000以上的字符比它大。
+        """
+        return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+    def _subtree(self, rel):
+        """一个路径连同其下所有条目的 (大小, 文件数, 目录数)"""
+        prefix = rel + os.sep
+        size, files, dirs = self.conn.execute(
+            "SELECT SUM(size), SUM(is_dir = 0), SUM(is_dir) FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+            (rel, prefix, self._upper(prefix))).fetchone()
+        return size or 0, files or 0, dirs or 0
+
+    def _drop(self, rel):
+        """删除一个路径及其下的所有条目，并从上级目录的汇总中减去"""
+        prefix = rel + os.sep
+        size, files, dirs = self._subtree(rel)
+        deltas = {}
+        self._accumulate(deltas, rel, -size, -files, -dirs)
+        self._apply_sizes(deltas)
+        for table in ('files', 'dir_sizes'):
+            self.conn.execute(f"DELETE FROM {table} WHERE path = ? OR (path >= ? AND path < ?)",
+                              (rel, prefix, self._upper(prefix)))
+
+    def _recompute_sizes(self):
+        """由files表整体重算目录汇总"""
+        deltas = {'': [0, 0, 0]}
+        for path, is_dir, size in self.conn.execute("SELECT path, is_dir, size FROM files"):
+            if is_dir:
+                deltas.setdefault(path, [0, 0, 0])
+            self._accumulate(deltas, path, size, 1 - is_dir, is_dir)
+        self.conn.execute("DELETE FROM dir_sizes")
+        self.conn.executemany("INSERT INTO dir_sizes(path, size, files, dirs) VALUES (?, ?, ?, ?)",
+                              [(path, *delta) for path, delta in deltas.items()])
+        self.conn.execute("PRAGMA user_version = 1")
+        self.sizes_stale = False
+
+    def _upsert(self, rows):
+        # 先取出已有记录，按新旧之差更新上级目录的汇总
+        old = {}
+        paths = [row[0] for row in rows]
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            old.update((path, (is_dir, size)) for path, is_dir, size in self.conn.execute(
+                f"SELECT path, is_dir, size FROM files WHERE path IN ({','.join('?' * len(chunk))})", chunk))
+        deltas = {}
+        for path, _, is_dir, size, *_ in rows:
+            old_dir, old_size = old.get(path, (None, 0))
+            files = (not is_dir) - (old_dir == 0)
+            dirs = is_dir - (old_dir == 1)
+            self._accumulate(deltas, path, size - old_size, files, dirs)
+        self._apply_sizes(deltas)
+        self.conn.executemany("""INSERT INTO files(path, name, is_dir, size, mtime, mime, scan)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET name=excluded.name, is_dir=excluded.is_dir, size=excluded.size,
+                mtime=excluded.mtime, mime=excluded.mime, scan=excluded.scan""", rows)
+
+    def _stamp(self):
+        # 每次写入带上时间戳，全量扫描结束时据此清理扫描开始前就已不存在的条目
+        return int(time.time() * 1000)
+
+    def _walk(self, top, scan=0):
+        """递归遍历，按批产出记录；跳过元数据目录"""
+        batch = []
+        stack = [top]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name == META_DIR and current in self.roots:
+                    continue
+                try:
+                    batch.append(self._row(entry.path, entry, scan))
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                except OSError:
+                    continue
+                if len(batch) >= self.BATCH:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def add(self, path):
+        """新增或更新一个文件；目录会连同其内容一起加入"""
+        try:
+            rows = [self._row(path, scan=self._stamp())]
+        except OSError:
+            return
+        with self.lock:
+            self._upsert(rows)
+            self.conn.commit()
+        if rows[0][2]:
+            for batch in self._walk(os.path.abspath(path), self._stamp()):
+                with self.lock:
+                    self._upsert(batch)
+                    self.conn.commit()
+
+    def rename(self, old_path, new_path):
+        """移动后改写路径，目录下的条目一并改名，不需要重新扫描"""
+        old_rel = self.relative(old_path)
+        new_rel = self.relative(new_path)
+        old_prefix = old_rel + os.sep
+        with self.lock:
+            self._drop(new_rel)
+            # 整棵子树的汇总从原来的上级目录移到新的上级目录
+            size, files, dirs = self._subtree(old_rel)
+            deltas = {}
+            self._accumulate(deltas, old_rel, -size, -files, -dirs)
+            self._accumulate(deltas, new_rel, size, files, dirs)
+            self._apply_sizes(deltas)
+            for table in ('files', 'dir_sizes'):
+                self.conn.execute(f"UPDATE {table} SET path = ? || substr(path, ?) WHERE path = ? OR (path >= ? AND path < ?)",
+                                  (new_rel, len(old_rel) + 1, old_rel, old_prefix, self._upper(old_prefix)))
+            try:
+                # 顶层条目的名称、类型可能随改名变化
+                self._upsert([self._row(new_path, scan=self._stamp())])
+            except OSError:
+                pass
+            self.conn.commit()
+    
+    def remove(self, path):
+        """删除一个路径及其下的所有条目"""
+        with self.lock:
+            self._drop(self.relative(path))
+            self.conn.commit()
+
+    def rebuild(self):
+        """全量扫描保存目录，删除磁盘上已不存在的条目"""
+        if self.scanning:
+            return
+        self.scanning = True
+        try:
+            if self.sizes_stale:
+                with self.lock:
+                    self._recompute_sizes()
+                    self.conn.commit()
+            scan = self._stamp()
+            for root in list(self.roots):
+                for batch in self._walk(root, scan):
+                    with self.lock:
+                        self._upsert(batch)
+                        self.conn.commit()
+            with self.lock:
+                deltas = {}
+                for path, is_dir, size in self.conn.execute(
+                        "SELECT path, is_dir, size FROM files WHERE scan < ?", (scan,)).fetchall():
+                    self._accumulate(deltas, path, -size, is_dir - 1, -is_dir)
+                self._apply_sizes(deltas)
+                self.conn.execute("DELETE FROM files WHERE scan < ?", (scan,))
+                self.conn.execute("DELETE FROM dir_sizes WHERE path != '' AND path NOT IN "
+                                  "(SELECT path FROM files WHERE is_dir = 1)")
+                self.conn.commit()
+        finally:
+            self.scanning = False
+
+    def search(self, q=None, prefix=None, glob=None, mime=None, min_size=None, max_size=None,
+               modified_after=None, modified_before=None, is_dir=None, limit=100, offset=0):
+        conditions = []
+        params = []
+        if q:
+            if self.fts and len(q) >= 3:
+                # trigram索引要求查询至少3个字符，短查询退回LIKE
+                conditions.append("id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)")
+                params.append('"' + q.replace('"', '""') + '"')
+            else:
+                conditions.append("path LIKE ? ESCAPE '\\'")
+                params.append('%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if prefix:
+            prefix = os.path.normpath(prefix)
+            conditions.append("path >= ? AND path < ?")
+            params += [prefix, self._upper(prefix)]
+        if glob:
+            conditions.append("name GLOB ?")
+            params.append(glob)
+        if mime:
+            conditions.append("mime LIKE ?")
+            params.append(mime.rstrip('*') + '%')
+        if min_size is not None:
+            conditions.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append("size <= ?")
+            params.append(max_size)
+        if modified_after is not None:
+            conditions.append("mtime >= ?")
+            params.append(modified_after)
+        if modified_before is not None:
+            conditions.append("mtime <= ?")
+            params.append(modified_before)
+        if is_dir is not None:
+            conditions.append("is_dir = ?")
+            params.append(int(is_dir))
+        
+        sql = "SELECT path, name, is_dir, size, mtime, mime FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY path LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{
+            'name': name,
+            'is_dir': bool(directory),
+            'size': size,
+            'modified': mtime,
+            'path': path,
+            'mime': mime_type
+        } for path, name, directory, size, mtime, mime_type in rows]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def dir_sizes(self, paths):
+        """批量取目录汇总，返回 {磁盘路径: {'size', 'files', 'dirs'}}，尚未统计的目录不在结果中"""
+        rels = {}
+        for path in paths:
+            rel = self.relative(path)
+            rels[rel if rel != '.' else ''] = path
+        result = {}
+        keys = list(rels)
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                for rel, size, files, dirs in self.conn.execute(
+                        f"SELECT path, size, files, dirs FROM dir_sizes WHERE path IN ({','.join('?' * len(chunk))})", chunk):
+                    result[rels[rel]] = {'size': size, 'files': files, 'dirs': dirs}
+        return result
+
+    def usage(self, path, limit=20):
+        """du式占用统计: 目录下直接子项(目录按汇总大小)从大到小排列"""
+        rel = self.relative(path)
+        rel = rel if rel != '.' else ''
+        # 保存目录本身没有前缀，范围条件只对子目录生效
+        prefix = rel + os.sep if rel else ''
+        upper = self._upper(prefix) if prefix else ''
+        with self.lock:
+            total = self.conn.execute("SELECT size, files, dirs FROM dir_sizes WHERE path = ?", (rel,)).fetchone()
+            rows = self.conn.execute("""
+                SELECT path, 1, size, files FROM dir_sizes
+                    WHERE (? = '' OR path >= ? AND path < ?) AND path != '' AND instr(substr(path, ?), ?) = 0
+                UNION ALL
+                SELECT path, 0, size, 1 FROM files
+                    WHERE (? = '' OR path >= ? AND path < ?) AND is_dir = 0 AND instr(substr(path, ?), ?) = 0
+                ORDER BY 3 DESC LIMIT ?""",
+                (prefix, prefix, upper, len(prefix) + 1, os.sep,
+                 prefix, prefix, upper, len(prefix) + 1, os.sep, limit)).fetchall()
+        return {
+            'path': rel,
+            'size': total[0] if total else 0,
+            'files': total[1] if total else 0,
+            'dirs': total[2] if total else 0,
+            'complete': not (self.scanning or self.sizes_stale),
+            'items': [{'path': item, 'name': os.path.basename(item), 'is_dir': bool(directory),
+                       'size': size, 'files': files} for item, directory, size, files in rows]
+        }
+
+class StorageFullError(Exception):
+    """存储池中没有任何卷放得下要写入的数据"""
+
+class StoragePool:
+    """跨多个磁盘卷的存储池
+    
+    保存目录是主卷，附加卷一般是其它磁盘上的server_data目录。各卷下相同的相对路径
+    合并成一个命名空间: 文件以卷顺序中先找到的为准，目录内容取各卷的并集。
+    新数据按放置策略选卷: most-free 剩余空间最多; round-robin 轮流写入各卷;
+    size-class 小文件留在主卷，大文件放到剩余空间最多的附加卷。
+    """
+
+    POLICIES = ('most-free', 'round-robin', 'size-class')
+
+    def __init__(self, volumes=None, policy='most-free', reserve=512 * 1024 * 1024,
+                 small_file_size=64 * 1024 * 1024):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的放置策略: {policy}")
+        self.policy = policy
+        # 每个卷至少保留的空间，避免把系统盘写满
+        self.reserve = reserve
+        self.small_file_size = small_file_size
+        self.lock = threading.Lock()
+        # 正在上传、尚未写完的数据按卷记账，并发上传时不会都挤到同一块快满的盘
+        self.pending = Counter()
+        self.counter = 0
+        self.rebalancing = False
+        self.extra = []
+        self.set_volumes(volumes or [])
+
+    def set_volumes(self, volumes):
+        extra = []
+        for volume in volumes:
+            volume = os.path.abspath(volume)
+            os.makedirs(volume, exist_ok=True)
+            if volume not in extra:
+                extra.append(volume)
+        self.extra = extra
+
+    def volumes(self, save_dir):
+        primary = os.path.abspath(save_dir)
+        return [primary] + [v for v in self.extra if v != primary]
+
+    def _copies(self, path, save_dir):
+        """命名空间路径在各卷上对应的实际路径"""
+        volumes = self.volumes(save_dir)
+        rel = os.path.relpath(os.path.abspath(path), volumes[0])
+        if rel == '.':
+            return volumes
+        return [os.path.join(volume, rel) for volume in volumes]
+
+    def locate(self, path, save_dir):
+        """返回命名空间路径实际所在的位置，都不存在时原样返回"""
+        for candidate in self._copies(path, save_dir):
+            if os.path.lexists(candidate):
+                return candidate
+        return os.path.abspath(path)
+
+    def exists(self, path, save_dir):
+        return any(os.path.lexists(candidate) for candidate in self._copies(path, save_dir))
+
+    def destination(self, path, volume, save_dir):
+        """写入目标: 已存在时就地覆盖，否则放到选定的卷上"""
+        for candidate in self._copies(path, save_dir):
+            if os.path.lexists(candidate):
+                return candidate
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(save_dir))
+        return os.path.join(volume, rel)
+
+    def listdir(self, path, save_dir):
+        """合并各卷上同一目录的内容，返回 {名称: 实际路径}"""
+        items = {}
+        found = False
+        volumes = self.volumes(save_dir)
+        for candidate in self._copies(path, save_dir):
+            try:
+                names = os.listdir(candidate)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            found = True
+            at_root = candidate in volumes
+            for name in names:
+                if at_root and name == META_DIR:
+                    continue
+                items.setdefault(name, os.path.join(candidate, name))
+        if not found:
+            raise FileNotFoundError(path)
+        return items
+
+    def walk(self, path, save_dir):
+        """遍历各卷上同一目录下的所有文件，产出 (实际路径, 相对该目录的路径)"""
+        seen = set()
+        volumes = self.volumes(save_dir)
+        for top in self._copies(path, save_dir):
+            for root, dirs, files in os.walk(top):
+                if root in volumes:
+                    dirs[:] = [d for d in dirs if d != META_DIR]
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    rel = os.path.relpath(file_path, top)
+                    if rel not in seen:
+                        seen.add(rel)
+                        yield file_path, rel
+
+    def trash(self, path, save_dir):
+        """把各卷上的副本移入该卷的回收目录，返回回收目录中的路径
+        
+        同一文件系统内只是一次改名，耗时与目录大小无关，真正的删除由后台任务完成。
+        """
+        moved = []
+        for volume, candidate in zip(self.volumes(save_dir), self._copies(path, save_dir)):
+            if candidate == volume or not os.path.lexists(candidate):
+                continue
+            trash_dir = os.path.join(volume, META_DIR, 'trash')
+            os.makedirs(trash_dir, exist_ok=True)
+            target = os.path.join(trash_dir, f"{uuid.uuid4().hex}_{os.path.basename(candidate)}")
+            os.replace(candidate, target)
+            moved.append(target)
+        return moved
+
+    def move(self, src, dst, save_dir):
+        """在每个卷内把src改名为dst，不复制数据，返回移动后的实际路径"""
+        volumes = self.volumes(save_dir)
+        src_rel = os.path.relpath(os.path.abspath(src), volumes[0])
+        dst_rel = os.path.relpath(os.path.abspath(dst), volumes[0])
+        moved = []
+        for volume in volumes:
+            part = os.path.join(volume, src_rel)
+            if os.path.lexists(part):
+                target = os.path.join(volume, dst_rel)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.rename(part, target)
+                moved.append(target)
+        return moved
+
+    def parts(self, path, save_dir):
+        """命名空间路径在各卷上实际存在的副本: [(卷, 实际路径)]"""
+        return [(volume, candidate) for volume, candidate in zip(self.volumes(save_dir), self._copies(path, save_dir))
+                if os.path.lexists(candidate)]
+
+    def trash_entries(self, save_dir):
+        """各卷回收目录中尚未清理的条目"""
+        entries = []
+        for volume in self.volumes(save_dir):
+            trash_dir = os.path.join(volume, META_DIR, 'trash')
+            if os.path.isdir(trash_dir):
+                entries += [os.path.join(trash_dir, name) for name in os.listdir(trash_dir)]
+        return entries
+
+    def place(self, save_dir, size):
+        """按放置策略为size字节的新数据选卷，并记入待写入量；用完后调用release"""
+        with self.lock:
+            candidates = []
+            for volume in self.volumes(save_dir):
+                try:
+                    free = psutil.disk_usage(volume).free - self.pending[volume] - self.reserve
+                except OSError:
+                    continue
+                if free >= size:
+                    candidates.append((volume, free))
+            if not candidates:
+                raise StorageFullError(f"存储池中没有卷能放下 {size/1024/1024:.2f}MB 的数据")
+            
+            primary = os.path.abspath(save_dir)
+            if self.policy == 'round-robin':
+                volume = candidates[self.counter % len(candidates)][0]
+                self.counter += 1
+            elif self.policy == 'size-class' and size < self.small_file_size and candidates[0][0] == primary:
+                volume = primary
+            elif self.policy == 'size-class':
+                others = [c for c in candidates if c[0] != primary] or candidates
+                volume = max(others, key=lambda c: c[1])[0]
+            else:
+                volume = max(candidates, key=lambda c: c[1])[0]
+            self.pending[volume] += size
+            return volume
+
+    def release(self, volume, size):
+        with self.lock:
+            self.pending[volume] -= size
+            if self.pending[volume] <= 0:
+                del self.pending[volume]
+
+    def usage(self, save_dir):
+        result = []
+        for volume in self.volumes(save_dir):
+            try:
+                usage = psutil.disk_usage(volume)
+            except OSError:
+                continue
+            result.append({
+                'path': volume,
+                'total': usage.total,
+                'used': usage.used,
+                'free': usage.free,
+                'percent': usage.percent,
+                'pending': self.pending[volume]
+            })
+        return result
+
+    def rebalance(self, save_dir, threshold=5.0, log=print):
+        """把文件从使用率最高的卷搬到最低的卷，直到两者相差不超过threshold个百分点"""
+        if self.rebalancing:
+            return 0
+        self.rebalancing = True
+        moved = 0
+        try:
+            while True:
+                stats = {}
+                for volume in self.volumes(save_dir):
+                    try:
+                        # 同一文件系统上的多个卷只算一个，互相搬运没有意义
+                        stats.setdefault(os.stat(volume).st_dev, (volume, psutil.disk_usage(volume)))
+                    except OSError:
+                        continue
+                if len(stats) < 2:
+                    break
+                source, source_usage = max(stats.values(), key=lambda s: s[1].percent)
+                target, target_usage = min(stats.values(), key=lambda s: s[1].percent)
+                if source_usage.percent - target_usage.percent <= threshold:
+                    break
+                
+                # 搬一半差距对应的字节数，两边使用率大致拉平
+                gap = (source_usage.percent - target_usage.percent) / 100 / 2
+                budget = min(gap * source_usage.total, target_usage.free - self.reserve)
+                batch = 0
+                for file_path, size in self._movable(source, budget):
+                    if self._move(file_path, source, target):
+                        batch += 1
+                        budget -= size
+                        if budget <= 0:
+                            break
+                if not batch:
+                    break
+                moved += batch
+                log(f"存储池均衡: 从 {source} 移动 {batch} 个文件到 {target}")
+        finally:
+            self.rebalancing = False
+        return moved
+
+    def _movable(self, volume, budget):
+        """卷上可以搬走的文件，从大到小；跳过元数据和最近还在修改的文件"""
+        files = []
+        now = time.time()
+        for root, dirs, names in os.walk(volume):
+            if root == volume:
+                dirs[:] = [d for d in dirs if d != META_DIR]
+            for name in names:
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                if stat.st_size <= budget and now - stat.st_mtime > 60:
+                    files.append((file_path, stat.st_size))
+        files.sort(key=lambda f: -f[1])
+        return files
+
+    def _move(self, file_path, source, target):
+        """复制到目标卷后原子改名，确认源文件未被改动再删除源文件"""
+        rel = os.path.relpath(file_path, source)
+        dst = os.path.join(target, rel)
+        if os.path.lexists(dst):
+            return False
+        temp_dir = os.path.join(target, META_DIR, 'uploads')
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, f"rebalance_{uuid.uuid4().hex}.part")
+        try:
+            before = os.stat(file_path)
+            shutil.copy2(file_path, temp_path)
+            after = os.stat(file_path)
+            if (before.st_size, before.st_mtime) != (after.st_size, after.st_mtime):
+                os.remove(temp_path)
+                return False
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(temp_path, dst)
+            os.remove(file_path)
+            return True
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+# 可以直接浏览的压缩包格式: 扩展名 -> (容器, 压缩算法)
+ARCHIVE_FORMATS = [
+    ('.zip', ('zip', None)),
+    ('.tar', ('tar', None)),
+    ('.tar.gz', ('tar', 'gz')),
+    ('.tgz', ('tar', 'gz')),
+    ('.tar.bz2', ('tar', 'bz2')),
+    ('.tbz2', ('tar', 'bz2')),
+    ('.tar.xz', ('tar', 'xz')),
+    ('.txz', ('tar', 'xz')),
+    ('.tar.zst', ('tar', 'zst')),
+    ('.tzst', ('tar', 'zst')),
+]
+
+def archive_format(path):
+    """按扩展名识别压缩包，返回 (容器, 压缩算法)，不支持时返回None"""
+    name = path.lower()
+    for suffix, fmt in ARCHIVE_FORMATS:
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+def archive_decompressor(codec):
+    if codec == 'gz':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if codec == 'bz2':
+        return bz2.BZ2Decompressor()
+    if codec == 'xz':
+        return lzma.LZMADecompressor()
+    if codec == 'zst':
+        if zstd is not None:
+            return zstd.ZstdDecompressor()
+        if zstandard is not None:
+            return zstandard.ZstdDecompressor().decompressobj()
+        raise ValueError("没有可用的zstd模块(需要Python 3.14、backports.zstd或zstandard)")
+    raise ValueError(f"不支持的压缩算法: {codec}")
+
+class DecompressedStream:
+    """压缩流的只读顺序读取器，可以从检查点继续解压
+    
+    建索引时顺序读完整个流，每隔span字节(解压后)记一个检查点: 输入位置、输出位置和
+    解压器状态的副本。gzip的状态可以复制；bz2/xz/zst只能在流或帧的边界处用新解压器重新开始。
+    """
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, raw, codec, start=None, span=None):
+        self.raw = raw
+        self.codec = codec
+        self.span = span
+        self.checkpoints = []
+        in_pos, out_pos, state = start or (0, 0, None)
+        raw.seek(in_pos)
+        self.in_pos = in_pos
+        # buffer[buffer_pos]在解压后数据中的偏移
+        self.out_pos = out_pos
+        self.decomp = state.copy() if state is not None else None
+        self.buffer = b''
+        self.buffer_pos = 0
+        self.done = False
+
+    def _checkpoint(self, in_pos, out_pos, decomp):
+        if self.span is None:
+            return
+        if self.checkpoints and out_pos - self.checkpoints[-1][1] < self.span:
+            return
+        self.checkpoints.append((in_pos, out_pos, decomp.copy() if decomp is not None else None))
+
+    def _fill(self):
+        data = self.raw.read(self.CHUNK)
+        if not data:
+            self.done = True
+            return
+        self.in_pos += len(data)
+        out = [self.buffer[self.buffer_pos:]]
+        out_end = self.out_pos + len(out[0])
+        while data:
+            if self.decomp is None:
+                if not data.strip(b'\0'):
+                    break  # 末尾的填充字节
+                # 流或帧的边界: 从这里可以用新的解压器开始
+                self._checkpoint(self.in_pos - len(data), out_end, None)
+                self.decomp = archive_decompressor(self.codec)
+            chunk = self.decomp.decompress(data)
+            out.append(chunk)
+            out_end += len(chunk)
+            if self.decomp.eof:
+                data = self.decomp.unused_data
+                self.decomp = None
+            else:
+                data = b''
+        self.buffer = b''.join(out)
+        self.buffer_pos = 0
+        if self.decomp is not None and hasattr(self.decomp, 'copy'):
+            self._checkpoint(self.in_pos, out_end, self.decomp)
+
+    def read(self, size=-1):
+        while (size < 0 or len(self.buffer) - self.buffer_pos < size) and not self.done:
+            self._fill()
+        if size < 0:
+            size = len(self.buffer) - self.buffer_pos
+        data = self.buffer[self.buffer_pos:self.buffer_pos + size]
+        self.buffer_pos += len(data)
+        self.out_pos += len(data)
+        return data
+
+    def skip(self, size):
+        while size > 0:
+            data = self.read(min(size, 1024 * 1024))
+            if not data:
+                break
+            size -= len(data)
+
+    def tell(self):
+        return self.out_pos
+
+class ArchiveIndex:
+    """一个压缩包的成员索引
+    
+    zip读取中央目录；tar记录每个成员数据在(解压后)流中的偏移，压缩的tar同时保存检查点。
+    读取单个成员时直接定位: zip和未压缩tar只读该成员的字节，压缩tar从最近的检查点开始解压。
+    """
+
+    SPAN = 32 * 1024 * 1024
+
+    def __init__(self, path, container, codec):
+        self.path = path
+        self.container = container
+        self.codec = codec
+        self.members = {}
+        self.zip_infos = {}
+        self.checkpoints = []
+        self.checkpoint_offsets = []
+
+    @property
+    def format(self):
+        return self.container if self.codec is None else f"{self.container}.{self.codec}"
+
+    def build(self, job=None):
+        if self.container == 'zip':
+            with zipfile.ZipFile(self.path) as zf:
+                for info in zf.infolist():
+                    name = info.filename.rstrip('/')
+                    self.zip_infos[name] = info
+                    self.members[name] = {
+                        'name': name,
+                        'is_dir': info.is_dir(),
+                        'size': info.file_size,
+                        'compressed_size': info.compress_size,
+                        'modified': time.mktime(info.date_time + (0, 0, -1))
+                    }
+        elif self.codec is None:
+            # 未压缩的tar可以跳着读成员头，不需要读数据
+            with tarfile.open(self.path, 'r:') as tf:
+                for info in tf:
+                    self._add_tar_member(info)
+        else:
+            with open(self.path, 'rb') as raw:
+                if job is not None:
+                    job.total = os.path.getsize(self.path)
+                stream = DecompressedStream(raw, self.codec, span=self.SPAN)
+                with tarfile.open(fileobj=stream, mode='r|') as tf:
+                    for info in tf:
+                        self._add_tar_member(info)
+                        if job is not None:
+                            job.advance(raw.tell() - job.done)
+                self.checkpoints = stream.checkpoints
+                self.checkpoint_offsets = [checkpoint[1] for checkpoint in self.checkpoints]
+
+    def _add_tar_member(self, info):
+        if not (info.isreg() or info.isdir()):
+            return
+        name = info.name.rstrip('/')
+        self.members[name] = {
+            'name': name,
+            'is_dir': info.isdir(),
+            'size': info.size if info.isreg() else 0,
+            'modified': info.mtime,
+            'offset': info.offset_data
+        }
+
+    def list(self, prefix='', limit=1000, offset=0):
+        items = [member for name, member in self.members.items() if name.startswith(prefix)]
+        return items[offset:offset + limit], len(items)
+
+    def iter_member(self, name, chunk_size=1024 * 1024):
+        """逐块产出一个成员的内容"""
+        member = self.members[name]
+        if self.container == 'zip':
+            with self._open_zip_member(self.zip_infos[name]) as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            return
+        
+        remaining = member['size']
+        with open(self.path, 'rb') as raw:
+            if self.codec is None:
+                raw.seek(member['offset'])
+                stream = raw
+            else:
+                checkpoint = self.checkpoints[bisect.bisect_right(self.checkpoint_offsets, member['offset']) - 1]
+                stream = DecompressedStream(raw, self.codec, start=checkpoint)
+                stream.skip(member['offset'] - checkpoint[1])
+            while remaining > 0:
+                chunk = stream.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def _open_zip_member(self, info):
+        """用缓存的ZipInfo直接定位成员数据，不再读取中央目录"""
+        f = open(self.path, 'rb')
+        try:
+            f.seek(info.header_offset)
+            header = struct.unpack(zipfile.structFileHeader, f.read(zipfile.sizeFileHeader))
+            # 跳过本地文件头中的文件名和扩展字段
+            f.seek(header[10] + header[11], 1)
+            return zipfile.ZipExtFile(f, 'r', info, None, True)
+        except BaseException:
+            f.close()
+            raise
+
+class ArchiveCache:
+    """按路径缓存压缩包索引(LRU)，文件大小或修改时间变化后重建"""
+
+    def __init__(self, capacity=16):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        # 正在后台建立索引的压缩包 -> 任务
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def key(self, path):
+        stat = os.stat(path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def get(self, path):
+        key = self.key(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                return entry[1]
+        return None
+
+    def put(self, path, key, index):
+        with self.lock:
+            self.entries[path] = (key, index)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+class LineIndex:
+    """文本文件的稀疏行偏移索引
+    
+    每读过约BLOCK字节在行首记一个检查点(行号, 字节偏移)，按行号读取时从最近的
+    检查点往后数行，不需要把整个文件读进内存。索引只在需要时往后扩展，日志文件
+    追加内容后接着上次的位置继续；文件被截断、替换或改写时从头重建。
+    """
+
+    BLOCK = 1024 * 1024
+    # 记住索引末尾前的一小段内容，用来发现文件被原地改写
+    FINGERPRINT = 64
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.identity = None
+        self.marks = [0]
+        self.offsets = [0]
+        # 已索引的完整行数，以及这些行结束的位置
+        self.lines = 0
+        self.end = 0
+        self.fingerprint = b''
+        # 上次扫描到文件末尾时的文件大小，大小不变时总行数仍然有效
+        self.complete = None
+
+    def _check(self, f):
+        """文件被替换、截断或改写过时丢弃索引"""
+        stat = os.fstat(f.fileno())
+        identity = (stat.st_dev, stat.st_ino)
+        if identity != self.identity or stat.st_size < self.end:
+            self.reset()
+        elif self.fingerprint:
+            f.seek(self.end - len(self.fingerprint))
+            if f.read(len(self.fingerprint)) != self.fingerprint:
+                self.reset()
+        self.identity = identity
+        return stat.st_size
+
+    def _extend(self, f, until_line=None):
+        """从已索引的位置往后扫描，直到覆盖until_line；扫描到文件末尾时返回True"""
+        f.seek(self.end)
+        finished = False
+        while until_line is None or self.lines <= until_line:
+            data = f.read(self.BLOCK)
+            cut = data.rfind(b'\n')
+            # 超长的行: 继续读到出现换行为止
+            while data and cut < 0:
+                more = f.read(self.BLOCK)
+                if not more:
+                    break
+                found = more.rfind(b'\n')
+                if found >= 0:
+                    cut = len(data) + found
+                data += more
+            if cut < 0:
+                # 末尾不完整的一行留到文件增长后再索引
+                finished = True
+                break
+            self.lines += data.count(b'\n', 0, cut + 1)
+            self.end += cut + 1
+            self.marks.append(self.lines)
+            self.offsets.append(self.end)
+            f.seek(self.end)
+        if self.end:
+            f.seek(max(0, self.end - self.FINGERPRINT))
+            self.fingerprint = f.read(self.end - f.tell())
+        return finished
+
+    def read_window(self, start, count, max_bytes=None):
+        """读取从第start行(从0开始)起最多count行的原始字节
+        
+        返回 (数据, 起始偏移, 文件大小, 总行数)，总行数只有扫描到文件末尾时才知道，
+        否则为None。给出max_bytes时读够这么多字节就停在行尾。
+        """
+        with open(self.path, 'rb') as f:
+            with self.lock:
+                size = self._check(f)
+                if self._extend(f, until_line=start + count):
+                    self.complete = size
+                slot = bisect.bisect_right(self.marks, start) - 1
+                mark, offset = self.marks[slot], self.offsets[slot]
+                # 没有换行结尾的最后一行也算一行
+                total = self.lines + (self.end < size) if self.complete == size else None
+            f.seek(offset)
+            for _ in range(start - mark):
+                if not f.readline():
+                    break
+            begin = f.tell()
+            chunks = []
+            length = 0
+            for _ in range(count):
+                line = f.readline()
+                if not line:
+                    break
+                chunks.append(line)
+                length += len(line)
+                if max_bytes is not None and length >= max_bytes:
+                    break
+        return b''.join(chunks), begin, size, total
+
+    def read_lines(self, start, count):
+        """读取从第start行起的count行，返回 (行列表, 文件大小, 总行数)"""
+        data, _, size, total = self.read_window(start, count)
+        lines = data.split(b'\n')
+        if lines[-1] == b'':
+            lines.pop()
+        return [line.rstrip(b'\r').decode('utf-8', errors='replace') for line in lines], size, total
+
+    def read_bytes(self, offset, length):
+        """从字节偏移读取一段文本，结尾对齐到行尾，返回 (文本, 下一段偏移, 文件大小)"""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            data = f.read(length)
+        cut = data.rfind(b'\n')
+        if cut >= 0 and offset + len(data) < size:
+            data = data[:cut + 1]
+        return data.decode('utf-8', errors='replace'), offset + len(data), size
+
+    def tail(self, count):
+        """从文件末尾往前读出最后count行，返回 (行列表, 第一行的字节偏移, 文件大小)"""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            position = size
+            data = b''
+            while position > 0:
+                step = min(65536, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+                # 凑够count个换行即可
+                if data.count(b'\n', 0, len(data) - 1) >= count:
+                    break
+        # 末尾的换行不算分隔，取最后count段
+        body = data[:-1] if data.endswith(b'\n') else data
+        pieces = body.split(b'\n')[-count:] if count and data else []
+        start = position + len(body) - (sum(map(len, pieces)) + len(pieces) - 1) if pieces else size
+        return [piece.rstrip(b'\r').decode('utf-8', errors='replace') for piece in pieces], start, size
+
+class LineIndexCache:
+    """按路径缓存文本文件的行索引(LRU)，索引自身负责发现文件变化"""
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            index = self.entries.get(path)
+            if index is None:
+                index = self.entries[path] = LineIndex(path)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            return index
+
+class JobCancelled(Exception):
+    """后台任务被取消"""
+
+class Job:
+    """一个后台任务的状态、进度和结果"""
+
+    def __init__(self, kind, description=''):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.description = description
+        self.status = 'queued'
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # 任务产生的文件(如打包好的zip)，通过 /jobs/<id>/result 下载
+        self.output = None
+        # 任务产生的临时文件，任务失败、取消或过期时删除
+        self.temp_files = []
+        self.cancel_event = threading.Event()
+        self.finished_event = threading.Event()
+
+    def advance(self, count=1):
+        """推进进度；任务已被取消时抛出JobCancelled，由任务函数的调用栈一路退出"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+        self.done += count
+
+    def wait(self, timeout=None):
+        return self.finished_event.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'description': self.description,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'progress': round(self.done / self.total, 4) if self.total else None,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+class JobManager:
+    """后台任务队列
+    
+    目录打包、解压、回收站清理等耗时操作交给固定大小的线程池执行，请求线程只负责提交，
+    通过任务ID查询进度、取消任务或取回结果。结束超过ttl秒的任务连同临时文件一起清理。
+    同步请求用inline=True在请求线程中直接执行，不会排在线程池里等待其他任务。
+    """
+
+    def __init__(self, workers=4, ttl=3600, log=print):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.ttl = ttl
+        self.log = log
+        threading.Thread(target=self._reap, daemon=True).start()
+
+    def submit(self, kind, func, *args, description='', inline=False):
+        """提交任务，func(job, *args)的返回值作为任务结果
+        
+        inline为True时在调用线程中执行完再返回，任务同样可以通过ID查询进度和取消。
+        """
+        job = Job(kind, description)
+        with self.lock:
+            self.jobs[job.id] = job
+        if inline:
+            self._run(job, func, args)
+        else:
+            self.executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        if job.cancel_event.is_set():
+            job.status = 'cancelled'
+        else:
+            job.status = 'running'
+            job.started = time.time()
+            try:
+                job.result = func(job, *args)
+                job.status = 'done'
+            except JobCancelled:
+                job.status = 'cancelled'
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+                self.log(f"后台任务失败 [{job.kind}] {job.description}: {str(e)}")
+        job.finished = time.time()
+        if job.status != 'done':
+            self._remove_temp_files(job)
+        job.finished_event.set()
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def snapshot(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created, reverse=True)]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+        return job
+
+    def discard(self, job):
+        """结果已取走，立即删除临时文件并忘掉任务"""
+        self._remove_temp_files(job)
+        with self.lock:
+            self.jobs.pop(job.id, None)
+
+    def _remove_temp_files(self, job):
+        for path in job.temp_files:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                self.log(f"删除临时文件失败: {str(e)}")
+        job.temp_files = []
+
+    def prune(self):
+        now = time.time()
+        with self.lock:
+            expired = [job for job in self.jobs.values()
+                       if job.finished is not None and now - job.finished > self.ttl]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            self._remove_temp_files(job)
+
+    def _reap(self):
+        while True:
+            time.sleep(60)
+            self.prune()
+
+class UploadedPart:
+    """流式解析出的文件部分，已写入保存目录下的临时文件"""
+
+    def __init__(self, filename, temp_path, size):
+        self.filename = filename
+        self.temp_path = temp_path
+        self.size = size
+
+    def save(self, dst):
+        # 临时文件与目标在同一文件系统，原子改名即可，不再复制数据
+        os.replace(self.temp_path, dst)
+        self.temp_path = None
+
+class StreamingMultipartUpload:
+    """边接收边解析multipart上传请求
+    
+    request.files会先把文件写到系统临时目录，file.save再复制一遍到保存目录。
+    这里直接把文件部分写入保存目录下 .wormhole/uploads 中预分配好空间的临时文件，
+    普通字段保存在内存中，与request.form/request.files用法保持一致。
+    """
+
+    def __init__(self, temp_dir, chunk_size=1024 * 1024, max_field_size=16 * 1024 * 1024):
+        self.temp_dir = temp_dir
+        self.chunk_size = chunk_size
+        self.max_field_size = max_field_size
+        self.form = {}
+        self.files = {}
+
+    def _open_part(self, remaining):
+        os.makedirs(self.temp_dir, exist_ok=True)
+        # 不用mkstemp(固定0600权限)，让最终文件权限和普通保存一样遵循umask
+        temp_path = os.path.join(self.temp_dir, f"upload_{uuid.uuid4().hex}.part")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        if remaining and hasattr(os, 'posix_fallocate'):
+            # 按请求体剩余长度预分配，减少碎片并尽早发现空间不足
+            try:
+                os.posix_fallocate(fd, 0, remaining)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    os.close(fd)
+                    os.remove(temp_path)
+                    raise
+        return os.fdopen(fd, 'wb'), temp_path
+
+    def parse(self, stream, boundary, content_length=None):
+        decoder = MultipartDecoder(boundary.encode('latin-1'), self.max_field_size)
+        consumed = 0
+        current = None
+        field_data = []
+        out = None
+        finished = False
+        try:
+            while not finished:
+                chunk = stream.read(self.chunk_size)
+                if chunk:
+                    consumed += len(chunk)
+                    decoder.receive_data(chunk)
+                else:
+                    decoder.receive_data(None)
+                while True:
+                    event = decoder.next_event()
+                    if isinstance(event, NeedData):
+                        if not chunk:
+                            raise ValueError('上传数据不完整')
+                        break
+                    if isinstance(event, Epilogue):
+                        finished = True
+                        break
+                    if isinstance(event, MultipartFile):
+                        current = event
+                        remaining = content_length - consumed + self.chunk_size if content_length else 0
+                        out, temp_path = self._open_part(max(remaining, 0))
+                        part = UploadedPart(event.filename or '', temp_path, 0)
+                        self.files.setdefault(event.name, part)
+                    elif isinstance(event, MultipartField):
+                        current = event
+                        field_data = []
+                    elif isinstance(event, MultipartData):
+                        if isinstance(current, MultipartFile):
+                            out.write(event.data)
+                            part.size += len(event.data)
+                            if not event.more_data:
+                                # 去掉预分配多出来的部分
+                                out.truncate(part.size)
+                                out.close()
+                                out = None
+                        else:
+                            field_data.append(event.data)
+                            if not event.more_data:
+                                self.form.setdefault(current.name, b''.join(field_data).decode('utf-8', 'replace'))
+        except BaseException:
+            if out is not None:
+                out.close()
+            self.discard()
+            raise
+        return self.form, self.files
+
+    def discard(self):
+        """删除没有被移动到最终位置的临时文件"""
+        for part in self.files.values():
+            if part.temp_path and os.path.exists(part.temp_path):
+                os.remove(part.temp_path)
+            part.temp_path = None
 
 class FileServerApp:
-    def __init__(self, root):
+    # 文件树每次插入的条目数
+    TREE_PAGE = 500
+    # 编辑器每页最多的行数和字节数
+    EDIT_PAGE_LINES = 5000
+    EDIT_PAGE_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, root, save_dir=None, host=None, port=None, timing=False,
+                 volumes=None, placement=None):
         self.root = root
-        self.root.title("虫洞穿透传输器")
-        
-        # 先创建界面元素
-        self.create_widgets()
-        
-        # 然后获取磁盘信息并选择最佳保存路径
-        self.best_disk = self.select_best_disk()
-        self.default_save_dir = os.path.join(self.best_disk, "server_data")
-        self.dir_entry.delete(0, tk.END)  # 清空原有内容
+        # 命令行没有指定的设置沿用上次运行的配置
+        self.config = load_config()
+        # 请求分阶段计时，默认关闭
+        self.timings = RequestTimings(enabled=timing)
+        # 存储池: 保存目录为主卷，附加卷在后面确定保存目录后设置
+        self.storage = StoragePool(policy=placement or 'most-free')
+        # 打包、解压、删除等耗时操作在后台任务中执行
+        self.jobs = JobManager(log=self.log_message)
+        # 压缩包成员索引，浏览压缩包时按需建立
+        self.archives = ArchiveCache()
+        self.line_indexes = LineIndexCache()
+        # 每个保存目录一个搜索索引，保存目录可在界面中切换
+        self.search_indexes = {}
+        self.search_lock = threading.Lock()
+        # root为None时无界面运行(命令行部署、压测)，界面输入框换成只保存值的占位对象
+        self.headless = root is None
+        
+        if self.headless:
+            self.host_entry = HeadlessEntry()
+            self.port_entry = HeadlessEntry()
+            self.dir_entry = HeadlessEntry()
+            self.download_entry = HeadlessEntry()
+        else:
+            self.root.title("虫洞穿透传输器")
+            # 后台线程不能直接操作Tk控件，界面更新通过队列交给主线程执行
+            self.ui_queue = queue.Queue()
+            # 文件树: 刷新时递增的代数，以及各节点下尚未插入的条目
+            self.tree_generation = 0
+            self.tree_pending = {}
+            # 先创建界面元素
+            self.create_widgets()
+            self.root.after(50, self.process_ui_queue)
+        
+        # 然后获取磁盘信息并选择最佳保存路径；上次的保存目录仍然可用时不再探测磁盘
+        cached_dir = self.config.get('save_dir')
+        if save_dir:
+            self.default_save_dir = os.path.abspath(save_dir)
+        elif cached_dir and self.usable_directory(cached_dir):
+            self.default_save_dir = cached_dir
+        else:
+            self.best_disk = self.select_best_disk()
+            self.default_save_dir = os.path.join(self.best_disk, "server_data")
+        self.dir_entry.delete(0, 'end')  # 清空原有内容
         self.dir_entry.insert(0, self.default_save_dir)  # 设置默认路径
         
-        # 获取本机IP地址并设置到界面
-        self.local_ip = self.get_local_ip()
-        self.host_entry.delete(0, tk.END)
+        # 附加存储卷，auto表示使用其它每个磁盘上的server_data目录
+        if volumes:
+            expanded = []
+            for volume in volumes:
+                expanded += self.discover_volumes() if volume == 'auto' else [volume]
+            self.set_storage_volumes(expanded)
+        elif self.config.get('volumes') and self.default_save_dir == cached_dir:
+            # 上次的卷所在的磁盘可能已经拔掉，不可用的卷跳过，免得在系统盘上重新建出目录
+            self.set_storage_volumes([volume for volume in self.config['volumes'] if self.usable_directory(volume)])
+        if not placement and self.default_save_dir == cached_dir and self.config.get('placement') in StoragePool.POLICIES:
+            self.storage.policy = self.config['placement']
+        if not self.headless:
+            self.volume_entry.insert(0, ';'.join(self.storage.extra))
+            self.placement_var.set(self.storage.policy)
+        
+        # 获取本机IP地址并设置到界面；上次的地址仍属于本机时直接沿用
+        cached_host = self.config.get('host')
+        if host:
+            self.local_ip = host
+        elif cached_host and self.is_local_address(cached_host):
+            self.local_ip = cached_host
+        else:
+            self.local_ip = self.get_local_ip()
+        self.host_entry.delete(0, 'end')
         self.host_entry.insert(0, self.local_ip)
         
-        # 获取可用端口并设置到界面
-        self.available_port = self.find_available_port()
-        self.port_entry.delete(0, tk.END)
+        # 获取可用端口并设置到界面；优先使用上次的端口
+        cached_port = self.config.get('port')
+        if port:
+            self.available_port = port
+        elif cached_port and self.port_available(cached_port):
+            self.available_port = cached_port
+        else:
+            self.available_port = self.find_available_port()
+        self.port_entry.delete(0, 'end')
         self.port_entry.insert(0, str(self.available_port))
         
         # 初始化Flask应用
         self.app = Flask(__name__)
         self.app.config['MAX_CONTENT_LENGTH'] = None  # 解除文件大小限制
+        self.app.before_request(self.timings.begin)
+        self.app.after_request(self.timings.finish)
         
         # 确保保存目录存在
         if not os.path.exists(self.default_save_dir):
@@ -49,25 +1688,41 @@ class FileServerApp:
         # 设置路由
         @self.app.route('/upload', methods=['POST'])
         def upload_file():
+            upload = None
+            volume = None
+            reserved = 0
             try:
                 current_save_dir = self.dir_entry.get()
                 if not os.path.exists(current_save_dir):
                     os.makedirs(current_save_dir)
                 
-                # 获取上传的数据类型
-                data_type = request.form.get('data_type', 'file')
+                # 按请求体大小在存储池中选卷，没有卷放得下时在读取请求体之前就拒绝
+                reserved = request.content_length or 0
+                volume = self.storage.place(current_save_dir, reserved)
+                
+                # multipart请求边接收边写入选定的卷，其它编码交给Flask解析
+                boundary = request.mimetype_params.get('boundary')
+                with self.timings.phase('parse'):
+                    if request.mimetype == 'multipart/form-data' and boundary:
+                        upload = StreamingMultipartUpload(os.path.join(volume, META_DIR, 'uploads'))
+                        form, files = upload.parse(request.stream, boundary, request.content_length)
+                    else:
+                        form, files = request.form, request.files
+                    data_type = form.get('data_type', 'file')
                 
                 if data_type == 'text':
                     # 处理文本数据
-                    content = request.form.get('content', '')
-                    filename = request.form.get('filename', f'text_{datetime.now().strftime("%Y%m%d%H%M%S")}.txt')
+                    content = form.get('content', '')
+                    filename = form.get('filename', f'text_{datetime.now().strftime("%Y%m%d%H%M%S")}.txt')
                     
                     # 改进文件名处理
                     filename = self.sanitize_filename(filename)
-                    save_path = os.path.join(current_save_dir, filename)
+                    save_path = self.storage.destination(os.path.join(current_save_dir, filename),
+                                                         volume, current_save_dir)
                     
                     with open(save_path, 'w', encoding='utf-8') as f:
                         f.write(content)
+                    self.get_search_index(current_save_dir).add(save_path)
                     
                     log_msg = f"文本保存成功: {save_path} (大小: {len(content)}字节)"
                     self.log_message(log_msg)
@@ -79,13 +1734,13 @@ class FileServerApp:
                     })
                 elif data_type == 'folder':
                     # 处理文件夹上传
-                    if 'file' not in request.files:
+                    if 'file' not in files:
                         return jsonify({
                             'status': 'error',
                             'message': '没有上传文件'
                         }), 400
                     
-                    zip_file = request.files['file']
+                    zip_file = files['file']
                     if zip_file.filename == '':
                         return jsonify({
                             'status': 'error',
@@ -93,52 +1748,85 @@ class FileServerApp:
                         }), 400
                     
                     # 获取原始文件夹名
-                    folder_name = request.form.get('original_folder_name', 'unnamed_folder')
+                    folder_name = form.get('original_folder_name', 'unnamed_folder')
                     folder_name = self.sanitize_filename(folder_name, is_folder=True)
                     
-                    # 如果文件夹名已存在，添加随机前缀
-                    if os.path.exists(os.path.join(current_save_dir, folder_name)):
+                    # keep_archive=1时不解压，压缩包原样保存，通过 /archive 接口浏览
+                    keep_archive = form.get('keep_archive') == '1'
+                    suffix = '.zip' if keep_archive else ''
+                    
+                    # 如果文件夹名已存在(任何一个卷上)，添加随机前缀
+                    if self.storage.exists(os.path.join(current_save_dir, folder_name + suffix), current_save_dir):
                         random_prefix = uuid.uuid4().hex[:4]
                         folder_name = f"{random_prefix}_{folder_name}"
                     
-                    # 创建临时zip文件
-                    temp_zip = os.path.join(current_save_dir, f"{folder_name}.zip")
-                    zip_file.save(temp_zip)
+                    # 压缩包先放到选定卷的临时目录(不出现在文件列表中)，解压交给后台任务
+                    temp_zip = os.path.join(volume, META_DIR, 'uploads', f"{uuid.uuid4().hex}_{folder_name}.zip")
+                    os.makedirs(os.path.dirname(temp_zip), exist_ok=True)
+                    with self.timings.phase('save'):
+                        zip_file.save(temp_zip)
                     
-                    # 解压zip文件
-                    save_path = os.path.join(current_save_dir, folder_name)
-                    with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-                        zip_ref.extractall(save_path)
-                    
-                    # 删除临时zip文件
-                    os.remove(temp_zip)
+                    if keep_archive:
+                        if not zipfile.is_zipfile(temp_zip):
+                            os.remove(temp_zip)
+                            return jsonify({
+                                'status': 'error',
+                                'message': '上传的文件不是zip压缩包'
+                            }), 400
+                        save_path = os.path.join(volume, folder_name + suffix)
+                        os.replace(temp_zip, save_path)
+                        archive_size = os.path.getsize(save_path)
+                        self.get_search_index(current_save_dir).add(save_path)
+                        self.log_message(f"文件夹以压缩包保存: {save_path} "
+                                         f"(大小: {archive_size/1024/1024:.2f}MB, "
+                                         f"剩余空间: {self.get_free_space(volume)}GB)")
+                        return jsonify({
+                            'status': 'success',
+                            'message': '文件夹已按压缩包保存',
+                            'path': save_path,
+                            'size': archive_size,
+                            'original_folder_name': folder_name,
+                            'archived': True
+                        })
                     
-                    # 计算文件夹大小
-                    folder_size = sum(os.path.getsize(os.path.join(dirpath, filename)) 
-                                   for dirpath, dirnames, filenames in os.walk(save_path) 
-                                   for filename in filenames)
+                    save_path = os.path.join(volume, folder_name)
                     
-                    log_msg = (f"文件夹保存成功: {save_path} "
-                             f"(大小: {folder_size/1024/1024:.2f}MB, "
-                             f"剩余空间: {self.get_free_space(current_save_dir)}GB)")
-                    self.log_message(log_msg)
+                    # async=1时立即返回任务ID，否则在请求线程中解压完成后按原来的格式返回
+                    if form.get('async') == '1':
+                        job = self.jobs.submit('extract', self._extract_folder, temp_zip, save_path,
+                                               current_save_dir, description=f"解压 {folder_name}")
+                        return jsonify({
+                            'status': 'success',
+                            'message': '已开始后台解压',
+                            'path': save_path,
+                            'original_folder_name': folder_name,
+                            'job': job.to_dict()
+                        }), 202
+                    with self.timings.phase('extract'):
+                        job = self.jobs.submit('extract', self._extract_folder, temp_zip, save_path,
+                                               current_save_dir, description=f"解压 {folder_name}", inline=True)
+                    if job.status != 'done':
+                        return jsonify({
+                            'status': 'error',
+                            'message': f"解压失败: {job.error or job.status}"
+                        }), 500
                     
                     return jsonify({
                         'status': 'success',
                         'message': '文件夹保存成功',
                         'path': save_path,
-                        'size': folder_size,
+                        'size': job.result['size'],
                         'original_folder_name': folder_name
                     })
                 else:
                     # 处理文件上传(包括视频、压缩包等)
-                    if 'file' not in request.files:
+                    if 'file' not in files:
                         return jsonify({
                             'status': 'error',
                             'message': '没有上传文件'
                         }), 400
                     
-                    file = request.files['file']
+                    file = files['file']
                     if file.filename == '':
                         return jsonify({
                             'status': 'error',
@@ -146,24 +1834,29 @@ class FileServerApp:
                         }), 400
                     
                     # 获取原始文件名或生成新文件名
-                    original_filename = request.form.get('original_filename', file.filename)
+                    original_filename = form.get('original_filename', file.filename)
                     filename = self.sanitize_filename(original_filename)
                     
-                    # 如果文件名已存在，添加随机前缀
-                    if os.path.exists(os.path.join(current_save_dir, filename)):
+                    # 如果文件名已存在(任何一个卷上)，添加随机前缀
+                    if self.storage.exists(os.path.join(current_save_dir, filename), current_save_dir):
                         random_prefix = uuid.uuid4().hex[:4]
                         filename = f"{random_prefix}_{filename}"
                     
-                    save_path = os.path.join(current_save_dir, filename)
-                    file.save(save_path)
+                    save_path = os.path.join(volume, filename)
+                    with self.timings.phase('save'):
+                        file.save(save_path)
                     
                     # 获取文件大小
                     file_size = os.path.getsize(save_path)
+                    with self.timings.phase('index'):
+                        self.get_search_index(current_save_dir).add(save_path)
+                    with self.timings.phase('mime'):
+                        mime_type = mimetypes.guess_type(save_path)[0]
                     
                     log_msg = (f"文件保存成功: {save_path} "
                              f"(大小: {file_size/1024/1024:.2f}MB, "
-                             f"类型: {mimetypes.guess_type(save_path)[0]}, "
-                             f"剩余空间: {self.get_free_space(current_save_dir)}GB)")
+                             f"类型: {mime_type}, "
+                             f"剩余空间: {self.get_free_space(volume)}GB)")
                     self.log_message(log_msg)
                     
                     return jsonify({
@@ -172,9 +1865,16 @@ class FileServerApp:
                         'path': save_path,
                         'size': file_size,
                         'original_filename': original_filename,
-                        'type': mimetypes.guess_type(save_path)[0]
+                        'type': mime_type
                     })
             
+            except StorageFullError as e:
+                error_msg = f"保存失败: {str(e)}"
+                self.log_message(error_msg)
+                return jsonify({
+                    'status': 'error',
+                    'message': error_msg
+                }), 507
             except Exception as e:
                 error_msg = f"保存失败: {str(e)}"
                 self.log_message(error_msg)
@@ -182,6 +1882,11 @@ class FileServerApp:
                     'status': 'error',
                     'message': error_msg
                 }), 500
+            finally:
+                if upload is not None:
+                    upload.discard()
+                if volume is not None:
+                    self.storage.release(volume, reserved)
         
         @self.app.route('/download', methods=['GET'])
         def download_file():
@@ -198,10 +1903,13 @@ class FileServerApp:
                 absolute_save_dir = os.path.abspath(current_save_dir)
 
                 # 更智能的路径安全检查
-                if not absolute_requested.startswith(absolute_save_dir):
+                if not absolute_requested.startswith(absolute_save_dir) or self.is_meta_path(absolute_requested, absolute_save_dir):
                     self.log_message(f"Path traversal attempt: {absolute_requested}")
                     return jsonify({'status': 'error', 'message': 'Access denied'}), 403
 
+                # 在存储池各卷中查找实际位置
+                namespace_path = absolute_requested
+                absolute_requested = self.storage.locate(absolute_requested, absolute_save_dir)
                 if not os.path.exists(absolute_requested):
                     return jsonify({'status': 'error', 'message': 'File not found'}), 404
 
@@ -212,7 +1920,8 @@ class FileServerApp:
 
                 # 处理目录下载
                 if os.path.isdir(absolute_requested):
-                    return self._handle_directory_download(absolute_requested, current_save_dir)
+                    with self.timings.phase('zip'):
+                        return self._handle_directory_download(namespace_path, current_save_dir)
                 
                 # 处理文件下载
                 return send_from_directory(
@@ -235,10 +1944,11 @@ class FileServerApp:
                 absolute_save_dir = os.path.abspath(current_save_dir)
 
                 # 路径安全检查
-                if not absolute_requested.startswith(absolute_save_dir):
+                if not absolute_requested.startswith(absolute_save_dir) or self.is_meta_path(absolute_requested, absolute_save_dir):
                     self.log_message(f"Path traversal attempt: {absolute_requested}")
                     return jsonify({'status': 'error', 'message': 'Access denied'}), 403
 
+                absolute_requested = self.storage.locate(absolute_requested, absolute_save_dir)
                 if not os.path.exists(absolute_requested):
                     return jsonify({'status': 'error', 'message': 'File not found'}), 404
 
@@ -262,9 +1972,8 @@ class FileServerApp:
                     'application/xml',
                     'application/javascript'
                 ]:
-                    with open(absolute_requested, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    return Response(content, mimetype=mime_type)
+                    # 直接从磁盘流式发送，大文件分页查看见 /text
+                    return send_file(absolute_requested, mimetype=mime_type)
                 
                 # 处理图片
                 elif mime_type.startswith('image/'):
@@ -282,6 +1991,65 @@ class FileServerApp:
                 self.log_message(f"View file error: {str(e)}")
                 return jsonify({'status': 'error', 'message': str(e)}), 500
 
+        @self.app.route('/text/<path:filename>', methods=['GET'])
+        def view_text(filename):
+            """分页查看文本文件: 按行号、按字节偏移、末尾N行，或以SSE持续推送新增的行"""
+            try:
+                absolute_save_dir = os.path.abspath(os.path.normpath(self.dir_entry.get()))
+                absolute_requested = self.namespace_path(filename, absolute_save_dir)
+                if absolute_requested is None:
+                    self.log_message(f"Path traversal attempt: {filename}")
+                    return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+                absolute_requested = self.storage.locate(absolute_requested, absolute_save_dir)
+                if not os.path.isfile(absolute_requested):
+                    return jsonify({'status': 'error', 'message': 'File not found'}), 404
+                
+                args = request.args
+                index = self.line_indexes.get(absolute_requested)
+                tail = args.get('tail')
+                
+                if args.get('follow') in ('1', 'true'):
+                    # 断线重连时EventSource带上最后收到的事件id(字节偏移)，从那里接着推送
+                    resume = request.headers.get('Last-Event-ID') or args.get('offset')
+                    initial = []
+                    if resume is not None:
+                        offset = int(resume)
+                    elif tail:
+                        initial, _, offset = index.tail(min(int(tail), 10000))
+                    else:
+                        offset = os.path.getsize(absolute_requested)
+                    return Response(self._follow_text(absolute_requested, offset, initial),
+                                    mimetype='text/event-stream',
+                                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+                
+                if tail:
+                    lines, offset, size = index.tail(min(int(tail), 10000))
+                    return jsonify({'status': 'success', 'lines': lines, 'offset': offset, 'size': size})
+                
+                if args.get('offset') is not None:
+                    offset = int(args['offset'])
+                    length = min(int(args.get('length', 65536)), 1024 * 1024)
+                    if offset < 0 or length <= 0:
+                        return jsonify({'status': 'error', 'message': 'offset和length必须为正数'}), 400
+                    text, next_offset, size = index.read_bytes(offset, length)
+                    return jsonify({'status': 'success', 'text': text, 'offset': offset,
+                                    'next_offset': next_offset, 'size': size})
+                
+                start = int(args.get('start', 0))
+                count = min(int(args.get('lines', 1000)), 10000)
+                if start < 0 or count <= 0:
+                    return jsonify({'status': 'error', 'message': 'start和lines必须为正数'}), 400
+                with self.timings.phase('line_index'):
+                    lines, size, total = index.read_lines(start, count)
+                return jsonify({'status': 'success', 'start': start, 'lines': lines,
+                                'next': start + len(lines), 'total_lines': total, 'size': size})
+            
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': f'参数错误: {e}'}), 400
+            except Exception as e:
+                self.log_message(f"View text error: {str(e)}")
+                return jsonify({'status': 'error', 'message': str(e)}), 500
+        
         @self.app.route('/delete', methods=['POST'])
         def delete_file():
             try:
@@ -296,11 +2064,14 @@ class FileServerApp:
                 absolute_requested = os.path.abspath(os.path.join(current_save_dir, requested_path))
                 absolute_save_dir = os.path.abspath(current_save_dir)
 
-                # 路径安全检查
-                if not absolute_requested.startswith(absolute_save_dir):
+                # 路径安全检查(保存目录本身不能删除)
+                if (not absolute_requested.startswith(absolute_save_dir) or absolute_requested == absolute_save_dir
+                        or self.is_meta_path(absolute_requested, absolute_save_dir)):
                     self.log_message(f"Path traversal attempt: {absolute_requested}")
                     return jsonify({'status': 'error', 'message': 'Access denied'}), 403
 
+                namespace_path = absolute_requested
+                absolute_requested = self.storage.locate(absolute_requested, absolute_save_dir)
                 if not os.path.exists(absolute_requested):
                     return jsonify({'status': 'error', 'message': 'File not found'}), 404
 
@@ -309,17 +2080,18 @@ class FileServerApp:
                     self.log_message(f"Permission denied: {absolute_requested}")
                     return jsonify({'status': 'error', 'message': 'Permission denied'}), 403
 
-                # 执行删除操作
-                if os.path.isdir(absolute_requested):
-                    shutil.rmtree(absolute_requested)
+                # 执行删除操作: 各卷上的副本先改名移入回收目录，真正删除交给后台任务
+                is_dir = os.path.isdir(absolute_requested)
+                job = self.delete_path(namespace_path, absolute_save_dir)
+                if is_dir:
                     self.log_message(f"已删除文件夹: {absolute_requested}")
                 else:
-                    os.remove(absolute_requested)
                     self.log_message(f"已删除文件: {absolute_requested}")
 
                 return jsonify({
                     'status': 'success',
-                    'message': '删除成功'
+                    'message': '删除成功',
+                    'job': job.id
                 })
 
             except Exception as e:
@@ -342,10 +2114,11 @@ class FileServerApp:
                 absolute_save_dir = os.path.abspath(current_save_dir)
 
                 # 路径安全检查
-                if not absolute_requested.startswith(absolute_save_dir):
+                if not absolute_requested.startswith(absolute_save_dir) or self.is_meta_path(absolute_requested, absolute_save_dir):
                     self.log_message(f"Path traversal attempt: {absolute_requested}")
                     return jsonify({'status': 'error', 'message': 'Access denied'}), 403
 
+                absolute_requested = self.storage.locate(absolute_requested, absolute_save_dir)
                 if not os.path.exists(absolute_requested):
                     return jsonify({'status': 'error', 'message': 'File not found'}), 404
 
@@ -361,6 +2134,7 @@ class FileServerApp:
                 # 执行更新操作
                 with open(absolute_requested, 'w', encoding='utf-8') as f:
                     f.write(new_content)
+                self.get_search_index(current_save_dir).add(absolute_requested)
 
                 self.log_message(f"已更新文件: {absolute_requested}")
                 return jsonify({
@@ -373,35 +2147,6 @@ class FileServerApp:
                 self.log_message(f"更新文件失败: {str(e)}")
                 return jsonify({'status': 'error', 'message': str(e)}), 500
         
-        def _handle_directory_download(self, dir_path, save_dir):
-            """处理目录下载逻辑"""
-            dir_name = os.path.basename(dir_path)
-            temp_zip = os.path.join(save_dir, f"{dir_name}.zip")
-            
-            # 确保临时文件名唯一
-            temp_zip = self._get_unique_filename(temp_zip)
-            
-            # 创建压缩文件
-            with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, _, files in os.walk(dir_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, start=dir_path)
-                        zipf.write(file_path, arcname)
-            
-            # 异步删除临时文件
-            threading.Thread(
-                target=self._delete_temp_file,
-                args=(temp_zip,),
-                daemon=True
-            ).start()
-            
-            return send_from_directory(
-                directory=os.path.dirname(temp_zip),
-                path=os.path.basename(temp_zip),
-                as_attachment=True
-            )
-        
         @self.app.route('/list_files', methods=['GET'])
         def list_files():
             try:
@@ -410,56 +2155,650 @@ class FileServerApp:
                 
                 full_path = os.path.join(current_save_dir, path)
                 
-                # 安全检查
-                if not os.path.abspath(full_path).startswith(os.path.abspath(current_save_dir)):
+                # 安全检查(元数据目录不对外列出)
+                if (not os.path.abspath(full_path).startswith(os.path.abspath(current_save_dir))
+                        or self.is_meta_path(full_path, current_save_dir)):
                     return jsonify({'status': 'error', 'message': '无权访问该路径'}), 403
                 
-                if not os.path.exists(full_path):
+                if not self.storage.exists(full_path, current_save_dir):
                     return jsonify({'status': 'error', 'message': '路径不存在'}), 404
                 
                 items = []
-                for item in os.listdir(full_path):
-                    item_path = os.path.join(full_path, item)
-                    item_info = {
-                        'name': item,
-                        'is_dir': os.path.isdir(item_path),
-                        'size': os.path.getsize(item_path) if not os.path.isdir(item_path) else 0,
-                        'modified': os.path.getmtime(item_path),
-                        'path': os.path.relpath(item_path, start=current_save_dir)
-                    }
-                    items.append(item_info)
+                index = self.get_search_index(current_save_dir)
+                with self.timings.phase('scan'):
+                    # 合并存储池各卷上的同名目录
+                    entries = self.storage.listdir(full_path, current_save_dir)
+                    folders = [os.path.join(full_path, item) for item, item_path in entries.items()
+                               if os.path.isdir(item_path)]
+                    # 目录大小取索引中的汇总，不遍历子树
+                    sizes = index.dir_sizes(folders)
+                    for item, item_path in entries.items():
+                        is_dir = os.path.isdir(item_path)
+                        item_info = {
+                            'name': item,
+                            'is_dir': is_dir,
+                            'size': os.path.getsize(item_path) if not is_dir else 0,
+                            'modified': os.path.getmtime(item_path),
+                            'path': os.path.relpath(os.path.join(full_path, item), start=current_save_dir)
+                        }
+                        if is_dir:
+                            aggregate = sizes.get(os.path.join(full_path, item), {})
+                            item_info['size'] = aggregate.get('size', 0)
+                            item_info['files'] = aggregate.get('files', 0)
+                            item_info['dirs'] = aggregate.get('dirs', 0)
+                        items.append(item_info)
                 
                 return jsonify({
                     'status': 'success',
                     'path': path,
-                    'items': items
+                    'items': items,
+                    # 启动后的全量扫描完成前，目录大小可能还不完整
+                    'sizes_complete': not (index.scanning or index.sizes_stale)
                 })
             
             except Exception as e:
                 return jsonify({'status': 'error', 'message': str(e)}), 500
+        
+        @self.app.route('/usage', methods=['GET'])
+        def disk_usage():
+            """du式占用统计: 某个目录下直接子项按大小从大到小排列"""
+            try:
+                current_save_dir = os.path.abspath(os.path.normpath(self.dir_entry.get()))
+                requested_path = request.args.get('path', '')
+                # 保存目录本身也可以统计，其余路径必须落在保存目录内且不是元数据目录
+                full_path = os.path.abspath(os.path.join(current_save_dir, requested_path))
+                if full_path != current_save_dir:
+                    full_path = self.namespace_path(requested_path, current_save_dir)
+                if full_path is None:
+                    self.log_message(f"Path traversal attempt: {requested_path}")
+                    return jsonify({'status': 'error', 'message': '无权访问该路径'}), 403
+                if not self.storage.exists(full_path, current_save_dir):
+                    return jsonify({'status': 'error', 'message': '路径不存在'}), 404
+                limit = min(int(request.args.get('limit', 20)), 1000)
+                usage = self.get_search_index(current_save_dir).usage(full_path, limit)
+                return jsonify({'status': 'success', **usage})
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': f'参数错误: {e}'}), 400
+            except Exception as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 500
+        
+        @self.app.route('/search', methods=['GET'])
+        def search_files():
+            """按名称子串、路径前缀、通配符、类型、大小和修改时间检索保存目录"""
+            try:
+                args = request.args
+                
+                def number(name, parse=float):
+                    value = args.get(name)
+                    return parse(value) if value not in (None, '') else None
+                
+                def timestamp(name):
+                    # 接受Unix时间戳或ISO格式日期
+                    value = args.get(name)
+                    if not value:
+                        return None
+                    try:
+                        return float(value)
+                    except ValueError:
+                        return datetime.fromisoformat(value).timestamp()
+                
+                is_dir = args.get('is_dir')
+                index = self.get_search_index(self.dir_entry.get())
+                with self.timings.phase('query'):
+                    items = index.search(
+                        q=args.get('q'),
+                        prefix=args.get('prefix'),
+                        glob=args.get('glob'),
+                        mime=args.get('type'),
+                        min_size=number('min_size', int),
+                        max_size=number('max_size', int),
+                        modified_after=timestamp('modified_after'),
+                        modified_before=timestamp('modified_before'),
+                        is_dir=None if is_dir in (None, '') else is_dir in ('1', 'true'),
+                        limit=max(1, min(number('limit', int) or 100, 1000)),
+                        offset=max(0, number('offset', int) or 0)
+                    )
+                return jsonify({
+                    'status': 'success',
+                    'items': items,
+                    'count': len(items),
+                    'indexing': index.scanning
+                })
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': f'参数格式错误: {e}'}), 400
+            except Exception as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 500
+        
+        @self.app.route('/search/reindex', methods=['POST'])
+        def reindex_files():
+            """重新扫描保存目录，纳入绕过服务器直接写入磁盘的改动"""
+            index = self.get_search_index(self.dir_entry.get())
+            job = self.jobs.submit('reindex', lambda job: index.rebuild(), description="重建搜索索引")
+            self.log_message("开始重建搜索索引")
+            return jsonify({'status': 'success', 'message': '已开始重建索引', 'job': job.id})
+        
+        @self.app.route('/archive/list', methods=['GET'])
+        def archive_list():
+            """列出压缩包中的成员，不解压"""
+            try:
+                index, error = self.get_archive_index(request.args.get('path'))
+                if error is not None:
+                    return error
+                limit = max(1, min(int(request.args.get('limit', 1000)), 10000))
+                offset = max(0, int(request.args.get('offset', 0)))
+                items, total = index.list(request.args.get('prefix', ''), limit, offset)
+                return jsonify({
+                    'status': 'success',
+                    'format': index.format,
+                    'total': total,
+                    'count': len(items),
+                    'items': items
+                })
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': f'参数格式错误: {e}'}), 400
+            except Exception as e:
+                self.log_message(f"读取压缩包失败: {str(e)}")
+                return jsonify({'status': 'error', 'message': str(e)}), 500
+        
+        @self.app.route('/archive/file', methods=['GET'])
+        def archive_file():
+            """读取压缩包中的单个成员，只读取该成员的数据"""
+            try:
+                index, error = self.get_archive_index(request.args.get('path'))
+                if error is not None:
+                    return error
+                member = request.args.get('member', '').rstrip('/')
+                info = index.members.get(member)
+                if info is None:
+                    return jsonify({'status': 'error', 'message': '压缩包中没有该文件'}), 404
+                if info['is_dir']:
+                    return jsonify({'status': 'error', 'message': 'Cannot view directory'}), 400
+                
+                mime_type = mimetypes.guess_type(member)[0] or 'application/octet-stream'
+                response = Response(index.iter_member(member), mimetype=mime_type)
+                response.headers['Content-Length'] = str(info['size'])
+                disposition = 'attachment' if request.args.get('download') == '1' else 'inline'
+                response.headers['Content-Disposition'] = (
+                    f"{disposition}; filename*=UTF-8''{quote(os.path.basename(member))}")
+                return response
+            except Exception as e:
+                self.log_message(f"读取压缩包失败: {str(e)}")
+                return jsonify({'status': 'error', 'message': str(e)}), 500
+        
+        @self.app.route('/copy', methods=['POST'])
+        def copy_files():
+            """服务器端复制文件或目录，数据不经过网络"""
+            return self._handle_copy_move('copy')
+        
+        @self.app.route('/move', methods=['POST'])
+        def move_files():
+            """服务器端移动文件或目录，同一卷内只是改名"""
+            return self._handle_copy_move('move')
+        
+        @self.app.route('/storage', methods=['GET'])
+        def storage_status():
+            """存储池各卷的容量和使用情况"""
+            try:
+                return jsonify({
+                    'status': 'success',
+                    'policy': self.storage.policy,
+                    'rebalancing': self.storage.rebalancing,
+                    'volumes': self.storage.usage(self.dir_entry.get())
+                })
+            except Exception as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 500
+        
+        @self.app.route('/storage/rebalance', methods=['POST'])
+        def storage_rebalance():
+            """立即在后台均衡一次存储池"""
+            if len(self.storage.volumes(self.dir_entry.get())) < 2:
+                return jsonify({'status': 'error', 'message': '没有配置附加存储卷'}), 400
+            job = self.jobs.submit('rebalance', lambda job: self.rebalance_storage(), description="均衡存储池")
+            return jsonify({'status': 'success', 'message': '已开始均衡存储池', 'job': job.id})
+        
+        @self.app.route('/jobs', methods=['GET'])
+        def list_jobs():
+            """所有后台任务，最新的在前"""
+            return jsonify({'status': 'success', 'jobs': self.jobs.snapshot()})
+        
+        @self.app.route('/jobs/<job_id>', methods=['GET'])
+        def job_status(job_id):
+            job = self.jobs.get(job_id)
+            if job is None:
+                return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+            return jsonify({'status': 'success', 'job': job.to_dict()})
+        
+        @self.app.route('/jobs/<job_id>/cancel', methods=['POST'])
+        def cancel_job(job_id):
+            job = self.jobs.cancel(job_id)
+            if job is None:
+                return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+            self.log_message(f"取消后台任务: {job.description}")
+            return jsonify({'status': 'success', 'job': job.to_dict()})
+        
+        @self.app.route('/jobs/<job_id>/result', methods=['GET'])
+        def job_result(job_id):
+            """下载任务产生的文件(如目录打包的zip)，过期前可重复下载"""
+            job = self.jobs.get(job_id)
+            if job is None:
+                return jsonify({'status': 'error', 'message': '任务不存在'}), 404
+            return self.send_job_result(job)
+        
+        @self.app.route('/debug/timings', methods=['GET', 'POST'])
+        def debug_timings():
+            """查询最近请求的分阶段耗时；POST enabled=1/0 开关计时"""
+            if request.method == 'POST':
+                self.timings.enabled = request.form.get('enabled', '1') not in ('0', 'false', 'off')
+                self.log_message(f"请求计时已{'开启' if self.timings.enabled else '关闭'}")
+                return jsonify({'status': 'success', 'enabled': self.timings.enabled})
+            
+            try:
+                limit = int(request.args.get('limit', 100))
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'limit必须是整数'}), 400
+            return jsonify(dict(self.timings.snapshot(limit), status='success'))
+        
+        @self.app.route('/debug/profile', methods=['GET'])
+        def debug_profile():
+            """对服务器所有线程采样seconds秒，返回折叠格式的调用栈"""
+            try:
+                seconds = min(float(request.args.get('seconds', 10)), 300)
+                interval = max(float(request.args.get('interval', 0.005)), 0.001)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'seconds和interval必须是数字'}), 400
+            
+            self.log_message(f"开始采样分析 {seconds:g} 秒")
+            counts = sample_stacks(seconds, interval)
+            lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+            return Response("\n".join(lines) + "\n", mimetype='text/plain')
     
-    def _get_unique_filename(self, path):
-        """确保文件名唯一，避免覆盖"""
-        if not os.path.exists(path):
-            return path
+    def _handle_directory_download(self, dir_path, save_dir):
+        """处理目录下载逻辑: 打包作为任务执行，async=1时交给后台线程池并立即返回任务ID"""
+        dir_name = os.path.basename(dir_path)
+        asynchronous = request.args.get('async') == '1'
+        # 同步下载在请求线程中打包，不与后台任务争用线程池
+        job = self.jobs.submit('zip', self._zip_directory, dir_path, save_dir, description=f"打包 {dir_name}",
+                               inline=not asynchronous)
+        if asynchronous:
+            return jsonify({
+                'status': 'success',
+                'message': '已开始后台打包',
+                'job': job.to_dict(),
+                'result': f"/jobs/{job.id}/result"
+            }), 202
+        
+        # 同步下载: 发送完毕后立即删除zip
+        return self.send_job_result(job, discard=True)
+    
+    def _zip_directory(self, job, dir_path, save_dir):
+        """后台任务: 把目录(可能分布在存储池的多个卷上)打包到元数据目录中"""
+        jobs_dir = os.path.join(os.path.abspath(save_dir), META_DIR, 'jobs')
+        os.makedirs(jobs_dir, exist_ok=True)
+        zip_path = os.path.join(jobs_dir, f"{job.id}.zip")
+        job.temp_files.append(zip_path)
+        
+        files = list(self.storage.walk(dir_path, save_dir))
+        job.total = len(files)
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for file_path, arcname in files:
+                zipf.write(file_path, arcname)
+                job.advance()
+        
+        job.output = zip_path
+        return {'name': f"{os.path.basename(dir_path)}.zip", 'size': os.path.getsize(zip_path), 'files': len(files)}
+    
+    def _extract_folder(self, job, temp_zip, save_path, save_dir):
+        """后台任务: 逐个解压上传的文件夹，失败或取消时删除已解压的部分"""
+        size = 0
+        try:
+            with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
+                members = zip_ref.infolist()
+                job.total = len(members)
+                os.makedirs(save_path, exist_ok=True)
+                for member in members:
+                    zip_ref.extract(member, save_path)
+                    size += member.file_size
+                    job.advance()
+        except BaseException:
+            shutil.rmtree(save_path, ignore_errors=True)
+            raise
+        finally:
+            os.remove(temp_zip)
+        
+        self.get_search_index(save_dir).add(save_path)
+        self.log_message(f"文件夹保存成功: {save_path} "
+                         f"(大小: {size/1024/1024:.2f}MB, "
+                         f"剩余空间: {self.get_free_space(save_path)}GB)")
+        return {'path': save_path, 'size': size}
+    
+    def _purge(self, job, paths):
+        """后台任务: 删除回收目录中的条目"""
+        for path in paths:
+            if os.path.isdir(path) and not os.path.islink(path):
+                for root, dirs, files in os.walk(path, topdown=False):
+                    for name in files:
+                        os.remove(os.path.join(root, name))
+                        job.advance()
+                    for name in dirs:
+                        dir_path = os.path.join(root, name)
+                        if os.path.islink(dir_path):
+                            os.remove(dir_path)
+                        else:
+                            os.rmdir(dir_path)
+                os.rmdir(path)
+            elif os.path.lexists(path):
+                os.remove(path)
+            job.advance()
+        return {'removed': job.done}
+    
+    def get_archive_index(self, requested_path):
+        """解析请求中的压缩包路径并取得其成员索引，返回 (索引, 错误响应)
+        
+        zip和未压缩的tar在请求中直接建立索引；压缩的tar需要完整解压一遍，
+        改为后台任务，完成前返回202和任务信息。
+        """
+        if not requested_path:
+            return None, (jsonify({'status': 'error', 'message': 'Missing path parameter'}), 400)
+        
+        absolute_save_dir = os.path.abspath(os.path.normpath(self.dir_entry.get()))
+        absolute_requested = self.namespace_path(requested_path, absolute_save_dir)
+        if absolute_requested is None:
+            self.log_message(f"Path traversal attempt: {requested_path}")
+            return None, (jsonify({'status': 'error', 'message': 'Access denied'}), 403)
+        
+        absolute_requested = self.storage.locate(absolute_requested, absolute_save_dir)
+        if not os.path.isfile(absolute_requested):
+            return None, (jsonify({'status': 'error', 'message': 'File not found'}), 404)
+        fmt = archive_format(absolute_requested)
+        if fmt is None:
+            return None, (jsonify({'status': 'error', 'message': '不支持的压缩包格式'}), 400)
+        
+        index = self.archives.get(absolute_requested)
+        if index is not None:
+            return index, None
+        
+        key = self.archives.key(absolute_requested)
+        index = ArchiveIndex(absolute_requested, *fmt)
+        if index.codec is None:
+            with self.timings.phase('archive_index'):
+                index.build()
+            self.archives.put(absolute_requested, key, index)
+            return index, None
+        
+        def build(job):
+            try:
+                index.build(job)
+                self.archives.put(absolute_requested, key, index)
+                return {'members': len(index.members), 'checkpoints': len(index.checkpoints)}
+            finally:
+                with self.archives.lock:
+                    self.archives.pending.pop(absolute_requested, None)
+        
+        with self.archives.lock:
+            job = self.archives.pending.get(absolute_requested)
+            if job is None:
+                job = self.jobs.submit('archive_index', build,
+                                       description=f"索引 {os.path.basename(absolute_requested)}")
+                self.archives.pending[absolute_requested] = job
+        return None, (jsonify({
+            'status': 'success',
+            'message': '正在建立压缩包索引，请稍后重试',
+            'job': job.to_dict()
+        }), 202)
+    
+    def _handle_copy_move(self, action):
+        """处理复制/移动请求: 移动立即完成；复制作为任务执行，async=1时交给后台线程池并立即返回任务ID"""
+        try:
+            save_dir = os.path.abspath(os.path.normpath(self.dir_entry.get()))
+            src_path = request.form.get('src')
+            dst_path = request.form.get('dst')
+            if not src_path or not dst_path:
+                return jsonify({'status': 'error', 'message': 'Missing src or dst parameter'}), 400
+            
+            src = self.namespace_path(src_path, save_dir)
+            dst = self.namespace_path(dst_path, save_dir)
+            if src is None or dst is None:
+                self.log_message(f"Path traversal attempt: {src_path} -> {dst_path}")
+                return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+            if not self.storage.exists(src, save_dir):
+                return jsonify({'status': 'error', 'message': 'File not found'}), 404
+            if dst == src or dst.startswith(src + os.sep):
+                return jsonify({'status': 'error', 'message': '目标不能是源路径本身或其子目录'}), 400
+            
+            # 目标已存在时只有文件可以覆盖，旧文件先移入回收目录
+            if self.storage.exists(dst, save_dir):
+                if request.form.get('overwrite') != '1' or os.path.isdir(self.storage.locate(dst, save_dir)):
+                    return jsonify({'status': 'error', 'message': '目标已存在'}), 409
+                self.delete_path(dst, save_dir)
+            
+            if action == 'move':
+                with self.timings.phase('move'):
+                    self.move_path(src, dst, save_dir)
+                return jsonify({
+                    'status': 'success',
+                    'message': '移动成功',
+                    'path': os.path.relpath(dst, save_dir)
+                })
+            
+            if request.form.get('async') == '1':
+                job = self.copy_path(src, dst, save_dir)
+                return jsonify({
+                    'status': 'success',
+                    'message': '已开始后台复制',
+                    'path': os.path.relpath(dst, save_dir),
+                    'job': job.to_dict()
+                }), 202
+            with self.timings.phase('copy'):
+                job = self.copy_path(src, dst, save_dir, inline=True)
+            if job.status != 'done':
+                return jsonify({'status': 'error', 'message': f"复制失败: {job.error or job.status}"}), 500
+            return jsonify(dict(job.result, status='success', message='复制成功',
+                                path=os.path.relpath(dst, save_dir)))
         
-        base, ext = os.path.splitext(path)
-        counter = 1
-        while True:
-            new_path = f"{base}_{counter}{ext}"
-            if not os.path.exists(new_path):
-                return new_path
-            counter += 1
-    
-    def _delete_temp_file(self, file_path, delay=30):
-        """延迟删除临时文件"""
-        import time
-        time.sleep(delay)
+        except Exception as e:
+            error_msg = f"{'复制' if action == 'copy' else '移动'}失败: {str(e)}"
+            self.log_message(error_msg)
+            return jsonify({'status': 'error', 'message': error_msg}), 500
+    
+    def move_path(self, src, dst, save_dir):
+        """移动命名空间中的路径: 各卷内改名，索引中的路径前缀一并改写"""
+        moved = self.storage.move(src, dst, save_dir)
+        if moved:
+            self.get_search_index(save_dir).rename(src, moved[0])
+        self.log_message(f"已移动: {src} -> {dst}")
+        return moved
+    
+    def copy_path(self, src, dst, save_dir, inline=False):
+        """提交复制任务，返回任务；inline为True时在当前线程中复制完再返回"""
+        return self.jobs.submit('copy', self._copy_parts, self.storage.parts(src, save_dir),
+                                os.path.relpath(dst, save_dir), save_dir,
+                                description=f"复制 {os.path.relpath(src, save_dir)} -> {os.path.relpath(dst, save_dir)}",
+                                inline=inline)
+    
+    def _copy_parts(self, job, parts, dst_rel, save_dir):
+        """后台任务: 每个卷上的副本在本卷内复制(reflink/copy_file_range只能在同一文件系统内生效)
+        
+        先复制到卷的临时目录，全部完成后改名到目标位置，失败或取消时不会留下半个目录。
+        """
+        stats = Counter()
+        
+        def copy_one(src, dst):
+            stats[clone_file(src, dst)] += 1
+            shutil.copystat(src, dst)
+            stats['bytes'] += os.path.getsize(dst)
+            stats['files'] += 1
+            job.advance()
+        
+        job.total = sum(sum(len(files) for _, _, files in os.walk(part)) if os.path.isdir(part) else 1
+                        for _, part in parts)
+        targets = []
         try:
-            os.remove(file_path)
-            self.log_message(f"已删除临时文件: {file_path}")
+            for volume, part in parts:
+                temp = os.path.join(volume, META_DIR, 'uploads', f"copy_{uuid.uuid4().hex}")
+                os.makedirs(os.path.dirname(temp), exist_ok=True)
+                try:
+                    if os.path.isdir(part):
+                        shutil.copytree(part, temp, symlinks=True, copy_function=copy_one)
+                    else:
+                        copy_one(part, temp)
+                    target = os.path.join(volume, dst_rel)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(temp, target)
+                    targets.append(target)
+                except BaseException:
+                    if os.path.isdir(temp):
+                        shutil.rmtree(temp, ignore_errors=True)
+                    elif os.path.exists(temp):
+                        os.remove(temp)
+                    raise
+        except BaseException:
+            for target in targets:
+                if os.path.isdir(target):
+                    shutil.rmtree(target, ignore_errors=True)
+                else:
+                    os.remove(target)
+            raise
+        
+        index = self.get_search_index(save_dir)
+        for target in targets:
+            index.add(target)
+        self.log_message(f"复制完成: {job.description} ({stats['files']} 个文件, "
+                         f"{stats['bytes']/1024/1024:.2f}MB, reflink {stats['reflink']}, "
+                         f"copy_file_range {stats['copy_file_range']}, 普通复制 {stats['copy']})")
+        return {
+            'files': stats['files'],
+            'bytes': stats['bytes'],
+            'reflink': stats['reflink'],
+            'copy_file_range': stats['copy_file_range'],
+            'copy': stats['copy']
+        }
+    
+    def _follow_text(self, path, offset, initial, interval=0.5, heartbeat=15):
+        """SSE: 先发出initial中的行，再轮询文件推送新写入的完整行
+        
+        每个事件的id是该行结束处的字节偏移。文件被截断或轮转(换了inode)时
+        发出reset事件并从新文件开头继续。客户端断开后写入失败，生成器随之结束。
+        """
+        for line in initial:
+            yield f"data: {line}\n\n"
+        f = open(path, 'rb')
+        buffer = b''
+        last_sent = time.monotonic()
+        try:
+            while True:
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # 轮转过程中文件可能暂时不存在
+                    stat = None
+                if stat is not None and (stat.st_ino != os.fstat(f.fileno()).st_ino or stat.st_size < offset):
+                    f.close()
+                    f = open(path, 'rb')
+                    offset = 0
+                    buffer = b''
+                    yield "event: reset\ndata: \n\n"
+                    continue
+                if stat is not None and stat.st_size > offset:
+                    f.seek(offset)
+                    data = f.read(min(stat.st_size - offset, LineIndex.BLOCK))
+                    offset += len(data)
+                    *lines, buffer = (buffer + data).split(b'\n')
+                    position = offset - len(buffer)
+                    events = []
+                    for line in reversed(lines):
+                        text = line.rstrip(b'\r').decode('utf-8', errors='replace')
+                        events.append(f"id: {position}\ndata: {text}\n\n")
+                        position -= len(line) + 1
+                    if events:
+                        yield ''.join(reversed(events))
+                        last_sent = time.monotonic()
+                    continue
+                if time.monotonic() - last_sent >= heartbeat:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                time.sleep(interval)
+        finally:
+            f.close()
+    
+    def namespace_path(self, requested_path, save_dir):
+        """请求中的相对路径转为保存目录下的绝对路径；越出保存目录或指向元数据目录时返回None"""
+        absolute = os.path.abspath(os.path.join(save_dir, os.path.normpath(requested_path)))
+        if not absolute.startswith(save_dir + os.sep) or self.is_meta_path(absolute, save_dir):
+            return None
+        return absolute
+    
+    def delete_path(self, path, save_dir):
+        """删除命名空间中的路径: 立即移入回收目录并更新索引，返回后台清理任务"""
+        trashed = self.storage.trash(path, save_dir)
+        self.get_search_index(save_dir).remove(path)
+        return self.jobs.submit('purge', self._purge, trashed,
+                                description=f"清理 {os.path.relpath(path, os.path.abspath(save_dir))}")
+    
+    def collect_trash(self, save_dir):
+        """清理上次运行时遗留在回收目录中的条目"""
+        entries = self.storage.trash_entries(save_dir)
+        if entries:
+            self.jobs.submit('purge', self._purge, entries, description="清理回收目录")
+    
+    def send_job_result(self, job, discard=False):
+        """发送任务产生的文件；discard为True时发送完毕即删除"""
+        if job.status != 'done':
+            return jsonify({
+                'status': 'error',
+                'message': f"任务未完成: {job.error or job.status}",
+                'job': job.to_dict()
+            }), 500 if job.status == 'failed' else 409
+        if job.output is None:
+            return jsonify({'status': 'error', 'message': '该任务没有结果文件'}), 400
+        response = send_file(job.output, as_attachment=True, download_name=job.result['name'])
+        if discard:
+            # 文件响应是direct_passthrough的，不会触发call_on_close，改为在文件迭代器关闭时删除
+            response.response = ClosingIterator(response.response, lambda: self.jobs.discard(job))
+        return response
+    
+    def get_search_index(self, save_dir):
+        """取得保存目录对应的搜索索引，首次使用时在后台全量扫描一次"""
+        save_dir = os.path.abspath(save_dir)
+        with self.search_lock:
+            index = self.search_indexes.get(save_dir)
+            if index is None:
+                index = SearchIndex(save_dir, self.storage.volumes(save_dir))
+                self.search_indexes[save_dir] = index
+                threading.Thread(target=index.rebuild, daemon=True).start()
+        return index
+    
+    def set_storage_volumes(self, volumes):
+        """设置附加存储卷，已有的搜索索引随之覆盖新的卷"""
+        self.storage.set_volumes(volumes)
+        with self.search_lock:
+            for save_dir, index in self.search_indexes.items():
+                index.roots = self.storage.volumes(save_dir)
+        for volume in self.storage.extra:
+            self.log_message(f"附加存储卷: {volume} (剩余空间: {self.get_free_space(volume)}GB)")
+    
+    def rebalance_storage(self):
+        try:
+            moved = self.storage.rebalance(self.dir_entry.get(), log=self.log_message)
+            if moved:
+                self.log_message(f"存储池均衡完成，共移动 {moved} 个文件")
+            return {'moved': moved}
         except Exception as e:
-            self.log_message(f"删除临时文件失败: {str(e)}")
+            self.log_message(f"存储池均衡失败: {str(e)}")
+            raise
+    
+    def start_rebalancer(self, interval=600):
+        """后台定期均衡存储池，只配置了一个卷时什么也不做"""
+        def run():
+            while True:
+                time.sleep(interval)
+                if self.storage.extra:
+                    self.jobs.submit('rebalance', lambda job: self.rebalance_storage(), description="均衡存储池")
+        threading.Thread(target=run, daemon=True).start()
+    
+    def is_meta_path(self, path, save_dir):
+        """是否是服务器自己的元数据目录(或其中的文件)"""
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(save_dir))
+        return rel.split(os.sep)[0] == META_DIR
     
     def sanitize_filename(self, filename, is_folder=False):
         """安全处理文件名，保留更多原始字符"""
@@ -487,38 +2826,54 @@ class FileServerApp:
         return filename
     
     def get_local_ip(self):
-        """获取本机IP地址"""
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception as e:
-            self.log_message(f"获取本地IP失败: {str(e)}，将使用127.0.0.1")
+        """获取本机IP地址
+        
+        UDP connect只查路由表、不发包，但离线或路由异常时也可能卡住，限时0.5秒。
+        """
+        def probe():
+            with closing(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as s:
+                s.connect(("8.8.8.8", 80))
+                return s.getsockname()[0]
+        
+        ip = call_with_timeout(probe, 0.5)
+        if ip is None:
+            self.log_message("获取本地IP失败，将使用127.0.0.1")
             return "127.0.0.1"
+        return ip
+    
+    def is_local_address(self, ip):
+        """地址是否仍属于本机(能绑定即可)"""
+        with closing(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as sock:
+            try:
+                sock.bind((ip, 0))
+                return True
+            except (socket.error, OverflowError, TypeError):
+                return False
+    
+    def port_available(self, port):
+        with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+            try:
+                sock.bind(('', int(port)))
+                return True
+            except (socket.error, OverflowError, ValueError):
+                return False
     
     def find_available_port(self, start_port=5000, end_port=6000):
         """自动查找可用的端口号"""
         for port in range(start_port, end_port + 1):
-            with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
-                try:
-                    sock.bind(('', port))
-                    self.log_message(f"找到可用端口: {port}")
-                    return port
-                except socket.error:
-                    continue
+            if self.port_available(port):
+                self.log_message(f"找到可用端口: {port}")
+                return port
         self.log_message(f"在{start_port}-{end_port}范围内未找到可用端口，使用默认5000")
         return 5000
     
+    def usable_directory(self, path, timeout=0.5):
+        """目录存在且可写；所在的网络挂载失效时限时返回False"""
+        return bool(call_with_timeout(lambda: os.path.isdir(path) and os.access(path, os.W_OK), timeout))
+    
     def select_best_disk(self):
-        """自动选择剩余空间最多的磁盘"""
-        disks = {}
-        for part in psutil.disk_partitions():
-            if 'cdrom' in part.opts or part.fstype == '':
-                continue
-            usage = psutil.disk_usage(part.mountpoint)
-            disks[part.mountpoint] = usage.free
+        """自动选择剩余空间最多的磁盘，各分区并行探测，没有及时响应的跳过"""
+        disks = {mountpoint: free for mountpoint, (free, _, writable) in probe_partitions().items() if writable}
         
         if not disks:
             return os.path.expanduser("~")  # 如果没有找到磁盘，使用用户目录
@@ -527,10 +2882,35 @@ class FileServerApp:
         self.log_message(f"自动选择存储路径: {best_disk} (剩余空间: {disks[best_disk]/1024/1024/1024:.2f}GB)")
         return best_disk
     
+    def discover_volumes(self):
+        """其它每个磁盘上的server_data目录，作为附加存储卷的候选"""
+        primary = self.dir_entry.get()
+        primary_dev = call_with_timeout(lambda: os.stat(primary).st_dev, 0.5)
+        volumes = []
+        devices = set()
+        for mountpoint, (_, dev, writable) in probe_partitions().items():
+            if dev == primary_dev or dev in devices or not writable:
+                continue
+            devices.add(dev)
+            volumes.append(os.path.join(mountpoint, "server_data"))
+        return volumes
+    
+    def remember_config(self):
+        """记下当前的保存目录、地址、端口和存储池设置，下次启动直接沿用"""
+        self.config.update({
+            'save_dir': os.path.abspath(self.dir_entry.get()),
+            'host': self.host_entry.get(),
+            'port': int(self.port_entry.get()),
+            'volumes': self.storage.extra,
+            'placement': self.storage.policy
+        })
+        save_config(self.config)
+    
     def get_free_space(self, path):
         """获取指定路径的剩余空间(GB)"""
         try:
-            usage = psutil.disk_usage(path)
+            with self.timings.phase('free_space'):
+                usage = psutil.disk_usage(path)
             return f"{usage.free/1024/1024/1024:.2f}"
         except:
             return "未知"
@@ -569,7 +2949,35 @@ class FileServerApp:
         
         # 磁盘信息按钮
         disk_info_btn = tk.Button(config_frame, text="查看磁盘信息", command=self.show_disk_info)
-        disk_info_btn.grid(row=3, column=0, columnspan=3, pady=5)
+        disk_info_btn.grid(row=3, column=0, pady=5)
+        
+        # 性能诊断: 请求分阶段计时开关和采样分析
+        self.timing_var = tk.BooleanVar(value=False)
+        timing_check = tk.Checkbutton(config_frame, text="记录请求耗时", variable=self.timing_var,
+                                      command=self.toggle_timing)
+        timing_check.grid(row=3, column=1, pady=5)
+        
+        profile_btn = tk.Button(config_frame, text="采样分析(10秒)", command=self.start_profile)
+        profile_btn.grid(row=3, column=2, padx=5, pady=5)
+        
+        # 存储池: 附加存储卷(分号分隔)和放置策略
+        tk.Label(config_frame, text="附加存储卷:").grid(row=4, column=0, sticky=tk.W)
+        self.volume_entry = tk.Entry(config_frame)
+        self.volume_entry.grid(row=4, column=1, sticky=tk.EW)
+        self.volume_entry.bind("<Return>", lambda event: self.apply_storage_settings())
+        add_volume_btn = tk.Button(config_frame, text="添加卷...", command=self.add_storage_volume)
+        add_volume_btn.grid(row=4, column=2, padx=5)
+        
+        tk.Label(config_frame, text="放置策略:").grid(row=5, column=0, sticky=tk.W)
+        self.placement_var = tk.StringVar(value='most-free')
+        placement_box = ttk.Combobox(config_frame, textvariable=self.placement_var,
+                                     values=StoragePool.POLICIES, state='readonly')
+        placement_box.grid(row=5, column=1, sticky=tk.W)
+        placement_box.bind("<<ComboboxSelected>>", lambda event: self.apply_storage_settings())
+        rebalance_btn = tk.Button(config_frame, text="均衡存储池",
+                                  command=lambda: self.jobs.submit('rebalance', lambda job: self.rebalance_storage(),
+                                                                   description="均衡存储池"))
+        rebalance_btn.grid(row=5, column=2, padx=5, pady=5)
         
         # 下载面板
         download_frame = tk.LabelFrame(self.root, text="文件访问", padx=10, pady=10)
@@ -607,6 +3015,16 @@ class FileServerApp:
         browser_frame = tk.LabelFrame(self.root, text="服务器文件浏览器", padx=10, pady=10)
         browser_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
+        # 搜索栏: 通过索引按名称查找，结果平铺在树中
+        search_frame = tk.Frame(browser_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        tk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.search_entry = tk.Entry(search_frame)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.search_entry.bind("<Return>", lambda event: self.search_files())
+        tk.Button(search_frame, text="搜索", command=self.search_files).pack(side=tk.LEFT)
+        tk.Button(search_frame, text="清除", command=self.refresh_file_browser).pack(side=tk.LEFT, padx=5)
+        
         # 创建Treeview和滚动条
         self.tree = ttk.Treeview(browser_frame, columns=('size', 'modified'), selectmode='browse')
         self.tree.heading('#0', text='名称')
@@ -618,13 +3036,13 @@ class FileServerApp:
         self.tree.column('size', width=100)
         self.tree.column('modified', width=150)
         
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(browser_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # 添加滚动条，滚动到未加载完的目录末尾时插入下一页
+        self.tree_scrollbar = ttk.Scrollbar(browser_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
         
         # 布局Treeview和滚动条
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # 添加右键菜单
         self.popup_menu = tk.Menu(self.root, tearoff=0)
@@ -632,11 +3050,15 @@ class FileServerApp:
         self.popup_menu.add_command(label="查看", command=self.view_selected_item)
         self.popup_menu.add_command(label="删除", command=self.delete_selected_item)
         self.popup_menu.add_command(label="编辑", command=self.edit_selected_file)
+        self.popup_menu.add_command(label="复制到...", command=lambda: self.copy_move_selected_item('copy'))
+        self.popup_menu.add_command(label="移动到...", command=lambda: self.copy_move_selected_item('move'))
         self.popup_menu.add_command(label="刷新", command=self.refresh_file_browser)
         
         # 绑定事件
         self.tree.bind("<Button-3>", self.show_popup_menu)
         self.tree.bind("<Double-1>", self.on_tree_double_click)
+        self.tree.bind("<<TreeviewOpen>>", self.on_tree_open)
+        self.tree.bind("<<TreeviewClose>>", self.on_tree_close)
         
         # 日志区域
         log_frame = tk.LabelFrame(self.root, text="服务器日志", padx=10, pady=10)
@@ -675,8 +3097,29 @@ class FileServerApp:
             self.dir_entry.insert(0, selected_dir)
             self.log_message(f"保存目录更改为: {selected_dir}")
             self.log_message(f"该目录剩余空间: {self.get_free_space(selected_dir)}GB")
+            self.remember_config()
             self.refresh_file_browser()
     
+    def add_storage_volume(self):
+        """选择一个目录加入存储池"""
+        selected_dir = filedialog.askdirectory()
+        if selected_dir:
+            volumes = [v for v in self.volume_entry.get().split(';') if v.strip()]
+            self.volume_entry.delete(0, tk.END)
+            self.volume_entry.insert(0, ';'.join(volumes + [selected_dir]))
+            self.apply_storage_settings()
+    
+    def apply_storage_settings(self):
+        """把界面上的附加存储卷和放置策略应用到存储池"""
+        try:
+            self.storage.policy = self.placement_var.get()
+            self.set_storage_volumes([v.strip() for v in self.volume_entry.get().split(';') if v.strip()])
+            self.log_message(f"存储池放置策略: {self.storage.policy}")
+            self.remember_config()
+            self.refresh_file_browser()
+        except Exception as e:
+            messagebox.showerror("错误", f"设置存储卷失败: {str(e)}")
+    
     def browse_download_file(self):
         """打开文件选择对话框"""
         current_save_dir = self.dir_entry.get()
@@ -695,7 +3138,7 @@ class FileServerApp:
     def generate_download_link(self):
         """生成下载链接"""
         file_path = self.download_entry.get()
-        if not file_path or not os.path.exists(file_path):
+        if not file_path or not self.storage.exists(file_path, self.dir_entry.get()):
             messagebox.showerror("错误", "请选择有效的文件路径")
             return
         
@@ -714,12 +3157,12 @@ class FileServerApp:
     def generate_view_link(self):
         """生成查看文件内容的链接"""
         file_path = self.download_entry.get()
-        if not file_path or not os.path.exists(file_path):
+        if not file_path or not self.storage.exists(file_path, self.dir_entry.get()):
             messagebox.showerror("错误", "请选择有效的文件路径")
             return
         
         # 检查是否是目录
-        if os.path.isdir(file_path):
+        if os.path.isdir(self.storage.locate(file_path, self.dir_entry.get())):
             messagebox.showerror("错误", "不能查看目录内容")
             return
         
@@ -735,6 +3178,26 @@ class FileServerApp:
         self.view_link_var.set(view_url)
         self.log_message(f"生成的查看链接: {view_url}")
     
+    def toggle_timing(self):
+        """界面开关请求计时"""
+        self.timings.enabled = self.timing_var.get()
+        self.log_message(f"请求计时已{'开启' if self.timings.enabled else '关闭'}，"
+                         f"结果见 /debug/timings")
+    
+    def start_profile(self, seconds=10):
+        """后台采样分析，结果写入临时文件"""
+        def run():
+            counts = sample_stacks(seconds)
+            path = os.path.join(tempfile.gettempdir(),
+                                f"wormhole_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            self.log_message(f"采样分析完成，结果已保存到: {path}")
+        
+        self.log_message(f"开始采样分析 {seconds} 秒...")
+        threading.Thread(target=run, daemon=True).start()
+    
     def show_disk_info(self):
         """显示所有磁盘信息"""
         disk_info = "磁盘空间信息:\n"
@@ -750,11 +3213,28 @@ class FileServerApp:
                 f"文件系统: {part.fstype}\n\n"
             )
         
+        # 保存目录的du式占用明细，取自索引中的目录汇总，不遍历磁盘
+        save_dir = self.dir_entry.get()
+        index = self.get_search_index(save_dir)
+        usage = index.usage(save_dir, limit=15)
+        disk_info += (
+            f"保存目录占用: {save_dir}\n"
+            f"总大小: {self.format_size(usage['size'])} | "
+            f"文件: {usage['files']} | 目录: {usage['dirs']}"
+            f"{'' if usage['complete'] else ' (后台统计尚未完成)'}\n\n"
+        )
+        for rank, item in enumerate(usage['items']):
+            disk_info += f"{self.format_size(item['size']):>10}  {item['path']}{os.sep if item['is_dir'] else ''}\n"
+            if item['is_dir'] and rank < 5:
+                # 最大的几个目录再展开一层
+                for child in index.usage(os.path.join(save_dir, item['path']), limit=5)['items']:
+                    disk_info += f"{self.format_size(child['size']):>10}      {child['path']}{os.sep if child['is_dir'] else ''}\n"
+        
         # 在新窗口中显示磁盘信息
         info_window = tk.Toplevel(self.root)
         info_window.title("磁盘空间信息")
         
-        text_area = scrolledtext.ScrolledText(info_window, wrap=tk.WORD, width=70, height=15)
+        text_area = scrolledtext.ScrolledText(info_window, wrap=tk.WORD, width=80, height=30)
         text_area.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         text_area.insert(tk.END, disk_info)
         text_area.config(state=tk.DISABLED)
@@ -762,70 +3242,171 @@ class FileServerApp:
         close_btn = tk.Button(info_window, text="关闭", command=info_window.destroy)
         close_btn.pack(pady=5)
     
+    def process_ui_queue(self):
+        """在Tk主线程中执行后台线程提交的界面更新"""
+        # 只处理本轮开始时已在队列中的，处理过程中新加入的留到下一轮
+        for _ in range(self.ui_queue.qsize()):
+            func, args = self.ui_queue.get_nowait()
+            try:
+                func(*args)
+            except Exception as e:
+                self.log_message(f"界面更新失败: {str(e)}")
+        self.root.after(50, self.process_ui_queue)
+    
+    def run_in_ui(self, func, *args):
+        """从任意线程把界面操作交给Tk主线程"""
+        self.ui_queue.put((func, args))
+    
     def refresh_file_browser(self):
-        """刷新文件浏览器"""
+        """刷新文件浏览器: 只列出保存目录这一层，子目录展开时再加载"""
         current_save_dir = self.dir_entry.get()
+        self.clear_tree()
+        root_node = self.tree.insert('', 'end', text=current_save_dir, open=True)
+        self.load_tree_node(root_node, current_save_dir)
+    
+    def clear_tree(self):
+        # 递增代数，仍在后台加载的旧结果回来后直接丢弃
+        self.tree_generation += 1
+        self.tree_pending.clear()
+        self.tree.delete(*self.tree.get_children())
+    
+    def scan_directory(self, path, save_dir):
+        """后台线程: 合并各卷列出一层目录并取得大小和修改时间，目录在前、按名称排序"""
+        folders = []
+        files = []
+        for name, item_path in self.storage.listdir(path, save_dir).items():
+            try:
+                stat = os.stat(item_path)
+            except OSError:
+                continue
+            modified = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            if os.path.isdir(item_path):
+                folders.append(name)
+            else:
+                files.append((name.lower(), name, False, (self.format_size(stat.st_size), modified)))
+        sizes = self.get_search_index(save_dir).dir_sizes([os.path.join(path, name) for name in folders])
+        rows = [(name.lower(), name, True, self.folder_values(sizes, os.path.join(path, name))) for name in folders]
+        rows.sort()
+        files.sort()
+        return [row[1:] for row in rows + files]
+    
+    def load_tree_node(self, node, path):
+        """在后台线程中列出目录，完成后把第一页条目插入节点"""
+        generation = self.tree_generation
+        save_dir = self.dir_entry.get()
         
-        # 清空现有内容
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        def work():
+            try:
+                rows = self.scan_directory(path, save_dir)
+            except Exception as e:
+                self.run_in_ui(self.log_message, f"无法打开目录 {path}: {str(e)}")
+                return
+            self.run_in_ui(self.fill_tree_node, node, rows, generation)
         
-        # 添加根节点
-        root_node = self.tree.insert('', 'end', text=current_save_dir, open=True)
+        threading.Thread(target=work, daemon=True).start()
+    
+    def fill_tree_node(self, node, rows, generation):
+        if generation != self.tree_generation or not self.tree.exists(node):
+            return
+        self.tree.delete(*self.tree.get_children(node))
+        self.tree_pending[node] = rows
+        self.insert_tree_page(node)
+    
+    def insert_tree_page(self, node):
+        """插入节点下的下一页条目，其余的留到滚动到末尾时再插入
+        
+        Treeview为每个条目创建控件数据，十万个条目一次插入会让界面卡住很久。
+        子目录先放一个占位子节点显示展开箭头，展开时才去列出。
+        """
+        rows = self.tree_pending.pop(node, [])
+        for child in self.tree.get_children(node):
+            if 'more' in self.tree.item(child, 'tags'):
+                self.tree.delete(child)
+        for name, is_dir, values in rows[:self.TREE_PAGE]:
+            if is_dir:
+                child = self.tree.insert(node, 'end', text=name, values=values, tags=('folder',))
+                self.tree.insert(child, 'end', text='加载中...', tags=('placeholder',))
+            else:
+                self.tree.insert(node, 'end', text=name, values=values)
+        rest = rows[self.TREE_PAGE:]
+        if rest:
+            self.tree_pending[node] = rest
+            self.tree.insert(node, 'end', text=f"... 还有 {len(rest)} 项", tags=('more',))
+    
+    def on_tree_scroll(self, first, last):
+        """滚动到某个未加载完的目录末尾时接着插入下一页"""
+        self.tree_scrollbar.set(first, last)
+        if self.tree_pending:
+            self.root.after_idle(self.load_visible_pages)
+    
+    def load_visible_pages(self):
+        for node in list(self.tree_pending):
+            if not self.tree.exists(node):
+                self.tree_pending.pop(node, None)
+                continue
+            children = self.tree.get_children(node)
+            if children and self.tree.item(node, 'open') and self.tree.bbox(children[-1]):
+                self.insert_tree_page(node)
+    
+    def on_tree_open(self, event):
+        """展开文件夹时在后台加载其内容"""
+        node = self.tree.focus()
+        if self.is_folder(node):
+            self.load_tree_node(node, self.get_full_path(node))
+    
+    def on_tree_close(self, event):
+        """折叠时释放子节点，下次展开重新加载"""
+        node = self.tree.focus()
+        if self.is_folder(node):
+            self.tree_pending.pop(node, None)
+            self.tree.delete(*self.tree.get_children(node))
+            self.tree.insert(node, 'end', text='加载中...', tags=('placeholder',))
+    
+    def search_files(self):
+        """在索引中搜索，结果以相对路径平铺在保存目录节点下"""
+        query = self.search_entry.get().strip()
+        if not query:
+            self.refresh_file_browser()
+            return
         
-        # 添加文件和子目录
-        try:
-            for item in os.listdir(current_save_dir):
-                item_path = os.path.join(current_save_dir, item)
-                if os.path.isdir(item_path):
-                    node = self.tree.insert(root_node, 'end', text=item, values=('文件夹', ''))
-                    # 预加载一级子目录
-                    self.load_subdirectories(node, item_path)
-                else:
-                    size = os.path.getsize(item_path)
-                    modified = datetime.fromtimestamp(os.path.getmtime(item_path)).strftime('%Y-%m-%d %H:%M:%S')
-                    self.tree.insert(root_node, 'end', text=item, values=(self.format_size(size), modified))
-        except Exception as e:
-            self.log_message(f"刷新文件浏览器失败: {str(e)}")
+        current_save_dir = self.dir_entry.get()
+        # 含通配符时按文件名匹配，否则按路径子串匹配
+        if any(ch in query for ch in '*?['):
+            items = self.get_search_index(current_save_dir).search(glob=query, limit=1000)
+        else:
+            items = self.get_search_index(current_save_dir).search(q=query, limit=1000)
+        
+        self.clear_tree()
+        root_node = self.tree.insert('', 'end', text=current_save_dir, open=True)
+        for item in items:
+            modified = datetime.fromtimestamp(item['modified']).strftime('%Y-%m-%d %H:%M:%S')
+            if item['is_dir']:
+                node = self.tree.insert(root_node, 'end', text=item['path'], values=('文件夹', modified), tags=('folder',))
+                self.tree.insert(node, 'end', text='加载中...', tags=('placeholder',))
+            else:
+                self.tree.insert(root_node, 'end', text=item['path'], values=(self.format_size(item['size']), modified))
+        self.log_message(f"搜索 \"{query}\": {len(items)} 个结果")
     
-    def load_subdirectories(self, parent_node, path):
-        """加载子目录"""
-        try:
-            for item in os.listdir(path):
-                item_path = os.path.join(path, item)
-                if os.path.isdir(item_path):
-                    self.tree.insert(parent_node, 'end', text=item, values=('文件夹', ''))
-        except:
-            pass
+    def folder_values(self, sizes, path):
+        """文件夹节点显示汇总大小和文件数，索引尚未统计到时显示“文件夹”"""
+        aggregate = sizes.get(path)
+        if aggregate is None:
+            return ('文件夹', '')
+        return (self.format_size(aggregate['size']), f"{aggregate['files']} 个文件")
+    
+    def is_folder(self, item):
+        return 'folder' in self.tree.item(item, 'tags')
+    
+    def is_placeholder(self, item):
+        tags = self.tree.item(item, 'tags')
+        return 'placeholder' in tags or 'more' in tags
     
     def on_tree_double_click(self, event):
-        """双击树节点事件"""
-        item = self.tree.selection()[0]
-        text = self.tree.item(item, 'text')
-        parent = self.tree.parent(item)
-        
-        # 如果是文件夹，展开/折叠
-        if self.tree.item(item, 'values')[0] == '文件夹':
-            if self.tree.item(item, 'open'):
-                self.tree.item(item, open=False)
-                # 清除子节点以便下次展开时重新加载
-                for child in self.tree.get_children(item):
-                    self.tree.delete(child)
-            else:
-                # 加载子目录
-                path = self.get_full_path(item)
-                try:
-                    for sub_item in os.listdir(path):
-                        sub_item_path = os.path.join(path, sub_item)
-                        if os.path.isdir(sub_item_path):
-                            self.tree.insert(item, 'end', text=sub_item, values=('文件夹', ''))
-                        else:
-                            size = os.path.getsize(sub_item_path)
-                            modified = datetime.fromtimestamp(os.path.getmtime(sub_item_path)).strftime('%Y-%m-%d %H:%M:%S')
-                            self.tree.insert(item, 'end', text=sub_item, values=(self.format_size(size), modified))
-                    self.tree.item(item, open=True)
-                except Exception as e:
-                    self.log_message(f"无法打开目录 {path}: {str(e)}")
+        """双击"还有N项"时插入下一页；文件夹的展开/折叠由Treeview自身处理"""
+        item = self.tree.identify_row(event.y)
+        if item and 'more' in self.tree.item(item, 'tags'):
+            self.insert_tree_page(self.tree.parent(item))
+            return 'break'
     
     def get_full_path(self, item):
         """获取树节点的完整路径"""
@@ -838,7 +3419,7 @@ class FileServerApp:
     def show_popup_menu(self, event):
         """显示右键菜单"""
         item = self.tree.identify_row(event.y)
-        if item:
+        if item and not self.is_placeholder(item):
             self.tree.selection_set(item)
             self.popup_menu.post(event.x_root, event.y_root)
     
@@ -870,10 +3451,9 @@ class FileServerApp:
         
         item = selected_item[0]
         item_text = self.tree.item(item, 'text')
-        item_values = self.tree.item(item, 'values')
         
         # 检查是否是文件夹
-        if item_values[0] == '文件夹':
+        if self.is_folder(item):
             messagebox.showerror("错误", "不能查看文件夹内容")
             return
         
@@ -905,65 +3485,233 @@ class FileServerApp:
             return
         
         try:
-            if item_values[0] == '文件夹':
-                shutil.rmtree(full_path)
-            else:
-                os.remove(full_path)
-            
+            # 文件或目录可能在存储池的任意卷上，移入回收目录后由后台任务删除
+            self.delete_path(full_path, self.dir_entry.get())
             self.log_message(f"已删除: {full_path}")
             self.refresh_file_browser()
         except Exception as e:
             self.log_message(f"删除失败: {str(e)}")
             messagebox.showerror("错误", f"删除失败: {str(e)}")
     
+    def copy_move_selected_item(self, action):
+        """把选中的文件或文件夹复制/移动到输入的路径(相对于保存目录)"""
+        selected_item = self.tree.selection()
+        if not selected_item:
+            return
+        
+        save_dir = os.path.abspath(self.dir_entry.get())
+        src = os.path.abspath(self.get_full_path(selected_item[0]))
+        title = "复制到" if action == 'copy' else "移动到"
+        target = simpledialog.askstring(title, "目标路径(相对于保存目录):",
+                                        initialvalue=os.path.relpath(src, save_dir), parent=self.root)
+        if not target:
+            return
+        
+        dst = self.namespace_path(target, save_dir)
+        if dst is None or src == save_dir or dst == src or dst.startswith(src + os.sep):
+            messagebox.showerror("错误", "无效的目标路径")
+            return
+        if self.storage.exists(dst, save_dir):
+            messagebox.showerror("错误", "目标已存在")
+            return
+        
+        try:
+            if action == 'move':
+                self.move_path(src, dst, save_dir)
+            else:
+                self.copy_path(src, dst, save_dir)
+                self.log_message(f"已开始复制 {src} -> {dst}，完成后刷新即可看到")
+            self.refresh_file_browser()
+        except Exception as e:
+            messagebox.showerror("错误", f"{title}失败: {str(e)}")
+    
     def edit_selected_file(self):
-        """编辑选中的文件"""
+        """编辑选中的文件: 按页加载，大文件只在内存中保留当前这一页"""
         selected_item = self.tree.selection()
         if not selected_item:
             return
         
         item = selected_item[0]
         item_text = self.tree.item(item, 'text')
-        item_values = self.tree.item(item, 'values')
         
         # 检查是否是文件夹
-        if item_values[0] == '文件夹':
+        if self.is_folder(item):
             messagebox.showerror("错误", "不能编辑文件夹")
             return
         
-        # 获取完整路径
-        full_path = self.get_full_path(item)
-        
-        # 读取文件内容
-        try:
-            with open(full_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            messagebox.showerror("错误", f"无法读取文件: {str(e)}")
-            return
+        # 获取完整路径(存储池中实际所在的卷)；保存目录在这里取好，后台保存任务不能访问Tk控件
+        save_dir = os.path.abspath(self.dir_entry.get())
+        full_path = self.storage.locate(self.get_full_path(item), save_dir)
+        index = self.line_indexes.get(full_path)
+        # 当前页: 起始行号、在文件中的字节范围、行数和换行符
+        state = {'start': 0, 'begin': 0, 'end': 0, 'size': 0, 'lines': 0, 'total': None,
+                 'newline': '\n', 'busy': False}
         
         # 创建编辑窗口
         edit_window = tk.Toplevel(self.root)
         edit_window.title(f"编辑文件: {item_text}")
         
+        # 翻页栏
+        nav_frame = tk.Frame(edit_window)
+        nav_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+        prev_btn = tk.Button(nav_frame, text="上一页", command=lambda: navigate(state['start'] - self.EDIT_PAGE_LINES))
+        prev_btn.pack(side=tk.LEFT)
+        next_btn = tk.Button(nav_frame, text="下一页", command=lambda: navigate(state['start'] + state['lines']))
+        next_btn.pack(side=tk.LEFT, padx=5)
+        tk.Label(nav_frame, text="跳转到行:").pack(side=tk.LEFT)
+        line_entry = tk.Entry(nav_frame, width=12)
+        line_entry.pack(side=tk.LEFT, padx=5)
+        goto_btn = tk.Button(nav_frame, text="跳转", command=lambda: goto())
+        goto_btn.pack(side=tk.LEFT)
+        status_label = tk.Label(nav_frame, text="加载中...")
+        status_label.pack(side=tk.RIGHT)
+        
         # 文本编辑区域
         text_area = scrolledtext.ScrolledText(edit_window, wrap=tk.WORD, width=80, height=30)
         text_area.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        text_area.insert(tk.END, content)
         
-        # 保存按钮
-        def save_changes():
-            new_content = text_area.get("1.0", tk.END)
+        def set_busy(busy):
+            state['busy'] = busy
+            for button in (prev_btn, next_btn, goto_btn, save_btn):
+                button.config(state=tk.DISABLED if busy else tk.NORMAL)
+        
+        def load(start):
+            # 在后台线程中定位并读取一页，读完再交给界面线程显示
+            set_busy(True)
+            status_label.config(text=f"正在读取第 {start + 1} 行...")
+            
+            def work():
+                try:
+                    data, begin, size, total = index.read_window(start, self.EDIT_PAGE_LINES, self.EDIT_PAGE_BYTES)
+                    text = data.decode('utf-8')
+                except UnicodeDecodeError:
+                    self.run_in_ui(failed, "文件不是UTF-8文本，无法编辑")
+                    return
+                except Exception as e:
+                    self.run_in_ui(failed, f"无法读取文件: {str(e)}")
+                    return
+                self.run_in_ui(show_page, start, text, begin, begin + len(data), size, total)
+            
+            threading.Thread(target=work, daemon=True).start()
+        
+        def failed(message):
+            if edit_window.winfo_exists():
+                messagebox.showerror("错误", message, parent=edit_window)
+                set_busy(False)
+        
+        def show_page(start, text, begin, end, size, total):
+            if not edit_window.winfo_exists():
+                return
+            newline = '\r\n' if '\r\n' in text else '\n'
+            lines = text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+            state.update(start=start, begin=begin, end=end, size=size, lines=lines, total=total, newline=newline)
+            text_area.delete('1.0', tk.END)
+            text_area.insert('1.0', text.replace('\r\n', '\n'))
+            text_area.edit_modified(False)
+            total_text = total if total is not None else '?'
+            status_label.config(text=f"第 {start + 1}-{start + lines} 行 / 共 {total_text} 行 ({self.format_size(size)})")
+            set_busy(False)
+        
+        def confirm_discard(then):
+            """当前页有修改时先询问是否保存，返回False表示取消操作"""
+            if not text_area.edit_modified():
+                return True
+            answer = messagebox.askyesnocancel("未保存的修改", "当前页有未保存的修改，是否先保存？", parent=edit_window)
+            if answer:
+                save_changes(then)
+            return answer is False
+        
+        def navigate(start):
+            if state['busy'] or (state['lines'] == 0 and start > state['start']):
+                return
+            start = max(0, start)
+            if state['total'] is not None and start >= state['total']:
+                return
+            if confirm_discard(lambda: load(start)):
+                load(start)
+        
+        def goto():
             try:
-                with open(full_path, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
-                self.log_message(f"已更新文件: {full_path}")
+                navigate(int(line_entry.get()) - 1)
+            except ValueError:
+                messagebox.showerror("错误", "请输入行号", parent=edit_window)
+        
+        # 保存按钮
+        def save_changes(then=None):
+            # 只把当前页拼回原文件，前后未改动的部分由后台任务按块复制
+            content = text_area.get('1.0', 'end-1c').replace('\n', state['newline']).encode('utf-8')
+            set_busy(True)
+            status_label.config(text="保存中...")
+            job = self.jobs.submit('edit', self._splice_file, full_path, state['begin'], state['end'], content,
+                                   save_dir, description=f"保存 {item_text}")
+            whole = state['begin'] == 0 and state['end'] == state['size']
+            
+            def wait():
+                job.wait()
+                self.run_in_ui(saved, job, then, whole)
+            
+            threading.Thread(target=wait, daemon=True).start()
+        
+        def saved(job, then, whole):
+            if not edit_window.winfo_exists():
+                return
+            if job.status != 'done':
+                failed(f"保存失败: {job.error or job.status}")
+                return
+            self.log_message(f"已更新文件: {full_path}")
+            text_area.edit_modified(False)
+            if then is not None:
+                then()
+            elif whole:
+                # 整个文件只有一页时和以前一样保存后关闭
+                edit_window.destroy()
+            else:
+                # 字节偏移已经变化，重新读取当前页
+                load(state['start'])
+        
+        def close():
+            if confirm_discard(edit_window.destroy):
                 edit_window.destroy()
-            except Exception as e:
-                messagebox.showerror("错误", f"保存失败: {str(e)}")
         
         save_btn = tk.Button(edit_window, text="保存", command=save_changes)
         save_btn.pack(pady=5)
+        edit_window.protocol("WM_DELETE_WINDOW", close)
+        load(0)
+    
+    def _splice_file(self, job, path, begin, end, data, save_dir):
+        """后台任务: 把文件中[begin, end)的字节替换为data
+        
+        在同一卷的临时目录中写出新文件后原子替换，未改动的部分按块复制，
+        内存中只有被替换的这一段。
+        """
+        volume = next((volume for volume in self.storage.volumes(save_dir) if path.startswith(volume + os.sep)),
+                      save_dir)
+        temp_dir = os.path.join(volume, META_DIR, 'uploads')
+        os.makedirs(temp_dir, exist_ok=True)
+        temp = os.path.join(temp_dir, f"edit_{uuid.uuid4().hex}")
+        job.temp_files.append(temp)
+        
+        def copy(src, dst, length=None):
+            while length is None or length > 0:
+                chunk = src.read(1024 * 1024 if length is None else min(1024 * 1024, length))
+                if not chunk:
+                    break
+                dst.write(chunk)
+                job.advance(len(chunk))
+                if length is not None:
+                    length -= len(chunk)
+        
+        with open(path, 'rb') as src, open(temp, 'wb') as dst:
+            job.total = os.fstat(src.fileno()).st_size - (end - begin) + len(data)
+            copy(src, dst, begin)
+            dst.write(data)
+            job.advance(len(data))
+            src.seek(end)
+            copy(src, dst)
+        shutil.copymode(path, temp)
+        os.replace(temp, path)
+        self.get_search_index(save_dir).add(path)
+        return {'path': path, 'size': job.total}
     
     def format_size(self, size):
         """格式化文件大小"""
@@ -973,6 +3721,17 @@ class FileServerApp:
             size /= 1024.0
         return f"{size:.1f} TB"
     
+    def serve_forever(self):
+        """无界面模式: 在当前线程运行服务器直到进程结束"""
+        host = self.host_entry.get()
+        port = int(self.port_entry.get())
+        self.log_message(f"服务器已启动，监听 {host}:{port}")
+        self.log_message(f"保存目录: {self.dir_entry.get()}")
+        self.get_search_index(self.dir_entry.get())
+        self.start_rebalancer()
+        self.collect_trash(self.dir_entry.get())
+        self.app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
+    
     def start_server(self):
         host = self.host_entry.get()
         port = self.port_entry.get()
@@ -994,20 +3753,58 @@ class FileServerApp:
         self.status_bar.config(text="服务器运行中...")
         self.log_message(f"服务器已启动，监听 {host}:{port}")
         self.log_message(f"默认保存目录: {self.default_save_dir}")
-        self.log_message(f"当前保存目录剩余空间: {self.get_free_space(self.dir_entry.get())}GB")
-        self.log_message("等待连接...")
+        self.remember_config()
+        
+        # 其余的启动工作等窗口显示出来之后在后台进行；保存目录在Tk线程中取好再传给后台线程
+        self.root.after(100, lambda: threading.Thread(target=self.finish_startup, args=(self.dir_entry.get(),),
+                                                      daemon=True).start())
         
         # 刷新文件浏览器
         self.refresh_file_browser()
     
+    def finish_startup(self, save_dir):
+        """后台线程: 查询剩余空间、打开搜索索引、启动存储池均衡和回收目录清理"""
+        self.log_message(f"当前保存目录剩余空间: {self.get_free_space(save_dir)}GB")
+        self.log_message("等待连接...")
+        self.get_search_index(save_dir)
+        self.start_rebalancer()
+        self.collect_trash(save_dir)
+    
     def log_message(self, message):
+        """记录日志；可以在任意线程中调用，界面模式下由Tk主线程写入日志区"""
+        with self.timings.phase('log'):
+            if self.headless or not hasattr(self, 'log_area'):
+                print(message, flush=True)
+                return
+            self.ui_queue.put((self.append_log, (message,)))
+    
+    def append_log(self, message):
         self.log_area.insert(tk.END, message + "\n")
         self.log_area.see(tk.END)
-        self.root.update()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="虫洞穿透传输器")
+    parser.add_argument('--headless', action='store_true', help="不启动界面，直接在前台运行服务器")
+    parser.add_argument('--dir', help="保存目录，默认自动选择剩余空间最多的磁盘")
+    parser.add_argument('--host', help="监听地址，默认本机IP")
+    parser.add_argument('--port', type=int, help="端口号，默认在5000-6000中自动选择")
+    parser.add_argument('--timing', action='store_true', help="启动时开启请求分阶段计时")
+    parser.add_argument('--volume', action='append', default=[],
+                        help="附加存储卷目录，可重复指定；auto表示其它每个磁盘上的server_data")
+    parser.add_argument('--placement', choices=StoragePool.POLICIES,
+                        help="新文件的放置策略，默认沿用上次的设置或most-free")
+    args = parser.parse_args()
+    
+    if args.headless or tk is None:
+        app = FileServerApp(None, save_dir=args.dir, host=args.host, port=args.port, timing=args.timing,
+                            volumes=args.volume, placement=args.placement)
+        app.serve_forever()
+        sys.exit(0)
+    
     root = tk.Tk()
-    app = FileServerApp(root)
+    app = FileServerApp(root, save_dir=args.dir, host=args.host, port=args.port, timing=args.timing,
+                        volumes=args.volume, placement=args.placement)
+    app.timing_var.set(args.timing)
     # 在界面创建完成后再启动服务器
     app.start_server()
     root.mainloop()
\ No newline at end of file
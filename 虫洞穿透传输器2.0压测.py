@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from contextlib import closing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import psutil
+import requests
+
+# 默认测试与本工具同目录的2.0服务器，可用 --server 指定其他版本做对比
+DEFAULT_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "虫洞穿透传输器2.0.py")
+
+class MultipartStream:
+    """把磁盘文件包装成multipart/form-data请求体，按块读取，不把整个文件读入内存"""
+
+    def __init__(self, path, field='file', filename=None, fields=None, chunk_size=1024 * 1024):
+        self.boundary = f"----wormhole{random.getrandbits(64):016x}"
+        self.chunk_size = chunk_size
+        self.file = open(path, 'rb')
+        self.file_size = os.path.getsize(path)
+
+        head = []
+        for name, value in (fields or {}).items():
+            head.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n')
+        head.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                    f'filename="{filename or os.path.basename(path)}"\r\n'
+                    f'Content-Type: application/octet-stream\r\n\r\n')
+        self.head = ''.join(head).encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self.parts = [self.head, None, self.tail]
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def read(self, size=-1):
+        while self.parts:
+            part = self.parts[0]
+            if part is None:
+                chunk = self.file.read(self.chunk_size if size is None or size < 0 else min(size, self.chunk_size))
+                if chunk:
+                    return chunk
+                self.file.close()
+                self.parts.pop(0)
+                continue
+            self.parts.pop(0)
+            return part
+        return b''
+
+class ServerProcess:
+    """以 --headless 方式在子进程中启动服务器，并采样其内存和CPU"""
+
+    def __init__(self, server_script, save_dir, port):
+        self.server_script = server_script
+        self.save_dir = save_dir
+        self.port = port
+        self.process = None
+        self.peak_rss = 0
+        self.sampling = False
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout=30):
+        self.process = subprocess.Popen(
+            [sys.executable, self.server_script, '--headless', '--host', '127.0.0.1',
+             '--port', str(self.port), '--dir', self.save_dir],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"服务器启动失败(退出码 {self.process.returncode})")
+            try:
+                requests.get(f"{self.base_url}/list_files", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError("服务器启动超时")
+
+        self.psutil_process = psutil.Process(self.process.pid)
+        self.sampling = True
+        threading.Thread(target=self.sample, daemon=True).start()
+
+    def sample(self):
+        while self.sampling:
+            try:
+                self.peak_rss = max(self.peak_rss, self.psutil_process.memory_info().rss)
+            except psutil.Error:
+                return
+            time.sleep(0.05)
+
+    def snapshot(self):
+        """当前的(RSS字节数, 累计CPU秒数)"""
+        times = self.psutil_process.cpu_times()
+        return self.psutil_process.memory_info().rss, times.user + times.system
+
+    def stop(self):
+        self.sampling = False
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+def find_free_port():
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def write_random_file(path, size, block=None):
+    block = block or os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            chunk = block[:min(remaining, len(block))]
+            f.write(chunk)
+            remaining -= len(chunk)
+
+class LoadBenchmark:
+    """对服务器依次施加各类负载，每类记录延迟分布、吞吐量和服务器资源占用"""
+
+    def __init__(self, server, work_dir, concurrency=8):
+        self.server = server
+        self.work_dir = work_dir
+        self.concurrency = concurrency
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency * 2)
+        self.session.mount('http://', adapter)
+        self.results = {}
+
+    def run_workload(self, name, tasks, concurrency=None):
+        """并发执行tasks中的每个无参函数，函数返回本次传输的字节数"""
+        latencies = []
+        errors = []
+        transferred = [0]
+        lock = threading.Lock()
+
+        def run(task):
+            start = time.perf_counter()
+            try:
+                size = task()
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                return
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                transferred[0] += size
+
+        rss_before, cpu_before = self.server.snapshot()
+        self.server.peak_rss = rss_before
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency or self.concurrency) as pool:
+            list(pool.map(run, tasks))
+        wall = time.perf_counter() - started
+        rss_after, cpu_after = self.server.snapshot()
+
+        result = {
+            'requests': len(tasks),
+            'errors': len(errors),
+            'first_error': errors[0] if errors else None,
+            'wall_seconds': round(wall, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            'max_ms': round(max(latencies) * 1000, 2) if latencies else None,
+            'requests_per_sec': round(len(latencies) / wall, 2) if wall else None,
+            'mb_per_sec': round(transferred[0] / 1024 / 1024 / wall, 2) if wall else None,
+            'server_cpu_seconds': round(cpu_after - cpu_before, 3),
+            'server_rss_mb': round(rss_after / 1024 / 1024, 1),
+            'server_peak_rss_mb': round(max(self.server.peak_rss, rss_after) / 1024 / 1024, 1),
+        }
+        self.results[name] = result
+        print(f"{name}: {result['requests']}次, 失败{result['errors']}, "
+              f"p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, "
+              f"{result['requests_per_sec']}次/秒, {result['mb_per_sec']}MB/秒, "
+              f"服务器峰值内存 {result['server_peak_rss_mb']}MB")
+        return result
+
+    def check(self, response):
+        response.raise_for_status()
+        data = response.json() if response.headers.get('Content-Type', '').startswith('application/json') else None
+        if data is not None and data.get('status') == 'error':
+            raise RuntimeError(data.get('message'))
+        return response
+
+    def small_uploads(self, count, size):
+        payload = os.urandom(size)
+
+        def upload(index):
+            def task():
+                self.check(self.session.post(
+                    f"{self.server.base_url}/upload",
+                    files={'file': (f"small_{index}.bin", payload)},
+                    data={'original_filename': f"small_{index}.bin"}
+                ))
+                return size
+            return task
+
+        return self.run_workload('small_uploads', [upload(i) for i in range(count)])
+
+    def large_uploads(self, count, size):
+        source = os.path.join(self.work_dir, 'large_upload.bin')
+        write_random_file(source, size)
+
+        def upload(index):
+            def task():
+                body = MultipartStream(source, filename=f"large_{index}.bin",
+                                       fields={'original_filename': f"large_{index}.bin"})
+                self.check(self.session.post(
+                    f"{self.server.base_url}/upload",
+                    data=body,
+                    headers={'Content-Type': body.content_type}
+                ))
+                return size
+            return task
+
+        result = self.run_workload('large_uploads', [upload(i) for i in range(count)],
+                                   concurrency=min(count, self.concurrency))
+        os.remove(source)
+        return result
+
+    def range_downloads(self, count, file_size, range_size):
+        name = 'range_source.bin'
+        write_random_file(os.path.join(self.server.save_dir, name), file_size)
+        rng = random.Random(0)
+        offsets = [rng.randrange(0, max(1, file_size - range_size)) for _ in range(count)]
+
+        def download(offset):
+            def task():
+                response = self.session.get(
+                    f"{self.server.base_url}/download",
+                    params={'path': name},
+                    headers={'Range': f"bytes={offset}-{offset + range_size - 1}"}
+                )
+                if response.status_code != 206:
+                    raise RuntimeError(f"期望206，实际{response.status_code}")
+                return len(response.content)
+            return task
+
+        return self.run_workload('range_downloads', [download(o) for o in offsets])
+
+    def directory_zips(self, count, files, file_size):
+        name = 'zip_source'
+        directory = os.path.join(self.server.save_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        block = os.urandom(file_size)
+        for index in range(files):
+            with open(os.path.join(directory, f"f{index:05d}.bin"), 'wb') as f:
+                f.write(block)
+
+        def download():
+            response = self.session.get(f"{self.server.base_url}/download", params={'path': name}, stream=True)
+            self.check(response)
+            size = 0
+            for chunk in response.iter_content(1024 * 1024):
+                size += len(chunk)
+            return size
+
+        return self.run_workload('directory_zips', [download] * count, concurrency=min(count, 4))
+
+    def large_listing(self, count, entries):
+        name = 'many_entries'
+        directory = os.path.join(self.server.save_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        for index in range(entries):
+            open(os.path.join(directory, f"e{index:06d}.txt"), 'wb').close()
+
+        def listing():
+            response = self.check(self.session.get(f"{self.server.base_url}/list_files", params={'path': name}))
+            return len(response.content)
+
+        return self.run_workload('list_files_large_dir', [listing] * count, concurrency=1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="虫洞穿透传输器压测工具")
+    parser.add_argument('--server', default=DEFAULT_SERVER, help="要测试的服务器脚本")
+    parser.add_argument('--output', help="结果JSON文件，默认 wormhole_bench_<时间>.json")
+    parser.add_argument('--label', default='', help="结果标签，如版本号或修改说明")
+    parser.add_argument('--concurrency', type=int, default=8, help="并发连接数")
+    parser.add_argument('--small-count', type=int, default=500, help="小文件上传次数")
+    parser.add_argument('--small-size', type=float, default=4, help="小文件大小(KB)")
+    parser.add_argument('--large-count', type=int, default=4, help="大文件上传次数")
+    parser.add_argument('--large-size', type=float, default=256, help="大文件大小(MB)")
+    parser.add_argument('--range-count', type=int, default=400, help="Range下载次数")
+    parser.add_argument('--range-size', type=float, default=1024, help="每次Range下载的大小(KB)")
+    parser.add_argument('--zip-count', type=int, default=8, help="目录打包下载次数")
+    parser.add_argument('--zip-files', type=int, default=200, help="被打包目录中的文件数")
+    parser.add_argument('--list-count', type=int, default=5, help="大目录列表请求次数")
+    parser.add_argument('--list-entries', type=int, default=100000, help="大目录中的条目数")
+    parser.add_argument('--only', help="只运行指定负载，逗号分隔: small,large,range,zip,list")
+    parser.add_argument('--keep', action='store_true', help="保留测试目录")
+    args = parser.parse_args(argv)
+
+    selected = set((args.only or 'small,large,range,zip,list').split(','))
+    work_dir = tempfile.mkdtemp(prefix='wormhole-bench-')
+    save_dir = os.path.join(work_dir, 'server_data')
+    os.makedirs(save_dir)
+    server = ServerProcess(args.server, save_dir, find_free_port())
+
+    try:
+        server.start()
+        print(f"服务器: {args.server} ({server.base_url})，测试目录: {work_dir}")
+        bench = LoadBenchmark(server, work_dir, args.concurrency)
+        if 'small' in selected:
+            bench.small_uploads(args.small_count, int(args.small_size * 1024))
+        if 'large' in selected:
+            bench.large_uploads(args.large_count, int(args.large_size * 1024 * 1024))
+        if 'range' in selected:
+            bench.range_downloads(args.range_count, 256 * 1024 * 1024, int(args.range_size * 1024))
+        if 'zip' in selected:
+            bench.directory_zips(args.zip_count, args.zip_files, 64 * 1024)
+        if 'list' in selected:
+            bench.large_listing(args.list_count, args.list_entries)
+    finally:
+        server.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'label': args.label,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'server': os.path.basename(args.server),
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('server', 'output', 'label', 'keep')},
+        'workloads': bench.results,
+    }
+    output = args.output or f"wormhole_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"结果已保存到: {output}")
+    return 1 if any(result['errors'] for result in bench.results.values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
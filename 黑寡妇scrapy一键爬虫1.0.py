@@ -1,25 +1,1374 @@
 import os 
 import re 
-import subprocess 
-import tkinter as tk 
-from tkinter import filedialog, messagebox, ttk
+import sys
+import json
+import time
+import hashlib
+import heapq
+import sqlite3
+import zlib
+import ipaddress
+import html
+import xml.etree.ElementTree as ElementTree
+import queue
+import gzip
+import io
+import uuid
+import http.client
+import base64
+import shutil
+import random
+import tempfile
+from functools import lru_cache
+import threading
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from multiprocessing.connection import wait as wait_connections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+try:
+    import resource
+except ImportError:
+    # Windows没有resource模块，基准测试改用psutil采样
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import tkinter as tk 
+    from tkinter import filedialog, messagebox, ttk
+except ImportError:
+    # 无图形环境的服务器上只能使用命令行模式
+    tk = None
 from scrapy.crawler import CrawlerProcess 
 from scrapy.utils.project import get_project_settings 
-from scrapy import Spider, Request 
+from scrapy import Spider, Request, signals
+from scrapy.exceptions import DontCloseSpider, NotConfigured
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.utils.misc import load_object, build_from_crawler
+from twisted.internet.task import LoopingCall
+import multiprocessing
 import requests 
+import requests.adapters
 from urllib.parse import urlparse, urljoin 
 import m3u8 
-from concurrent.futures import ThreadPoolExecutor 
+from concurrent.futures import ThreadPoolExecutor
+
+class AdaptiveConcurrency:
+    """按主机自适应的并发控制器
+    
+    延迟和错误率健康时按加性增长逐步放开并发，
+    遇到429/5xx或连接错误立即减半并加退避延迟。
+    Scrapy页面请求(经AdaptiveThrottleMiddleware)和线程池里的分段下载共用同一份状态。
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, latency_tolerance=2.0, backoff_delay=2.0):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.latency_tolerance = latency_tolerance
+        self.backoff_delay = backoff_delay
+        self.condition = threading.Condition()
+        self.hosts = {}
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {
+                'limit': float(min(self.initial, self.maximum)),
+                'active': 0,
+                'latency': None,
+                'baseline': None,
+                'delay': 0.0
+            }
+        return state
+
+    def limit_for(self, host):
+        with self.condition:
+            return int(self._state(host)['limit'])
+
+    def delay_for(self, host):
+        with self.condition:
+            return self._state(host)['delay']
+
+    def record(self, host, latency=None, status=None, error=False):
+        with self.condition:
+            state = self._state(host)
+            if error or status == 429 or (status is not None and status >= 500):
+                # 乘性减少并退避
+                state['limit'] = max(self.minimum, state['limit'] / 2)
+                state['delay'] = min(max(state['delay'] * 2, self.backoff_delay), 60.0)
+            else:
+                if latency is not None:
+                    if state['latency'] is None:
+                        state['latency'] = state['baseline'] = latency
+                    else:
+                        state['latency'] = state['latency'] * 0.8 + latency * 0.2
+                        # 基准延迟取观测到的最小值，并缓慢上浮以适应网络变化
+                        state['baseline'] = min(latency, state['baseline'] * 1.01)
+                state['delay'] = state['delay'] / 2 if state['delay'] > 0.05 else 0.0
+                
+                if state['latency'] is None or state['latency'] <= state['baseline'] * self.latency_tolerance:
+                    # 加性增长: 大约每完成limit个健康请求并发+1
+                    state['limit'] = min(self.maximum, state['limit'] + 1.0 / state['limit'])
+                else:
+                    state['limit'] = max(self.minimum, state['limit'] - 1.0 / state['limit'])
+            self.condition.notify_all()
+
+    def acquire(self, host):
+        with self.condition:
+            state = self._state(host)
+            while state['active'] >= int(state['limit']):
+                self.condition.wait()
+            state['active'] += 1
+            delay = state['delay']
+        if delay:
+            time.sleep(delay)
+
+    def release(self, host):
+        with self.condition:
+            self._state(host)['active'] -= 1
+            self.condition.notify_all()
+
+class AdaptiveThrottleMiddleware:
+    """把页面请求的延迟和状态码反馈给爬虫的并发控制器，并同步到Scrapy下载槽"""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_response(self, request, response, spider=None):
+        self._observe(request, response.status)
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        self._observe(request, None, error=True)
+        return None
+
+    def _observe(self, request, status, error=False):
+        throttle = getattr(self.crawler.spider, 'throttle', None)
+        if throttle is None:
+            return
+        host = urlparse(request.url).hostname
+        throttle.record(host, request.meta.get('download_latency'), status, error)
+        
+        slot = self.crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+        if slot is not None:
+            slot.concurrency = throttle.limit_for(host)
+            slot.delay = max(slot.delay, throttle.delay_for(host))
+
+# 调度用的资源分类，未列出的扩展名都按页面处理
+RESOURCE_CLASSES = {
+    'image': {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg'},
+    'media': {'.mp4', '.webm', '.mov', '.avi', '.mkv', '.flv', '.mp3', '.wav', '.ogg', '.m4a', '.flac'},
+    'document': {'.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.zip', '.rar', '.7z', '.tar', '.gz'},
+    'hls': {'.m3u8', '.ts'},
+}
+DEFAULT_CLASS_WEIGHTS = {'page': 8, 'image': 4, 'hls': 2, 'document': 2, 'media': 1}
+
+def parse_class_values(text, scale=1):
+    """解析 "media=2048,image=512" 形式的分类配置，数值乘以scale"""
+    values = {}
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition('=')
+        name = name.strip()
+        if not sep or name not in DEFAULT_CLASS_WEIGHTS:
+            raise ValueError(f"无效的分类配置: {part.strip()}")
+        values[name] = int(float(value) * scale)
+    return values
+
+def parse_extensions(text):
+    return {('.' + ext.strip().lstrip('.')).lower() for ext in (text or '').split(',') if ext.strip()}
+
+class ResourcePolicy:
+    """按资源类型(页面、图片、媒体、文档、HLS)分配调度权重、字节预算和单文件大小上限
+    
+    预算和上限为0表示不限制；skip_extensions中的扩展名一律不下载。
+    """
+
+    def __init__(self, weights=None, budgets=None, max_sizes=None, skip_extensions=()):
+        self.weights = dict(DEFAULT_CLASS_WEIGHTS)
+        self.weights.update(weights or {})
+        self.budgets = dict(budgets or {})
+        self.max_sizes = dict(max_sizes or {})
+        self.skip_extensions = set(skip_extensions)
+        self.used = {name: 0 for name in self.weights}
+        self.lock = threading.Lock()
+
+    def classify(self, url):
+        extension = url_extension(url)
+        for name, extensions in RESOURCE_CLASSES.items():
+            if extension in extensions:
+                return name
+        return 'page'
+
+    def allows(self, url, resource_class=None):
+        if url_extension(url) in self.skip_extensions:
+            return False
+        return not self.exhausted(resource_class or self.classify(url))
+
+    def exhausted(self, resource_class):
+        budget = self.budgets.get(resource_class, 0)
+        return bool(budget) and self.used[resource_class] >= budget
+
+    def fits(self, resource_class, size):
+        limit = self.max_sizes.get(resource_class, 0)
+        return not limit or size <= limit
+
+    def add_bytes(self, resource_class, size):
+        with self.lock:
+            self.used[resource_class] += size
+
+class ResourceClassScheduler(BaseScheduler):
+    """按资源类型分队列的调度器
+    
+    每类资源一个优先级队列，出队时按权重做平滑加权轮询：页面持续被调度，
+    大体积媒体只占固定比例，不会堵住新页面的发现。类型预算用完后该类请求直接丢弃。
+    """
+
+    def __init__(self, dupefilter, stats=None, crawler=None):
+        self.df = dupefilter
+        self.stats = stats
+        self.crawler = crawler
+        self.queues = {}
+        self.current = {}
+        self.counter = 0
+        self.policy = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter_cls = load_object(crawler.settings['DUPEFILTER_CLASS'])
+        return cls(build_from_crawler(dupefilter_cls, crawler), crawler.stats, crawler)
+
+    def open(self, spider):
+        self.spider = spider
+        self.policy = getattr(spider, 'policy', None) or ResourcePolicy()
+        self.queues = {name: [] for name in self.policy.weights}
+        self.current = {name: 0 for name in self.policy.weights}
+        return self.df.open()
+
+    def close(self, reason):
+        return self.df.close(reason)
+
+    def has_pending_requests(self):
+        return len(self) > 0
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def enqueue_request(self, request):
+        if not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+        resource_class = request.meta.get('resource_class') or self.policy.classify(request.url)
+        if not self.policy.allows(request.url, resource_class):
+            self.stats.inc_value(f"scheduler/dropped/{resource_class}")
+            return False
+        limit = self.policy.max_sizes.get(resource_class, 0)
+        if limit and request.method != 'HEAD':
+            request.meta.setdefault('download_maxsize', limit)
+        
+        # heapq取最小值，优先级取负数；计数器保证同优先级先进先出
+        self.counter += 1
+        heapq.heappush(self.queues[resource_class], (-request.priority, self.counter, request))
+        self.stats.inc_value('scheduler/enqueued/memory')
+        self.stats.inc_value('scheduler/enqueued')
+        return True
+
+    def next_request(self):
+        while True:
+            ready = [name for name, queue in self.queues.items() if queue]
+            if not ready:
+                return None
+            # 平滑加权轮询: 每次各类累加自身权重，取最大者并减去总权重
+            total = 0
+            for name in ready:
+                self.current[name] += self.policy.weights[name]
+                total += self.policy.weights[name]
+            chosen = max(ready, key=lambda name: self.current[name])
+            self.current[chosen] -= total
+            
+            request = heapq.heappop(self.queues[chosen])[2]
+            if self.policy.exhausted(chosen):
+                self.stats.inc_value(f"scheduler/dropped/{chosen}")
+                # 入队时被拒的请求由引擎发出request_dropped，出队时丢弃的在这里补发
+                if self.crawler is not None:
+                    self.crawler.signals.send_catch_log(signals.request_dropped, request=request, spider=self.spider)
+                continue
+            self.stats.inc_value('scheduler/dequeued/memory')
+            self.stats.inc_value('scheduler/dequeued')
+            return request
+
+class StreamingDownloader:
+    """大文件流式下载器，边下边写盘，内存占用与文件大小无关
+    
+    超过分段阈值且服务器支持Range的文件会被切成多个字节区间，
+    通过连接池并行拉取并写到预分配文件的对应偏移处；
+    进度记录在旁路状态文件(.part.json)中，中断后可以续传。
+    """
+
+    def __init__(self, chunk_size=1024 * 1024, workers=4, timeout=30, headers=None,
+                 segment_threshold=16 * 1024 * 1024, throttle=None, progress=None):
+        self.chunk_size = chunk_size
+        self.throttle = throttle
+        # 每写入一块调用progress(字节数)，用于实时统计流量
+        self.progress = progress
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.segment_threshold = segment_threshold
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers * 2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def download(self, url, filepath, size=0, accept_ranges=False, validator=None, response_info=None):
+        """下载到filepath；传入response_info(字典)时填入GET响应的状态码、原因、响应头和请求头"""
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        temp_path = filepath + '.part'
+
+        # 服务器支持Range且文件足够大时并行分段拉取，否则单连接分块写入
+        if accept_ranges and self.workers > 1 and size >= self.segment_threshold:
+            self._download_segments(url, temp_path, size, validator, response_info)
+        else:
+            self._download_stream(url, temp_path, response_info)
+
+        os.replace(temp_path, filepath)
+        return filepath
+
+    @contextmanager
+    def open(self, url, headers=None):
+        """发起流式GET请求，并发受按主机的控制器约束，并把延迟和状态反馈回去"""
+        host = urlparse(url).hostname
+        if self.throttle:
+            self.throttle.acquire(host)
+        try:
+            try:
+                response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            except requests.RequestException:
+                if self.throttle:
+                    self.throttle.record(host, error=True)
+                raise
+            if self.throttle:
+                self.throttle.record(host, response.elapsed.total_seconds(), response.status_code)
+            with response:
+                yield response
+        finally:
+            if self.throttle:
+                self.throttle.release(host)
+
+    def _record_response(self, response_info, response, status=None, reason=None, skip=()):
+        if response_info is None or 'status' in response_info:
+            return
+        response_info.update(
+            status=status or response.status_code,
+            reason=reason or response.reason or '',
+            headers=[(name, value) for name, value in response.headers.items() if name.lower() not in skip],
+            request_headers=list(response.request.headers.items())
+        )
+
+    def _download_stream(self, url, path, response_info=None):
+        with self.open(url) as response:
+            response.raise_for_status()
+            self._record_response(response_info, response)
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+                    if self.progress:
+                        self.progress(len(chunk))
+
+    def _download_segments(self, url, path, size, validator, response_info=None):
+        state_path = path + '.json'
+        state = self._load_state(state_path, url, size, validator)
+        if state is None or not os.path.exists(path):
+            part_size = -(-size // self.workers)
+            state = {
+                'url': url,
+                'size': size,
+                'validator': validator,
+                'segments': [[start, min(start + part_size, size) - 1, 0] for start in range(0, size, part_size)]
+            }
+            self._preallocate(path, size)
+        self._save_state(state_path, state)
+
+        lock = threading.Lock()
+        pending = [segment for segment in state['segments'] if segment[0] + segment[2] <= segment[1]]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self._fetch_segment, url, path, segment, state, state_path, lock, response_info)
+                       for segment in pending]
+            for future in futures:
+                future.result()
+
+        os.remove(state_path)
+
+    def _fetch_segment(self, url, path, segment, state, state_path, lock, response_info=None):
+        start, end, done = segment
+        headers = {'Range': f'bytes={start + done}-{end}'}
+        with self.open(url, headers=headers) as response:
+            if response.status_code != 206:
+                raise IOError(f"服务器未按Range返回分段: HTTP {response.status_code}")
+            with lock:
+                # 各分段拼成的是完整实体，按200记录，去掉只属于分段的Content-Range
+                self._record_response(response_info, response, 200, 'OK', skip=('content-range',))
+            fd = os.open(path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                unsaved = 0
+                for chunk in response.iter_content(self.chunk_size):
+                    self._write_at(fd, chunk, start + segment[2])
+                    segment[2] += len(chunk)
+                    if self.progress:
+                        self.progress(len(chunk))
+                    unsaved += len(chunk)
+                    # 每写入若干块记录一次进度，中断后从这里续传
+                    if unsaved >= self.chunk_size * 8:
+                        with lock:
+                            self._save_state(state_path, state)
+                        unsaved = 0
+            finally:
+                os.close(fd)
+        with lock:
+            self._save_state(state_path, state)
+        if start + segment[2] <= end:
+            raise IOError(f"分段下载不完整: {start}-{end}")
+
+    def _write_at(self, fd, data, offset):
+        if hasattr(os, 'pwrite'):
+            while data:
+                written = os.pwrite(fd, data, offset)
+                data = data[written:]
+                offset += written
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+
+    def _preallocate(self, path, size):
+        with open(path, 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, size)
+                    return
+                except OSError:
+                    pass
+            f.truncate(size)
+
+    def _load_state(self, state_path, url, size, validator):
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 远端文件变化(大小或ETag/Last-Modified不同)时不能续传
+        if state.get('url') != url or state.get('size') != size or state.get('validator') != validator:
+            return None
+        return state
+
+    def _save_state(self, state_path, state):
+        temp_state = state_path + '.tmp'
+        with open(temp_state, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_state, state_path)
+
+class ContentStore:
+    """内容寻址存储，相同内容只落盘一次
+    
+    资源正文按SHA-256写入 .objects/ 下，URL对应的路径做成指向它的硬链接；
+    文件系统不支持硬链接(FAT/exFAT、部分网络共享)时复制一份，清单中记为未链接。
+    URL→哈希索引追加写在 url_index.jsonl 中。
+    """
+
+    def __init__(self, output_dir, fsync='none'):
+        self.output_dir = output_dir
+        # always策略下每个对象和链接在返回前刷盘；batch策略由WriteBehindWriter按路径批量刷盘
+        self.fsync = fsync
+        self.objects_dir = os.path.join(output_dir, '.objects')
+        self.staging_dir = os.path.join(self.objects_dir, 'staging')
+        self.index_path = os.path.join(output_dir, 'url_index.jsonl')
+        self.lock = threading.Lock()
+        self.index = {}
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.index[entry['url']] = entry
+        except OSError:
+            pass
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def staging_path(self, url):
+        """流式下载的暂存路径，由URL决定以便中断后续传"""
+        return os.path.join(self.staging_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def put(self, url, filepath, content):
+        digest = hashlib.sha256(content).hexdigest()
+        obj = self.object_path(digest)
+        if not os.path.exists(obj):
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            temp_path = f"{obj}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+                if self.fsync == 'always':
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, obj)
+            if self.fsync == 'always':
+                fsync_directory(os.path.dirname(obj))
+        return self._publish(url, filepath, digest, len(content))
+
+    def put_file(self, url, filepath, temp_path):
+        """把已落盘的暂存文件按内容哈希收入存储"""
+        sha = hashlib.sha256()
+        with open(temp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        size = os.path.getsize(temp_path)
+        obj = self.object_path(digest)
+        if os.path.exists(obj):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            os.replace(temp_path, obj)
+            if self.fsync == 'always':
+                fsync_path(obj)
+                fsync_directory(os.path.dirname(obj))
+        return self._publish(url, filepath, digest, size)
+
+    def _publish(self, url, filepath, digest, size):
+        obj = self.object_path(digest)
+        linked = self._link(obj, filepath)
+        if self.fsync == 'always':
+            if not linked:
+                fsync_path(filepath)
+            fsync_directory(os.path.dirname(filepath))
+        entry = {
+            'url': url,
+            'path': os.path.relpath(filepath, self.output_dir),
+            'sha256': digest,
+            'size': size,
+            'linked': linked
+        }
+        with self.lock:
+            if self.index.get(url) == entry:
+                return entry
+            self.index[url] = entry
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    def _link(self, obj, filepath):
+        """在URL路径上放置对象: 优先硬链接，不支持时复制，返回是否为硬链接"""
+        try:
+            if os.path.exists(filepath) and os.path.samefile(obj, filepath):
+                return True
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        temp_link = f"{filepath}.{threading.get_ident()}.lnk"
+        try:
+            os.link(obj, temp_link)
+            linked = True
+        except OSError:
+            shutil.copyfile(obj, temp_link)
+            linked = False
+        os.replace(temp_link, filepath)
+        return linked
+
+def fsync_path(path):
+    """按路径把已关闭的文件刷到磁盘；Windows上fsync需要可写句柄"""
+    fd = os.open(path, os.O_RDWR | getattr(os, 'O_BINARY', 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_directory(path):
+    """把目录项(新建和改名的文件)刷到磁盘；Windows不能打开目录，跳过"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class WriteBehindWriter:
+    """异步写盘阶段
+    
+    Scrapy回调和下载线程只把写任务放进有界队列就返回，由独立的写线程池负责建目录、
+    写文件和按策略fsync，磁盘慢时不会拖住reactor线程上的网络I/O。
+    排队中的数据总量也有上限，磁盘长期跟不上时才会反压调用方。
+    可选把小文件追加进较大的打包文件(.packs/)，避免海量小文件拖垮文件系统。
+    """
+
+    def __init__(self, output_dir, workers=4, max_pending_bytes=256 * 1024 * 1024,
+                 fsync='batch', fsync_every=256, pack_small=0, pack_size=256 * 1024 * 1024):
+        self.output_dir = output_dir
+        self.fsync = fsync
+        self.fsync_every = fsync_every
+        self.pack_small = pack_small
+        self.pack_size = pack_size
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self.condition = threading.Condition()
+        # batch策略下本批已写但未刷盘的文件路径
+        self.unsynced = []
+        self.created_dirs = set()
+        self.pack_lock = threading.Lock()
+        self.pack_file = None
+        self.pack_index = None
+        self.queue = queue.Queue()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, func, *args, size=0):
+        """把写任务放入队列，排队数据超过上限时阻塞等待"""
+        with self.condition:
+            while self.pending_bytes and self.pending_bytes + size > self.max_pending_bytes:
+                self.condition.wait()
+            self.pending_bytes += size
+        self.queue.put((func, args, size))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            func, args, size = item
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"写入文件时出错: {e}")
+            finally:
+                with self.condition:
+                    self.pending_bytes -= size
+                    self.condition.notify_all()
+
+    def write_file(self, filepath, content):
+        """在写线程中调用: 小文件进打包文件，其余直接写盘"""
+        if self.pack_small and len(content) < self.pack_small:
+            self._append_pack(filepath, content)
+            return
+        directory = os.path.dirname(filepath)
+        if directory not in self.created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self.created_dirs.add(directory)
+        with open(filepath, 'wb') as f:
+            f.write(content)
+            if self.fsync == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+        if self.fsync == 'always':
+            fsync_directory(directory)
+        self.wrote(filepath)
+
+    def wrote(self, *paths):
+        """记录一次写入，batch策略下每写入fsync_every个文件统一刷盘一次
+        
+        文件写完即关闭，这里只记下路径，刷盘时逐个fsync再fsync所在目录。
+        """
+        if self.fsync != 'batch':
+            return
+        with self.condition:
+            self.unsynced.extend(paths)
+            if len(self.unsynced) < self.fsync_every:
+                return
+            batch, self.unsynced = self.unsynced, []
+        self._sync(batch)
+
+    def _sync(self, batch):
+        directories = set()
+        for path in batch:
+            try:
+                fsync_path(path)
+                directories.add(os.path.dirname(path))
+            except OSError as e:
+                print(f"刷盘失败: {path}: {e}")
+        for directory in directories:
+            try:
+                fsync_directory(directory)
+            except OSError as e:
+                print(f"刷盘失败: {directory}: {e}")
+
+    def _append_pack(self, filepath, content):
+        with self.pack_lock:
+            if self.pack_file is None or self.pack_file.tell() + len(content) > self.pack_size:
+                self._open_pack()
+            offset = self.pack_file.tell()
+            self.pack_file.write(content)
+            self.pack_index.write(json.dumps({
+                'path': os.path.relpath(filepath, self.output_dir),
+                'pack': os.path.basename(self.pack_file.name),
+                'offset': offset,
+                'size': len(content)
+            }, ensure_ascii=False) + "\n")
+
+    def _open_pack(self):
+        self._close_pack()
+        pack_dir = os.path.join(self.output_dir, '.packs')
+        os.makedirs(pack_dir, exist_ok=True)
+        number = len([name for name in os.listdir(pack_dir) if name.endswith('.bin')]) + 1
+        self.pack_file = open(os.path.join(pack_dir, f"pack-{number:06d}.bin"), 'ab')
+        self.pack_index = open(os.path.join(pack_dir, 'packs.jsonl'), 'a', encoding='utf-8')
+
+    def _close_pack(self):
+        if self.pack_file is not None:
+            if self.fsync != 'none':
+                for f in (self.pack_file, self.pack_index):
+                    f.flush()
+                    os.fsync(f.fileno())
+                fsync_directory(os.path.dirname(self.pack_file.name))
+            self.pack_file.close()
+            self.pack_index.close()
+            self.pack_file = self.pack_index = None
+
+    def close(self):
+        """等待队列写完并刷盘"""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        with self.pack_lock:
+            self._close_pack()
+        with self.condition:
+            batch, self.unsynced = self.unsynced, []
+        self._sync(batch)
+
+def surt_url(url):
+    """CDX排序键: 域名倒序、去掉www.，如 com,example)/path；IP地址保持原样，如 127.0.0.1)/path"""
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        if host.startswith('www.'):
+            host = host[4:]
+        host = ','.join(reversed(host.split('.')))
+    key = host + ')' + (parsed.path or '/')
+    if parsed.query:
+        key += '?' + parsed.query
+    return key.lower()
+
+CDX_HEADER = " CDX N b a m s k r M S V g\n"
+
+def merge_cdx(warc_dir):
+    """把warc目录下各写入器已排序的CDX归并为index.cdx，整体按SURT键和时间戳排序"""
+    index_path = os.path.join(warc_dir, 'index.cdx')
+    parts = sorted(name for name in os.listdir(warc_dir)
+                   if name.endswith('.cdx') and name != 'index.cdx')
+    files = [open(os.path.join(warc_dir, name), 'r', encoding='utf-8') for name in parts]
+    try:
+        temp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as out:
+            out.write(CDX_HEADER)
+            out.writelines(heapq.merge(*files))
+        os.replace(temp_path, index_path)
+    finally:
+        for f in files:
+            f.close()
+
+class WarcWriter:
+    """WARC 1.1输出，每条记录单独gzip压缩，按大小滚动文件，同时维护CDX索引
+    
+    每次抓取写一条request记录和一条response记录，保留状态码、响应头和请求信息；
+    CDX中记录每条response在.warc.gz中的偏移和压缩长度，可直接定位解压单条记录。
+    多个工作进程共用输出目录时各自写独立的CDX，关闭时排序后归并成index.cdx。
+    """
+
+    # Scrapy和requests都已解压正文，这些头不再与记录中的正文一致
+    DROP_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+    def __init__(self, output_dir, max_size=1024 * 1024 * 1024, prefix='blackwidow', fsync='none'):
+        self.warc_dir = os.path.join(output_dir, 'warc')
+        self.max_size = max_size
+        self.prefix = prefix
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.serial = 0
+        self.file = None
+        self.filename = None
+        os.makedirs(self.warc_dir, exist_ok=True)
+        
+        # 抓取期间按到达顺序写入.cdx.tmp，关闭时排序成.cdx
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self.cdx_path = os.path.join(self.warc_dir, f"{prefix}-{stamp}-{os.getpid()}.cdx")
+        self.cdx = open(self.cdx_path + '.tmp', 'w', encoding='utf-8')
+
+    def _close_file(self):
+        """关闭当前WARC文件，fsync策略不为none时先刷盘"""
+        if self.fsync != 'none':
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            fsync_directory(self.warc_dir)
+        self.file.close()
+        self.file = None
+
+    def _open_next(self):
+        if self.file is not None:
+            self._close_file()
+        self.serial += 1
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        self.filename = f"{self.prefix}-{stamp}-{os.getpid()}-{self.serial:05d}.warc.gz"
+        self.file = open(os.path.join(self.warc_dir, self.filename), 'ab')
+        fields = (
+            "software: blackwidow-spider\r\n"
+            "format: WARC File Format 1.1\r\n"
+            f"hostname: {os.uname().nodename if hasattr(os, 'uname') else ''}\r\n"
+        ).encode('utf-8')
+        self._write_record({
+            'WARC-Type': 'warcinfo',
+            'WARC-Record-ID': f"<urn:uuid:{uuid.uuid4()}>",
+            'WARC-Date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'WARC-Filename': self.filename,
+            'Content-Type': 'application/warc-fields'
+        }, fields)
+
+    def _record_header(self, headers, length):
+        lines = ['WARC/1.1']
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        lines.append(f"Content-Length: {length}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+    def _write_record(self, headers, block, payload_path=None, payload_length=0):
+        """写一条gzip成员记录，返回(偏移, 压缩后长度)"""
+        offset = self.file.tell()
+        length = len(block) + payload_length
+        with gzip.GzipFile(fileobj=self.file, mode='wb') as member:
+            member.write(self._record_header(headers, length))
+            member.write(block)
+            if payload_path:
+                with open(payload_path, 'rb') as f:
+                    shutil.copyfileobj(f, member, 1024 * 1024)
+            member.write(b'\r\n\r\n')
+        return offset, self.file.tell() - offset
+
+    def write_exchange(self, url, status, reason, response_headers, body=b'', body_path=None,
+                       method='GET', request_headers=None, protocol='HTTP/1.1'):
+        """写入一次请求/响应。body_path用于已经流式落盘的大文件，内容分块拷入记录"""
+        if body_path:
+            sha = hashlib.sha1()
+            with open(body_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            body_length = os.path.getsize(body_path)
+        else:
+            sha = hashlib.sha1(body)
+            body_length = len(body)
+        payload_digest = 'sha1:' + base64.b32encode(sha.digest()).decode('ascii')
+        
+        mime = '-'
+        reason = reason or http.client.responses.get(status, '')
+        http_head = [f"{protocol} {status} {reason}".rstrip()]
+        for name, value in response_headers:
+            if name.lower() in self.DROP_HEADERS:
+                continue
+            if name.lower() == 'content-type':
+                mime = value.split(';')[0].strip() or '-'
+            http_head.append(f"{name}: {value}")
+        http_head.append(f"Content-Length: {body_length}")
+        response_block = ('\r\n'.join(http_head) + '\r\n\r\n').encode('utf-8', 'replace')
+        
+        parsed = urlparse(url)
+        request_line = [f"{method} {parsed.path or '/'}{'?' + parsed.query if parsed.query else ''} {protocol}",
+                        f"Host: {parsed.netloc}"]
+        request_line.extend(f"{name}: {value}" for name, value in (request_headers or [])
+                            if name.lower() != 'host')
+        request_block = ('\r\n'.join(request_line) + '\r\n\r\n').encode('utf-8', 'replace')
+        
+        now = datetime.now(timezone.utc)
+        warc_date = now.strftime('%Y-%m-%dT%H:%M:%SZ')
+        response_id = f"<urn:uuid:{uuid.uuid4()}>"
+        
+        with self.lock:
+            if self.file is None or self.file.tell() >= self.max_size:
+                self._open_next()
+            offset, compressed = self._write_record({
+                'WARC-Type': 'response',
+                'WARC-Record-ID': response_id,
+                'WARC-Date': warc_date,
+                'WARC-Target-URI': url,
+                'WARC-Payload-Digest': payload_digest,
+                'Content-Type': 'application/http;msgtype=response'
+            }, response_block if body_path else response_block + body, body_path, body_length if body_path else 0)
+            self._write_record({
+                'WARC-Type': 'request',
+                'WARC-Record-ID': f"<urn:uuid:{uuid.uuid4()}>",
+                'WARC-Date': warc_date,
+                'WARC-Target-URI': url,
+                'WARC-Concurrent-To': response_id,
+                'Content-Type': 'application/http;msgtype=request'
+            }, request_block)
+            self.cdx.write(' '.join([
+                surt_url(url), now.strftime('%Y%m%d%H%M%S'), url, mime, str(status),
+                payload_digest.split(':', 1)[1], '-', '-', str(compressed), str(offset), self.filename
+            ]) + "\n")
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self._close_file()
+            if self.cdx.closed:
+                return
+            self.cdx.close()
+            try:
+                # 只删除空的暂存目录，其他工作进程可能仍在使用或留有可续传的.part
+                os.rmdir(os.path.join(self.warc_dir, 'staging'))
+            except OSError:
+                pass
+            with open(self.cdx_path + '.tmp', 'r', encoding='utf-8') as f:
+                lines = sorted(f)
+            with open(self.cdx_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.remove(self.cdx_path + '.tmp')
+            merge_cdx(self.warc_dir)
+
+@lru_cache(maxsize=4096)
+def _base_dir(base_url):
+    parsed = urlparse(base_url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path.rsplit('/', 1)[0]}/"
+
+@lru_cache(maxsize=4096)
+def _origin(base_url):
+    parsed = urlparse(base_url)
+    return f"{parsed.scheme}://{parsed.netloc}/"
+
+@lru_cache(maxsize=65536)
+def _join(base, ref):
+    return urljoin(base, ref)
+
+def canonicalize_url(base_url, ref):
+    """去掉片段和查询串后转成绝对URL
+    
+    相对链接只与页面所在目录有关，根相对链接只与站点有关，
+    按这两者做缓存键，同一站点大量重复的导航/资源链接可以直接命中缓存。
+    """
+    ref = ref.split('#', 1)[0].split('?', 1)[0]
+    if not ref:
+        # "?page=2"、"#top"和空链接都指向当前页面本身
+        return base_url.split('#', 1)[0].split('?', 1)[0]
+    if ref.startswith(('http://', 'https://')):
+        return ref
+    if ref.startswith('/') and not ref.startswith('//'):
+        return _join(_origin(base_url), ref)
+    return _join(_base_dir(base_url), ref)
+
+@lru_cache(maxsize=65536)
+def url_hostname(url):
+    return urlparse(url).hostname or ''
+
+@lru_cache(maxsize=65536)
+def url_extension(url):
+    path = urlparse(url).path 
+    # 处理M3U8查询参数的情况 
+    if '.m3u8' in path or 'm3u8' in url.lower(): 
+        return '.m3u8'
+    # 获取标准扩展名 
+    _, ext = os.path.splitext(path) 
+    return ext.lower() 
+
+class LinkScanner:
+    """单遍扫描HTML提取链接
+    
+    一次正则遍历同时处理 <a>/<area>/<link> 的href、任意标签的src/srcset/poster/data-src
+    (包括<source>)、<base href>，以及<style>和style属性里的CSS url()。
+    <script>和<style>的内容整块跳过，正文和脚本里形似标签或url()的文本不会被当成链接。
+    """
+
+    TOKEN_RE = re.compile(
+        rb'<!--.*?-->'
+        rb'|<(script|style)(\s[^>]*)?>(.*?)</\1\s*>'
+        rb'|<([a-zA-Z][a-zA-Z0-9:-]*)(\s[^>]*)?>',
+        re.S | re.I
+    )
+    ATTR_RE = re.compile(rb'([a-zA-Z:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+    CSS_URL_RE = re.compile(rb'url\(\s*["\']?([^"\')\s]+)')
+    RESOURCE_ATTRS = (b'src', b'poster', b'data-src')
+    SRCSET_ATTRS = (b'srcset', b'data-srcset')
+    LINK_TAGS = {b'a', b'area'}
+    ASSET_RELS = ('stylesheet', 'icon', 'preload', 'prefetch', 'manifest', 'apple-touch-icon')
+    SKIP_SCHEMES = ('javascript:', 'mailto:', 'data:', 'tel:', 'about:', 'blob:')
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+
+    def scan(self, body):
+        """返回 (base href或None, [(链接, 类型)])，类型为'link'(由扩展名决定)或'resource'"""
+        base = None
+        found = []
+        for match in self.TOKEN_RE.finditer(body):
+            raw_tag, raw_attrs, raw_text, tag, attrs_raw = match.groups()
+            if raw_tag:
+                if raw_tag.lower() == b'style' and b'url(' in raw_text:
+                    found.extend((url, 'resource') for url in self.CSS_URL_RE.findall(raw_text))
+                tag, attrs_raw = raw_tag, raw_attrs
+            if not attrs_raw:
+                continue
+            
+            tag = tag.lower()
+            attrs = {}
+            for name, double, single, bare in self.ATTR_RE.findall(attrs_raw):
+                attrs[name.lower()] = double or single or bare
+            
+            href = attrs.get(b'href')
+            if href:
+                if tag in self.LINK_TAGS:
+                    found.append((href, 'link'))
+                elif tag == b'link':
+                    rel = attrs.get(b'rel', b'').decode('ascii', 'ignore').lower()
+                    found.append((href, 'resource' if any(r in rel for r in self.ASSET_RELS) else 'link'))
+                elif tag == b'base' and base is None:
+                    base = self.decode(href)
+            
+            for name in self.RESOURCE_ATTRS:
+                value = attrs.get(name)
+                if value:
+                    found.append((value, 'resource'))
+            for name in self.SRCSET_ATTRS:
+                value = attrs.get(name)
+                if value:
+                    # srcset形如 "a.jpg 1x, b.jpg 2x"，取每个候选的URL部分
+                    found.extend((candidate.split()[0], 'resource')
+                                 for candidate in value.split(b',') if candidate.strip())
+            
+            style = attrs.get(b'style')
+            if style and b'url(' in style:
+                found.extend((url, 'resource') for url in self.CSS_URL_RE.findall(style))
+        
+        links = []
+        for raw, kind in found:
+            url = self.decode(raw)
+            if url and not url.startswith('#') and not url.lower().startswith(self.SKIP_SCHEMES):
+                links.append((url, kind))
+        return base, links
+
+    def decode(self, raw):
+        url = raw.decode(self.encoding, 'replace').strip()
+        if '&' in url:
+            # style属性里的url(&quot;x.png&quot;)反转义后会带上引号
+            url = html.unescape(url).strip('\'" ')
+        return url
+
+def iter_sitemap(body):
+    """流式解析sitemap(支持gzip和纯文本)，逐条产出(类型, loc, lastmod)
+    
+    类型为'sitemap'(sitemap索引中的子sitemap)或'url'；解析完的元素立即清除，
+    内存占用与sitemap的条目数无关。
+    """
+    stream = io.BytesIO(body)
+    if body[:2] == b'\x1f\x8b':
+        stream = gzip.GzipFile(fileobj=stream)
+    
+    head = stream.read(512)
+    stream.seek(0)
+    if not head.lstrip().startswith(b'<'):
+        # 纯文本sitemap: 每行一个URL
+        for line in io.TextIOWrapper(stream, encoding='utf-8', errors='replace'):
+            line = line.strip()
+            if line.startswith(('http://', 'https://')):
+                yield 'url', line, None
+        return
+    
+    root = None
+    loc = lastmod = None
+    for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if tag == 'loc':
+            loc = (elem.text or '').strip()
+        elif tag == 'lastmod':
+            lastmod = (elem.text or '').strip()
+        elif tag in ('url', 'sitemap'):
+            if loc:
+                yield tag, html.unescape(loc), lastmod
+            loc = lastmod = None
+            root.clear()
+
+def sitemap_priority(lastmod, now=None):
+    """按lastmod给出调度优先级: 近一个月更新的为10，每旧一个月减1，最低-10；没有lastmod为0"""
+    if not lastmod:
+        return 0
+    try:
+        modified = datetime.strptime(lastmod[:10], '%Y-%m-%d')
+    except ValueError:
+        return 0
+    days = ((now or datetime.now()) - modified).days
+    return max(-10, 10 - max(0, days) // 30)
+
+def robots_url(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+
+FRONTIER_SHARDS = 64
+
+def frontier_shard(url):
+    """按主机名分片，同一主机的URL总落在同一个分片里"""
+    return zlib.crc32((urlparse(url).hostname or '').encode('utf-8')) % FRONTIER_SHARDS
+
+def worker_shards(worker_id, num_workers):
+    return [shard for shard in range(FRONTIER_SHARDS) if shard % num_workers == worker_id]
+
+class SQLiteFrontier:
+    """基于SQLite的共享抓取队列和已见集合，供同一台机器上的多个工作进程使用
+    
+    URL按主机分片，工作进程优先领取属于自己的分片，自己的分片空了再从其他分片领取；
+    领取后超过lease秒仍未完成的URL会被放回队列，工作进程崩溃不会丢任务。
+    """
+
+    PENDING, CLAIMED, DONE, FAILED = 0, 1, 2, 3
+
+    def __init__(self, path, lease=300):
+        self.path = path
+        self.lease = lease
+        self.local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                shard INTEGER,
+                kind TEXT,
+                depth INTEGER,
+                priority INTEGER,
+                state INTEGER DEFAULT 0,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS frontier_pending ON frontier(state, shard, priority);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def add(self, entries):
+        """entries为(url, kind, depth, priority)，已见过的URL会被忽略"""
+        rows = [(url, frontier_shard(url), kind, depth, priority) for url, kind, depth, priority in entries]
+        if not rows:
+            return 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO frontier(url, shard, kind, depth, priority) VALUES (?, ?, ?, ?, ?)', rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return conn.total_changes - before
+
+    def claim(self, worker_id, num_workers, limit):
+        conn = self._conn()
+        own = worker_shards(worker_id, num_workers)
+        marks = ','.join('?' * len(own))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE frontier SET state = ? WHERE state = ? AND claimed_at < ?',
+                         (self.PENDING, self.CLAIMED, time.time() - self.lease))
+            rows = conn.execute(
+                f'SELECT url, kind, depth FROM frontier WHERE state = ? AND shard IN ({marks}) '
+                'ORDER BY priority DESC LIMIT ?', (self.PENDING, *own, limit)).fetchall()
+            if len(rows) < limit:
+                # 自己的分片空了就从其他分片领取，单站点爬取时也能用满所有进程
+                rows += conn.execute(
+                    f'SELECT url, kind, depth FROM frontier WHERE state = ? AND shard NOT IN ({marks}) '
+                    'ORDER BY priority DESC LIMIT ?', (self.PENDING, *own, limit - len(rows))).fetchall()
+            conn.executemany('UPDATE frontier SET state = ?, claimed_at = ? WHERE url = ?',
+                             [(self.CLAIMED, time.time(), row[0]) for row in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    def complete(self, urls, failed=False):
+        if urls:
+            self._conn().executemany('UPDATE frontier SET state = ? WHERE url = ?',
+                                     [(self.FAILED if failed else self.DONE, url) for url in urls])
+
+    def counts(self):
+        counts = dict(self._conn().execute('SELECT state, COUNT(*) FROM frontier GROUP BY state').fetchall())
+        return {
+            'pending': counts.get(self.PENDING, 0),
+            'claimed': counts.get(self.CLAIMED, 0),
+            'done': counts.get(self.DONE, 0),
+            'failed': counts.get(self.FAILED, 0)
+        }
+
+    def set_meta(self, key, value):
+        self._conn().execute('INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def get_meta(self, key, default=None):
+        row = self._conn().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+class RedisFrontier:
+    """基于Redis协议的共享抓取队列，可跨多台机器使用(Redis/KeyDB等兼容服务均可)"""
+
+    # 按给定顺序逐个分片弹出最高优先级的条目并写入租约，整个领取在服务端原子完成，
+    # 工作进程在弹出和登记租约之间崩溃也不会丢URL；KEYS为各分片队列，最后一个是租约表
+    CLAIM_SCRIPT = """
+        local limit = tonumber(ARGV[1])
+        local now = tonumber(ARGV[2])
+        local claimed = KEYS[#KEYS]
+        local rows = {}
+        for i = 1, #KEYS - 1 do
+            if #rows >= limit then
+                break
+            end
+            local popped = redis.call('ZPOPMAX', KEYS[i], limit - #rows)
+            for j = 1, #popped, 2 do
+                local row = cjson.decode(popped[j])
+                redis.call('HSET', claimed, row[1], cjson.encode({row[2], row[3], now}))
+                rows[#rows + 1] = popped[j]
+            end
+        end
+        return rows
+    """
+
+    def __init__(self, url, prefix='blackwidow', lease=300):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("使用Redis队列需要安装redis: pip install redis")
+        self.db = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lease = lease
+        self.claim_script = self.db.register_script(self.CLAIM_SCRIPT)
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def add(self, entries):
+        entries = list(entries)
+        if not entries:
+            return 0
+        pipe = self.db.pipeline()
+        for url, kind, depth, priority in entries:
+            pipe.sadd(self._key('seen'), url)
+        added = 0
+        pipe2 = self.db.pipeline()
+        for (url, kind, depth, priority), is_new in zip(entries, pipe.execute()):
+            if is_new:
+                member = json.dumps([url, kind, depth])
+                pipe2.zadd(self._key('queue', frontier_shard(url)), {member: priority})
+                added += 1
+        pipe2.execute()
+        return added
+
+    def claim(self, worker_id, num_workers, limit):
+        self._requeue_stale()
+        own = worker_shards(worker_id, num_workers)
+        others = [shard for shard in range(FRONTIER_SHARDS) if shard not in own]
+        keys = [self._key('queue', shard) for shard in own + others] + [self._key('claimed')]
+        members = self.claim_script(keys=keys, args=[limit, repr(time.time())])
+        return [tuple(json.loads(member)) for member in members]
+
+    def _requeue_stale(self):
+        deadline = time.time() - self.lease
+        for url, value in self.db.hscan_iter(self._key('claimed')):
+            kind, depth, claimed_at = json.loads(value)
+            if claimed_at < deadline and self.db.hdel(self._key('claimed'), url):
+                url = url.decode('utf-8')
+                self.db.zadd(self._key('queue', frontier_shard(url)), {json.dumps([url, kind, depth]): 0})
+
+    def complete(self, urls, failed=False):
+        if urls:
+            pipe = self.db.pipeline()
+            pipe.hdel(self._key('claimed'), *urls)
+            pipe.incrby(self._key('failed' if failed else 'done'), len(urls))
+            pipe.execute()
+
+    def counts(self):
+        pipe = self.db.pipeline()
+        for shard in range(FRONTIER_SHARDS):
+            pipe.zcard(self._key('queue', shard))
+        pipe.hlen(self._key('claimed'))
+        pipe.get(self._key('done'))
+        pipe.get(self._key('failed'))
+        results = pipe.execute()
+        return {
+            'pending': sum(results[:FRONTIER_SHARDS]),
+            'claimed': results[FRONTIER_SHARDS],
+            'done': int(results[FRONTIER_SHARDS + 1] or 0),
+            'failed': int(results[FRONTIER_SHARDS + 2] or 0)
+        }
+
+    def set_meta(self, key, value):
+        self.db.hset(self._key('meta'), key, json.dumps(value))
+
+    def get_meta(self, key, default=None):
+        value = self.db.hget(self._key('meta'), key)
+        return json.loads(value) if value else default
+
+def open_frontier(uri):
+    """sqlite:///path/to/frontier.db 或 redis://host:6379/0"""
+    if uri.startswith('sqlite:///'):
+        return SQLiteFrontier(uri[len('sqlite:///'):])
+    if uri.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisFrontier(uri)
+    raise ValueError(f"不支持的队列地址: {uri}")
 
 class UniversalSpider(Spider):
     name = "universal_spider"
     
-    def __init__(self, start_url=None, output_dir=None, *args, **kwargs):
+    # 体积通常较大的资源类型，先探测大小再决定是否走流式下载
+    stream_extensions = {
+        '.mp4', '.webm', '.mov', '.avi', '.mkv', '.flv',
+        '.mp3', '.wav', '.ogg', '.m4a', '.flac',
+        '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+        '.zip', '.rar', '.7z', '.tar', '.gz'
+    }
+    
+    def __init__(self, start_url=None, output_dir=None, stream_threshold=8 * 1024 * 1024,
+                 stream_workers=4, segment_threshold=16 * 1024 * 1024, max_concurrency=32,
+                 initial_concurrency=4, dedup=False, frontier=None, worker_id=0, num_workers=1,
+                 write_workers=4, fsync='batch', pack_small=0, output_format='files',
+                 warc_max_size=1024 * 1024 * 1024, sitemaps=False, class_weights=None,
+                 class_budgets=None, class_max_sizes=None, skip_extensions=(), *args, **kwargs):
         super(UniversalSpider, self).__init__(*args, **kwargs)
         self.start_urls = [start_url] if start_url else []
         self.output_dir = output_dir 
-        self.allowed_domains = [urlparse(start_url).netloc] if start_url else []
+        # Scrapy按主机名匹配allowed_domains，不能带端口号
+        self.allowed_domains = [url_hostname(start_url)] if start_url else []
+        
+        # 分布式模式: URL从共享队列领取，新发现的URL写回共享队列，已见集合也在队列中
+        self.frontier = open_frontier(frontier) if frontier else None
+        self.worker_id = int(worker_id)
+        self.num_workers = max(1, int(num_workers))
+        # 每次领取的数量不宜过大，否则先启动的进程会把任务全部领走
+        self.frontier_batch = 16
+        self.frontier_task = None
+        self.frontier_finished = []
+        if self.frontier:
+            self.start_urls = []
+            self.allowed_domains = self.frontier.get_meta('allowed_domains', self.allowed_domains)
         self.visited_urls = set()
+        # 开启后先从robots.txt声明的sitemap批量发现URL，再按链接深入
+        self.sitemaps = sitemaps
+        self.seen_sitemaps = set()
         self.resource_extensions = {
             # 图片 
             '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.svg',
@@ -32,77 +1381,415 @@ class UniversalSpider(Spider):
             # 压缩文件 
             '.zip', '.rar', '.7z', '.tar', '.gz'
         }
-        self.executor = ThreadPoolExecutor(max_workers=5)
+        # 按资源类型分队列调度，并限制各类的总字节数和单文件大小
+        self.policy = ResourcePolicy(class_weights, class_budgets, class_max_sizes, skip_extensions)
+        # 页面请求和分段下载共用的按主机自适应并发控制
+        self.throttle = AdaptiveConcurrency(initial=int(initial_concurrency), maximum=int(max_concurrency))
+        # 线程池只提供上限，实际每个主机的并发由throttle决定
+        self.executor = ThreadPoolExecutor(max_workers=int(max_concurrency))
+        # 超过该大小(字节)的资源不经Scrapy缓冲，直接流式写盘
+        self.stream_threshold = int(stream_threshold)
+        # 超过分段阈值的文件拆成stream_workers个区间并行下载
+        self.stream_workers = int(stream_workers)
+        self.segment_threshold = int(segment_threshold)
+        self._downloader = None
+        # 开启去重时资源按内容哈希存储，URL路径只是硬链接
+        # WARC模式下所有页面和资源写入滚动的.warc.gz，并保留状态码和响应头
+        self.warc = WarcWriter(output_dir, int(warc_max_size), fsync=fsync) if output_format == 'warc' and output_dir else None
+        self.store = ContentStore(output_dir, fsync) if dedup and output_dir and not self.warc else None
+        # 写盘交给独立的写线程池，回调里不做同步磁盘I/O
+        self.writer = WriteBehindWriter(
+            output_dir,
+            workers=int(write_workers),
+            fsync=fsync,
+            pack_small=0 if self.store or self.warc else int(pack_small)
+        ) if output_dir else None
+        # 线程池中尚未完成的下载数，爬虫在它们完成前保持打开
+        self.pending_downloads = 0
+        self.pending_lock = threading.Lock()
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(UniversalSpider, cls).from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.response_received, signal=signals.response_received)
+        if spider.frontier:
+            crawler.signals.connect(spider.start_frontier_polling, signal=signals.spider_opened)
+            # 调度器丢弃的请求(跳过的扩展名、类型预算用完)也要在共享队列中标记完成，否则一直处于领取状态
+            crawler.signals.connect(spider.request_dropped, signal=signals.request_dropped)
+        return spider
+    
+    def start_requests(self):
+        for url in self.start_urls:
+            yield Request(url, dont_filter=True)
+            if self.sitemaps:
+                yield self.robots_request(robots_url(url))
+    
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+    
+    def robots_request(self, url):
+        return Request(
+            url,
+            callback=self.parse_robots,
+            errback=self.robots_errback,
+            dont_filter=True,
+            priority=100
+        )
+    
+    def sitemap_request(self, url):
+        # sitemap可能放在其他主机上，不受allowed_domains限制；嵌套的索引不计入爬取深度
+        self.seen_sitemaps.add(url)
+        return Request(
+            url,
+            callback=self.parse_sitemap,
+            errback=self.sitemap_errback,
+            dont_filter=True,
+            priority=100,
+            meta={'depth_reset': True}
+        )
+    
+    def parse_robots(self, response):
+        self.mark_finished(response.request)
+        declared = []
+        for line in response.text.splitlines():
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'sitemap' and value.strip():
+                declared.append(urljoin(response.url, value.strip()))
+        # robots.txt没有声明时尝试默认位置
+        if not declared:
+            declared.append(urljoin(response.url, '/sitemap.xml'))
+        for url in declared:
+            if url not in self.seen_sitemaps:
+                yield self.sitemap_request(url)
+    
+    def robots_errback(self, failure):
+        self.frontier_errback(failure)
+        url = urljoin(failure.request.url, '/sitemap.xml')
+        if url not in self.seen_sitemaps:
+            yield self.sitemap_request(url)
+    
+    def parse_sitemap(self, response):
+        self.mark_finished(response.request)
+        found = 0
+        pages = []
+        for kind, loc, lastmod in iter_sitemap(response.body):
+            if kind == 'sitemap':
+                if loc not in self.seen_sitemaps:
+                    yield self.sitemap_request(loc)
+                continue
+            if not self.is_same_domain(loc):
+                continue
+            found += 1
+            priority = sitemap_priority(lastmod)
+            if self.frontier:
+                pages.append((loc, 'resource' if self.is_resource_link(loc) else 'page', 0, priority))
+                if len(pages) >= 1000:
+                    self.frontier.add(pages)
+                    pages = []
+                continue
+            request = self.resource_request(loc) if self.is_resource_link(loc) else Request(loc, callback=self.parse)
+            # sitemap中的URL按起始页处理，深度从0开始计算
+            yield request.replace(priority=priority, meta=dict(request.meta, depth_reset=True))
+        if pages:
+            self.frontier.add(pages)
+        print(f"sitemap {response.url}: 发现{found}个URL")
+    
+    def sitemap_errback(self, failure):
+        self.frontier_errback(failure)
+        print(f"获取sitemap失败: {failure.request.url}")
+    
+    def response_received(self, response, request, spider):
+        self.policy.add_bytes(
+            request.meta.get('resource_class') or self.policy.classify(request.url),
+            len(response.body)
+        )
+    
+    def start_frontier_polling(self, spider):
+        # 空闲信号约5秒才触发一次，分布式模式下额外定时检查共享队列
+        self.frontier_task = LoopingCall(self.refill_frontier)
+        self.frontier_task.start(0.5)
+    
+    def spider_idle(self):
+        if self.frontier:
+            self.flush_frontier()
+            if self.refill_frontier():
+                raise DontCloseSpider
+            counts = self.frontier.counts()
+            # 其他进程手上还有任务时可能还会发现新URL，继续等待
+            if counts['pending'] or counts['claimed']:
+                raise DontCloseSpider
+        if self.pending_downloads:
+            raise DontCloseSpider
+    
+    def refill_frontier(self):
+        """本进程排队的请求不足时从共享队列领取一批，返回领取的数量"""
+        engine = self.crawler.engine
+        slot = getattr(engine, '_slot', None) or getattr(engine, 'slot', None)
+        queued = len(slot.scheduler) if slot is not None and slot.scheduler is not None else 0
+        if queued + len(engine.downloader.active) >= self.frontier_batch // 2:
+            return 0
+        
+        rows = self.frontier.claim(self.worker_id, self.num_workers, self.frontier_batch)
+        for url, kind, depth in rows:
+            if kind == 'robots':
+                request = self.robots_request(url)
+            elif kind == 'sitemap':
+                request = self.sitemap_request(url)
+            elif kind == 'page':
+                request = Request(url, callback=self.parse)
+            else:
+                request = self.resource_request(url)
+            engine.crawl(request.replace(
+                meta=dict(request.meta, frontier_url=url, depth=depth),
+                errback=request.errback or self.frontier_errback,
+                dont_filter=True
+            ))
+        return len(rows)
+    
+    def push_frontier(self, links, depth):
+        depth_limit = self.settings.getint('DEPTH_LIMIT') if getattr(self, 'settings', None) else 0
+        if depth_limit and depth > depth_limit:
+            return
+        # 跳过的扩展名和用完预算的类型不进入共享队列；页面优先于资源，浅层优先于深层
+        self.frontier.add(
+            (url, kind, depth, (10 if kind == 'page' else 0) - depth) for url, kind in links
+            if kind in ('robots', 'sitemap') or self.policy.allows(url)
+        )
+    
+    def request_dropped(self, request, spider):
+        self.mark_finished(request)
+    
+    def mark_finished(self, request):
+        url = request.meta.get('frontier_url') if self.frontier else None
+        if url:
+            self.frontier_finished.append(url)
+            if len(self.frontier_finished) >= self.frontier_batch:
+                self.flush_frontier()
+    
+    def flush_frontier(self):
+        finished, self.frontier_finished = self.frontier_finished, []
+        self.frontier.complete(finished)
+    
+    def frontier_errback(self, failure):
+        url = failure.request.meta.get('frontier_url')
+        if url:
+            self.frontier.complete([url], failed=True)
+    
+    def closed(self, reason):
+        if self.frontier_task and self.frontier_task.running:
+            self.frontier_task.stop()
+        if self.frontier:
+            self.flush_frontier()
+        if self.writer:
+            self.writer.close()
+        if self.warc:
+            self.warc.close()
+    
+    def submit_download(self, func, *args):
+        with self.pending_lock:
+            self.pending_downloads += 1
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(self._download_done)
+        return future
+    
+    def _download_done(self, future):
+        with self.pending_lock:
+            self.pending_downloads -= 1
+    
+    def count_bytes(self, size):
+        crawler = getattr(self, 'crawler', None)
+        if crawler is not None:
+            crawler.stats.inc_value('streamed/response_bytes', size)
     
     def parse(self, response):
+        self.mark_finished(response.request)
         if response.url in self.visited_urls: 
             return 
         self.visited_urls.add(response.url) 
         
         # 保存HTML页面 
-        self.save_resource(response.url, response.body, '.html')
-        
-        # 提取并处理所有链接 
-        for link in response.css('a::attr(href)').getall(): 
-            absolute_url = self.make_absolute_url(response.url, link)
-            if self.is_same_domain(absolute_url): 
-                if self.is_resource_link(absolute_url): 
-                    yield Request(absolute_url, callback=self.save_resource_callback) 
-                else:
-                    yield Request(absolute_url, callback=self.parse) 
+        self.save_response(response, '.html')
+        
+        # 单遍扫描提取页面链接和各类资源链接
+        scanner = LinkScanner(getattr(response, 'encoding', None) or 'utf-8')
+        base, found = scanner.scan(response.body)
+        base_url = self.make_absolute_url(response.url, base) if base else response.url
         
-        # 提取并处理所有资源链接 
-        for src in response.css('[src]::attr(src)').getall(): 
-            absolute_url = self.make_absolute_url(response.url, src)
-            if self.is_same_domain(absolute_url): 
-                yield Request(absolute_url, callback=self.save_resource_callback) 
+        links = []
+        seen = set()
+        for ref, kind in found:
+            absolute_url = self.make_absolute_url(base_url, ref)
+            if absolute_url in seen or not self.is_same_domain(absolute_url):
+                continue
+            seen.add(absolute_url)
+            if kind == 'resource' or self.is_resource_link(absolute_url):
+                links.append((absolute_url, 'resource'))
+            else:
+                links.append((absolute_url, 'page'))
         
         # 处理M3U8文件 
         if response.url.endswith('.m3u8'): 
-            self.process_m3u8(response.url, response.body) 
+            self.process_m3u8(response.url, response.body, response) 
+        
+        if self.frontier:
+            self.push_frontier(links, response.meta.get('depth', 0) + 1)
+            self.refill_frontier()
+            return
+        
+        for url, kind in links:
+            if kind == 'page':
+                yield Request(url, callback=self.parse)
+            else:
+                yield self.resource_request(url)
+    
+    def resource_request(self, url):
+        """大体积类型先发HEAD探测大小，其余资源直接交给Scrapy下载"""
+        if self.get_extension(url) in self.stream_extensions:
+            return Request(
+                url,
+                method='HEAD',
+                callback=self.probe_resource_callback,
+                errback=self.probe_resource_errback,
+                meta={'resource_url': url}
+            )
+        return Request(url, callback=self.save_resource_callback)
+    
+    def probe_resource_callback(self, response):
+        self.mark_finished(response.request)
+        size = int(response.headers.get('Content-Length', 0) or 0)
+        accept_ranges = b'bytes' in response.headers.get('Accept-Ranges', b'')
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if validator:
+            validator = validator.decode('latin-1')
+        
+        resource_class = self.policy.classify(response.url)
+        if not self.policy.fits(resource_class, size) or not self.policy.allows(response.url, resource_class):
+            print(f"超出{resource_class}类大小上限或预算，跳过: {response.url}")
+            return
+        
+        # 大小未知或超过阈值时流式下载，避免整个文件缓存在内存中
+        if size == 0 or size >= self.stream_threshold:
+            # 流式下载不经过Scrapy，提前把已知大小计入预算
+            self.policy.add_bytes(resource_class, size)
+            self.submit_download(self.stream_resource, response.url, size, accept_ranges, validator,
+                                 self.header_pairs(response.headers))
+        else:
+            yield Request(response.url, callback=self.save_resource_callback, dont_filter=True)
+    
+    def probe_resource_errback(self, failure):
+        # 部分服务器不支持HEAD，直接按未知大小流式下载
+        self.mark_finished(failure.request)
+        url = failure.request.meta['resource_url']
+        self.submit_download(self.stream_resource, url, 0, False)
+    
+    def stream_resource(self, url, size, accept_ranges, validator=None, headers=None):
+        try:
+            filename = self.generate_filename(url, self.get_extension(url))
+            filepath = os.path.join(self.output_dir, filename)
+            if self.warc:
+                # 先流式落到暂存文件，再分块拷入WARC记录
+                staging = os.path.join(self.warc.warc_dir, 'staging', hashlib.sha1(url.encode('utf-8')).hexdigest())
+                info = {}
+                self.get_downloader().download(url, staging, size, accept_ranges, validator, info)
+                # 续传时所有分段可能都已完成，没有新的GET响应，才退回HEAD探测得到的响应头
+                self.warc.write_exchange(
+                    url, info.get('status', 200), info.get('reason', 'OK'), info.get('headers', headers or []),
+                    body_path=staging,
+                    request_headers=info.get('request_headers', list(self.get_downloader().session.headers.items())))
+                os.remove(staging)
+            elif self.store:
+                staging = self.get_downloader().download(
+                    url, self.store.staging_path(url), size, accept_ranges, validator)
+                self.store.put_file(url, filepath, staging)
+            else:
+                self.get_downloader().download(url, filepath, size, accept_ranges, validator)
+            print(f"流式保存资源: {filename}")
+        except Exception as e:
+            print(f"流式下载资源时出错: {e}")
+    
+    def get_downloader(self):
+        if self._downloader is None:
+            settings = getattr(self, 'settings', None)
+            user_agent = settings.get('USER_AGENT') if settings else None
+            self._downloader = StreamingDownloader(
+                workers=self.stream_workers,
+                headers={'User-Agent': user_agent} if user_agent else None,
+                segment_threshold=self.segment_threshold,
+                throttle=self.throttle,
+                progress=self.count_bytes
+            )
+        return self._downloader
     
     def save_resource_callback(self, response):
+        self.mark_finished(response.request)
         extension = self.get_extension(response.url) 
         if extension == '.m3u8':
-            self.process_m3u8(response.url, response.body) 
+            self.process_m3u8(response.url, response.body, response) 
         else:
-            self.save_resource(response.url, response.body, extension)
+            self.save_response(response, extension)
     
     def make_absolute_url(self, base_url, relative_url):
-        return urljoin(base_url, relative_url.split('#')[0].split('?')[0]) 
+        return canonicalize_url(base_url, relative_url)
     
     def is_same_domain(self, url):
         if not self.allowed_domains: 
             return True 
-        return urlparse(url).netloc in self.allowed_domains  
+        return url_hostname(url) in self.allowed_domains  
     
     def is_resource_link(self, url):
         extension = self.get_extension(url) 
         return extension in self.resource_extensions  
     
     def get_extension(self, url):
-        path = urlparse(url).path 
-        # 处理M3U8查询参数的情况 
-        if '.m3u8' in path or 'm3u8' in url.lower(): 
-            return '.m3u8'
-        # 获取标准扩展名 
-        _, ext = os.path.splitext(path) 
-        return ext.lower() 
+        return url_extension(url)
+    
+    def save_response(self, response, extension):
+        if not self.warc:
+            self.save_resource(response.url, response.body, extension)
+            return
+        request = response.request
+        self.writer.submit(
+            self.warc.write_exchange,
+            response.url,
+            response.status,
+            '',
+            self.header_pairs(response.headers),
+            response.body,
+            None,
+            request.method if request else 'GET',
+            self.header_pairs(request.headers) if request else None,
+            getattr(response, 'protocol', None) or 'HTTP/1.1',
+            size=len(response.body)
+        )
+    
+    def header_pairs(self, headers):
+        """把Scrapy的Headers转成(名称, 值)列表"""
+        return [
+            (name.decode('latin-1'), value.decode('latin-1'))
+            for name, values in headers.items()
+            for value in values
+        ]
     
     def save_resource(self, url, content, extension):
         try:
             filename = self.generate_filename(url, extension)
             filepath = os.path.join(self.output_dir, filename)
             
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            
-            with open(filepath, 'wb') as f:
-                f.write(content) 
-            
-            print(f"保存资源: {filename}")
+            # 只入队，实际写盘在写线程中完成
+            self.writer.submit(self.write_content, url, filepath, filename, content, size=len(content))
         except Exception as e:
             print(f"保存资源时出错: {e}")
     
+    def write_content(self, url, filepath, filename, content):
+        if self.store:
+            entry = self.store.put(url, filepath, content)
+            self.writer.wrote(self.store.object_path(entry['sha256']), filepath)
+        else:
+            self.writer.write_file(filepath, content)
+        print(f"保存资源: {filename}")
+    
     def generate_filename(self, url, extension):
         parsed = urlparse(url)
         path = parsed.path.lstrip('/') 
@@ -116,10 +1803,13 @@ class UniversalSpider(Spider):
         
         return path 
     
-    def process_m3u8(self, url, content):
+    def process_m3u8(self, url, content, response=None):
         try:
             # 保存原始M3U8文件 
-            self.save_resource(url, content, '.m3u8')
+            if response is not None:
+                self.save_response(response, '.m3u8')
+            else:
+                self.save_resource(url, content, '.m3u8')
             
             # 解析M3U8文件 
             m3u8_obj = m3u8.loads(content.decode('utf-8')) 
@@ -128,7 +1818,9 @@ class UniversalSpider(Spider):
             base_url = url.rsplit('/', 1)[0] + '/'
             for segment in m3u8_obj.segments: 
                 ts_url = urljoin(base_url, segment.uri) 
-                self.executor.submit(self.download_ts, ts_url)
+                if not self.policy.allows(ts_url, 'hls'):
+                    continue
+                self.submit_download(self.download_ts, ts_url)
             
             print(f"开始下载M3U8视频片段: {url}")
         except Exception as e:
@@ -136,21 +1828,177 @@ class UniversalSpider(Spider):
     
     def download_ts(self, url):
         try:
-            response = requests.get(url, stream=True, timeout=30)
-            if response.status_code == 200:
-                filename = self.generate_filename(url, '.ts')
-                filepath = os.path.join(self.output_dir, filename)
-                
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(1024): 
-                        f.write(chunk) 
-                
-                print(f"下载TS片段: {filename}")
+            with self.get_downloader().open(url) as response:
+                if response.status_code == 200:
+                    filename = self.generate_filename(url, '.ts')
+                    filepath = os.path.join(self.output_dir, filename)
+                    
+                    # TS片段通常只有几MB，读入内存后交给写线程，下载线程不等磁盘
+                    chunks = []
+                    for chunk in response.iter_content(64 * 1024): 
+                        chunks.append(chunk)
+                        self.count_bytes(len(chunk))
+                    content = b''.join(chunks)
+                    self.policy.add_bytes('hls', len(content))
+                    
+                    if self.warc:
+                        self.writer.submit(
+                            self.warc.write_exchange, url, response.status_code, response.reason or '',
+                            list(response.headers.items()), content, None, 'GET',
+                            list(response.request.headers.items()), size=len(content))
+                    else:
+                        self.writer.submit(self.write_content, url, filepath, filename, content, size=len(content))
         except Exception as e:
             print(f"下载TS片段时出错: {e}")
 
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# 子进程中与父进程通信的管道，由crawl_worker设置
+_stats_pipe = None
+_stats_pipe_lock = threading.Lock()
+
+def send_to_parent(message):
+    with _stats_pipe_lock:
+        if _stats_pipe is not None:
+            try:
+                _stats_pipe.send(message)
+            except (OSError, ValueError):
+                pass
+
+class PipeWriter:
+    """把子进程的print输出按行转发给父进程的日志窗口"""
+
+    def __init__(self):
+        self.buffer = ''
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        # 下载线程和写线程都会print，按行拼接需要加锁
+        with self.lock:
+            self.buffer += text
+            lines = []
+            while '\n' in self.buffer:
+                line, self.buffer = self.buffer.split('\n', 1)
+                if line:
+                    lines.append(line)
+        for line in lines:
+            send_to_parent({'type': 'log', 'message': line})
+        return len(text)
+
+    def flush(self):
+        pass
+
+class CrawlStatsReporter:
+    """定期把真实的爬取统计(页面数、流量、队列深度、速率)发给父进程，并响应取消指令"""
+
+    def __init__(self, crawler, interval):
+        self.crawler = crawler
+        self.interval = interval
+        self.task = None
+        self.last_time = None
+        self.last_pages = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if _stats_pipe is None:
+            raise NotConfigured
+        reporter = cls(crawler, crawler.settings.getfloat('CRAWL_STATS_INTERVAL', 0.5))
+        crawler.signals.connect(reporter.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(reporter.spider_closed, signal=signals.spider_closed)
+        return reporter
+
+    def spider_opened(self, spider):
+        self.last_time = time.time()
+        self.task = LoopingCall(self.report)
+        self.task.start(self.interval)
+
+    def spider_closed(self, spider, reason):
+        if self.task and self.task.running:
+            self.task.stop()
+        self.report(final=True, reason=reason)
+
+    def collect(self):
+        stats = self.crawler.stats
+        spider = self.crawler.spider
+        engine = self.crawler.engine
+        slot = getattr(engine, '_slot', None) or getattr(engine, 'slot', None)
+        scheduled = len(slot.scheduler) if slot is not None and slot.scheduler is not None else 0
+        in_flight = len(engine.downloader.active) if engine.downloader else 0
+        return {
+            'pages': stats.get_value('response_received_count', 0),
+            'bytes': stats.get_value('downloader/response_bytes', 0) + stats.get_value('streamed/response_bytes', 0),
+            'queue': scheduled + in_flight + getattr(spider, 'pending_downloads', 0),
+            'errors': stats.get_value('log_count/ERROR', 0)
+        }
+
+    def report(self, final=False, reason=None):
+        message = self.collect()
+        now = time.time()
+        elapsed = max(now - self.last_time, 1e-6)
+        message['rate'] = (message['pages'] - self.last_pages) / elapsed
+        self.last_time, self.last_pages = now, message['pages']
+        message['type'] = 'finished' if final else 'stats'
+        if final:
+            message['reason'] = reason
+        send_to_parent(message)
+        
+        if not final and _stats_pipe.poll() and _stats_pipe.recv() == 'cancel':
+            self.cancel()
+
+    def cancel(self):
+        engine = self.crawler.engine
+        if hasattr(engine, 'close_spider_async'):
+            from scrapy.utils.defer import deferred_from_coro
+            deferred_from_coro(engine.close_spider_async(reason='cancelled'))
+        else:
+            engine.close_spider(self.crawler.spider, 'cancelled')
+
+def build_crawl_settings(options=None, download_delay=0.5, extra_settings=None):
+    """根据爬取选项生成Scrapy设置，extra_settings用于覆盖默认值"""
+    options = options or {}
+    max_concurrency = options.get('max_concurrency', 32)
+    # concurrent_requests是本任务分到的全局并发份额，未指定时(图形界面单任务)按每站上限放宽
+    concurrent_requests = options.get('concurrent_requests', max_concurrency * 4)
+    settings = get_project_settings()
+    settings.setdict({ 
+        'USER_AGENT': USER_AGENT,
+        'ROBOTSTXT_OBEY': False,
+        # 延迟和每站并发由AutoThrottle与AdaptiveThrottleMiddleware按实际延迟动态调整
+        'DOWNLOAD_DELAY': 0,
+        'CONCURRENT_REQUESTS': concurrent_requests,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': options.get('initial_concurrency', 4),
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': download_delay,
+        'AUTOTHROTTLE_MAX_DELAY': 60,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': max(1.0, max_concurrency / 2),
+        'SCHEDULER': ResourceClassScheduler,
+        'DOWNLOADER_MIDDLEWARES': {AdaptiveThrottleMiddleware: 900},
+        'EXTENSIONS': {CrawlStatsReporter: 500},
+        'LOG_LEVEL': 'INFO',
+        'FEED_FORMAT': None,
+        'DEPTH_LIMIT': 3,
+    })
+    if extra_settings:
+        settings.setdict(extra_settings)
+    return settings
+
+def crawl_worker(url, output_dir, options, download_delay, conn, extra_settings=None):
+    """在子进程中运行一次爬取，统计和日志通过conn发回父进程"""
+    global _stats_pipe
+    _stats_pipe = conn
+    sys.stdout = PipeWriter()
+    try:
+        process = CrawlerProcess(build_crawl_settings(options, download_delay, extra_settings))
+        process.crawl(UniversalSpider, start_url=url, output_dir=output_dir, **options)
+        process.start()
+        send_to_parent({'type': 'done'})
+    except Exception as e:
+        send_to_parent({'type': 'error', 'message': str(e)})
+    finally:
+        with _stats_pipe_lock:
+            _stats_pipe = None
+        conn.close()
+
 class ScrapyApp:
     def __init__(self, root):
         self.root = root 
@@ -254,6 +2102,77 @@ class ScrapyApp:
         )
         self.browse_button.pack(side=tk.LEFT, padx=(10, 0))
         
+        # 高级设置
+        settings_frame = tk.Frame(input_frame, bg=self.dark_bg)
+        settings_frame.pack(fill=tk.X, pady=5)
+        
+        self.stream_threshold_entry = self.create_setting_entry(settings_frame, "流式阈值(MB):", "8", 8)
+        self.segments_entry = self.create_setting_entry(settings_frame, "分段连接数:", "4", 5)
+        
+        # 相同内容只保存一次，重复URL做硬链接
+        self.dedup_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            settings_frame,
+            text="内容去重",
+            variable=self.dedup_var,
+            font=('Helvetica', 10),
+            fg=self.text_color,
+            bg=self.dark_bg,
+            selectcolor=self.light_bg,
+            activebackground=self.dark_bg,
+            activeforeground=self.primary_color
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # 存档模式: 输出.warc.gz和CDX索引，保留状态码和响应头
+        self.warc_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            settings_frame,
+            text="WARC存档",
+            variable=self.warc_var,
+            font=('Helvetica', 10),
+            fg=self.text_color,
+            bg=self.dark_bg,
+            selectcolor=self.light_bg,
+            activebackground=self.dark_bg,
+            activeforeground=self.primary_color
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # 先从sitemap批量发现URL
+        self.sitemap_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            settings_frame,
+            text="Sitemap发现",
+            variable=self.sitemap_var,
+            font=('Helvetica', 10),
+            fg=self.text_color,
+            bg=self.dark_bg,
+            selectcolor=self.light_bg,
+            activebackground=self.dark_bg,
+            activeforeground=self.primary_color
+        ).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # 并发与限速设置
+        throttle_frame = tk.Frame(input_frame, bg=self.dark_bg)
+        throttle_frame.pack(fill=tk.X, pady=5)
+        
+        self.max_concurrency_entry = self.create_setting_entry(throttle_frame, "每站最大并发:", "32", 5)
+        self.initial_concurrency_entry = self.create_setting_entry(throttle_frame, "初始并发:", "4", 5)
+        self.download_delay_entry = self.create_setting_entry(throttle_frame, "初始延迟(秒):", "0.5", 5)
+        
+        # 按资源类型的调度权重、预算和过滤，格式如 media=2048,image=512
+        schedule_frame = tk.Frame(input_frame, bg=self.dark_bg)
+        schedule_frame.pack(fill=tk.X, pady=5)
+        
+        self.class_weights_entry = self.create_setting_entry(
+            schedule_frame, "调度权重:", "page=8,image=4,hls=2,document=2,media=1", 34)
+        self.skip_ext_entry = self.create_setting_entry(schedule_frame, "跳过扩展名:", "", 16)
+        
+        budget_frame = tk.Frame(input_frame, bg=self.dark_bg)
+        budget_frame.pack(fill=tk.X, pady=5)
+        
+        self.class_budgets_entry = self.create_setting_entry(budget_frame, "类型预算(MB):", "", 24)
+        self.class_max_size_entry = self.create_setting_entry(budget_frame, "单文件上限(MB):", "", 20)
+        
         # 爬取按钮
         button_frame = tk.Frame(main_frame, bg=self.dark_bg)
         button_frame.pack(fill=tk.X, pady=(10, 20))
@@ -271,7 +2190,23 @@ class ScrapyApp:
             padx=20,
             pady=5
         )
-        self.crawl_button.pack(pady=10)
+        self.crawl_button.pack(side=tk.LEFT, padx=(0, 10), pady=10)
+        
+        self.cancel_button = tk.Button(
+            button_frame,  
+            text="停止爬取", 
+            command=self.cancel_crawling, 
+            state=tk.DISABLED,
+            bg=self.light_bg,
+            fg=self.text_color,
+            activebackground='#ff5555',
+            activeforeground='white',
+            font=('Helvetica', 12, 'bold'),
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        )
+        self.cancel_button.pack(side=tk.LEFT, pady=10)
         
         # 进度条
         self.progress = ttk.Progressbar(
@@ -281,7 +2216,17 @@ class ScrapyApp:
             length=400,
             style='custom.Horizontal.TProgressbar'
         )
-        self.progress.pack(pady=(0, 10))
+        self.progress.pack(side=tk.LEFT, padx=(20, 10), pady=10)
+        
+        # 实时统计
+        self.stats_label = tk.Label(
+            button_frame, 
+            text="", 
+            font=('Helvetica', 10), 
+            fg=self.primary_color, 
+            bg=self.dark_bg
+        )
+        self.stats_label.pack(side=tk.LEFT, pady=10)
         
         # 日志输出
         log_frame = tk.Frame(main_frame, bg=self.dark_bg)
@@ -324,10 +2269,36 @@ class ScrapyApp:
             darkcolor=self.primary_color
         )
         
+        # 子进程爬取状态
+        self.crawl_process = None
+        self.crawl_conn = None
+        self.crawl_reason = None
+        
         # 设置默认目录为当前目录下的downloads文件夹 
         default_dir = os.path.join(os.getcwd(), "downloads")
         self.dir_entry.insert(0, default_dir)
     
+    def create_setting_entry(self, parent, text, default, width):
+        tk.Label(
+            parent, 
+            text=text, 
+            font=('Helvetica', 10), 
+            fg=self.text_color, 
+            bg=self.dark_bg
+        ).pack(side=tk.LEFT, padx=(0 if not parent.winfo_children() else 20, 10))
+        
+        entry = tk.Entry(
+            parent, 
+            width=width, 
+            bg=self.light_bg, 
+            fg=self.text_color, 
+            insertbackground=self.text_color,
+            relief=tk.FLAT
+        )
+        entry.insert(0, default)
+        entry.pack(side=tk.LEFT)
+        return entry
+    
     def browse_directory(self):
         directory = filedialog.askdirectory() 
         if directory:
@@ -346,6 +2317,25 @@ class ScrapyApp:
             messagebox.showerror("错误", "请选择保存目录")
             return 
         
+        try:
+            options = {
+                'stream_threshold': int(float(self.stream_threshold_entry.get().strip()) * 1024 * 1024),
+                'stream_workers': max(1, int(self.segments_entry.get().strip())),
+                'max_concurrency': max(1, int(self.max_concurrency_entry.get().strip())),
+                'initial_concurrency': max(1, int(self.initial_concurrency_entry.get().strip())),
+                'dedup': self.dedup_var.get(),
+                'output_format': 'warc' if self.warc_var.get() else 'files',
+                'sitemaps': self.sitemap_var.get(),
+                'class_weights': parse_class_values(self.class_weights_entry.get()),
+                'class_budgets': parse_class_values(self.class_budgets_entry.get(), 1024 * 1024),
+                'class_max_sizes': parse_class_values(self.class_max_size_entry.get(), 1024 * 1024),
+                'skip_extensions': parse_extensions(self.skip_ext_entry.get()),
+            }
+            download_delay = max(0.0, float(self.download_delay_entry.get().strip()))
+        except ValueError as e:
+            messagebox.showerror("错误", f"高级设置格式不正确: {e}")
+            return 
+        
         # 创建输出目录 
         try:
             os.makedirs(output_dir, exist_ok=True)
@@ -355,6 +2345,7 @@ class ScrapyApp:
         
         # 禁用按钮防止重复点击 
         self.crawl_button.config(state=tk.DISABLED) 
+        self.cancel_button.config(state=tk.NORMAL) 
         
         # 清空日志 
         self.log_text.config(state=tk.NORMAL) 
@@ -363,77 +2354,733 @@ class ScrapyApp:
         
         # 重置进度条
         self.progress['value'] = 0
+        self.stats_label.config(text="")
         
-        # 在后台运行爬虫 
-        self.root.after(100, lambda: self.run_spider(url, output_dir))
+        self.run_spider(url, output_dir, options, download_delay)
     
     def log_message(self, message):
         self.log_text.config(state=tk.NORMAL) 
         self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END) 
         self.log_text.config(state=tk.DISABLED) 
-        self.root.update() 
     
-    def run_spider(self, url, output_dir):
+    def run_spider(self, url, output_dir, options=None, download_delay=0.5):
+        """在子进程中运行爬虫，Twisted reactor每次都是新的，界面也不会卡住"""
         try:
-            # 配置Scrapy设置 
-            settings = get_project_settings()
-            settings.setdict({ 
-                'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'ROBOTSTXT_OBEY': False,
-                'DOWNLOAD_DELAY': 0.5,
-                'CONCURRENT_REQUESTS': 5,
-                'LOG_LEVEL': 'INFO',
-                'FEED_FORMAT': None,
-                'DEPTH_LIMIT': 3,
-            })
-            
-            # 创建并运行爬虫 
-            process = CrawlerProcess(settings)
-            
-            def log_callback(spider, message):
-                self.log_message(message) 
-            
-            process.crawl( 
-                UniversalSpider,
-                start_url=url,
-                output_dir=output_dir 
+            parent_conn, child_conn = multiprocessing.Pipe()
+            self.crawl_process = multiprocessing.Process(
+                target=crawl_worker,
+                args=(url, output_dir, options or {}, download_delay, child_conn),
+                daemon=True
             )
+            self.crawl_process.start()
+            child_conn.close()
+            self.crawl_conn = parent_conn
+            self.crawl_reason = None
             
             self.log_message(f"开始爬取: {url}")
             self.log_message(f"保存到: {output_dir}")
             
-            # 模拟进度更新
-            self.update_progress()
-            
-            process.start() 
-            
-            self.log_message("爬取完成!")
-            messagebox.showinfo("完成", "爬取任务已完成!")
-            
+            self.root.after(200, self.poll_crawl)
         except Exception as e:
             self.log_message(f"发生错误: {e}")
-            messagebox.showerror("错误", f"爬取过程中发生错误: {e}")
+            messagebox.showerror("错误", f"启动爬虫失败: {e}")
+            self.finish_crawl()
+    
+    def poll_crawl(self):
+        """读取子进程发来的日志和统计，更新界面"""
+        if self.crawl_conn is None:
+            return
         
-        finally:
-            self.crawl_button.config(state=tk.NORMAL) 
-            self.progress['value'] = 100
+        try:
+            while self.crawl_conn.poll():
+                message = self.crawl_conn.recv()
+                kind = message.get('type')
+                if kind == 'log':
+                    self.log_message(message['message'])
+                elif kind in ('stats', 'finished'):
+                    self.update_progress(message)
+                elif kind == 'error':
+                    self.log_message(f"发生错误: {message['message']}")
+                    messagebox.showerror("错误", f"爬取过程中发生错误: {message['message']}")
+                elif kind == 'done':
+                    self.progress['value'] = 100
+                    if self.crawl_reason == 'cancelled':
+                        self.log_message("爬取已停止")
+                    else:
+                        self.log_message("爬取完成!")
+                        messagebox.showinfo("完成", "爬取任务已完成!")
+        except (EOFError, OSError):
+            # 子进程已退出并关闭了管道
+            self.finish_crawl()
+            return
+        
+        if self.crawl_process.is_alive():
+            self.root.after(200, self.poll_crawl)
+        else:
+            self.finish_crawl()
+    
+    def update_progress(self, stats):
+        pages, queue = stats['pages'], stats['queue']
+        # 进度为已完成页面占已发现页面(已完成+排队)的比例
+        if pages + queue:
+            self.progress['value'] = min(99, pages * 100 / (pages + queue))
+        self.stats_label.config(text=(
+            f"页面: {pages} | 流量: {stats['bytes']/1024/1024:.1f}MB | "
+            f"队列: {queue} | 速率: {stats['rate']:.1f}页/秒"
+        ))
+        if stats['type'] == 'finished':
+            self.crawl_reason = stats.get('reason')
+            self.log_message(f"爬虫结束: {self.crawl_reason}")
+    
+    def cancel_crawling(self):
+        if self.crawl_conn is None:
+            return
+        self.log_message("正在停止爬取...")
+        self.cancel_button.config(state=tk.DISABLED)
+        try:
+            self.crawl_conn.send('cancel')
+        except (OSError, ValueError):
+            pass
+        # 子进程没有及时退出时强制结束
+        process = self.crawl_process
+        self.root.after(10000, lambda: self.terminate_crawl(process))
+    
+    def terminate_crawl(self, process):
+        if process is not None and process.is_alive():
+            process.terminate()
+            self.log_message("爬虫进程已强制结束")
     
-    def update_progress(self):
-        current = self.progress['value']
-        if current < 90:  # 不要到100%，留待完成时设置
-            self.progress['value'] = current + 5
-            self.root.after(500, self.update_progress)
+    def finish_crawl(self):
+        if self.crawl_conn is not None:
+            self.crawl_conn.close()
+        self.crawl_conn = None
+        self.crawl_process = None
+        self.crawl_button.config(state=tk.NORMAL) 
+        self.cancel_button.config(state=tk.DISABLED) 
 
-if __name__ == "__main__":
-    # 检查并安装依赖 
+class CrawlJobRunner:
+    """无界面批量爬取: 从队列中取任务，每个任务一个子进程，同时运行的任务数和总并发受全局预算约束"""
+
+    def __init__(self, jobs, max_jobs=2, download_delay=0.5, extra_settings=None,
+                 timeout=None, report_path=None, verbose=False):
+        self.queue = list(jobs)
+        self.max_jobs = max(1, max_jobs)
+        self.download_delay = download_delay
+        self.extra_settings = extra_settings or {}
+        self.timeout = timeout
+        self.report_path = report_path
+        self.verbose = verbose
+        self.running = {}
+        self.results = []
+
+    def run(self):
+        warc_dirs = {os.path.join(job['output_dir'], 'warc') for job in self.queue
+                     if job['options'].get('output_format') == 'warc'}
+        self.queue.reverse()
+        while self.queue or self.running:
+            while self.queue and len(self.running) < self.max_jobs:
+                self.start_job(self.queue.pop())
+            
+            ready = wait_connections(list(self.running), timeout=0.5)
+            for conn in ready:
+                self.read_messages(conn)
+            self.check_jobs()
+        
+        # 共用输出目录的工作进程可能同时关闭，全部结束后再统一归并一次
+        for warc_dir in warc_dirs:
+            if os.path.isdir(warc_dir):
+                merge_cdx(warc_dir)
+        return self.results
+
+    def start_job(self, job):
+        os.makedirs(job['output_dir'], exist_ok=True)
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=crawl_worker,
+            args=(job['url'], job['output_dir'], job['options'], self.download_delay,
+                  child_conn, self.extra_settings),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        
+        job.update({
+            'status': 'running',
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'start_time': time.time(),
+            'stats': {},
+            'cancelled': False
+        })
+        job['process'] = process
+        self.running[parent_conn] = job
+        print(f"[{job['job_id']}] 开始爬取: {job['url'] or '共享队列'} -> {job['output_dir']}")
+
+    def read_messages(self, conn):
+        job = self.running[conn]
+        try:
+            while conn.poll():
+                message = conn.recv()
+                kind = message.get('type')
+                if kind == 'log':
+                    if self.verbose:
+                        print(f"[{job['job_id']}] {message['message']}")
+                elif kind in ('stats', 'finished'):
+                    job['stats'] = message
+                elif kind == 'error':
+                    job['status'] = 'error'
+                    job['error'] = message['message']
+                elif kind == 'done' and job['status'] == 'running':
+                    job['status'] = 'done'
+        except (EOFError, OSError):
+            job['process'].join(timeout=5)
+
+    def check_jobs(self):
+        for conn, job in list(self.running.items()):
+            process = job['process']
+            elapsed = time.time() - job['start_time']
+            if self.timeout and elapsed > self.timeout and process.is_alive():
+                if not job['cancelled']:
+                    # 先请求爬虫正常关闭，宽限期过后再强制结束
+                    job['cancelled'] = True
+                    try:
+                        conn.send('cancel')
+                    except (OSError, ValueError):
+                        pass
+                elif elapsed > self.timeout + 30:
+                    process.terminate()
+            
+            if not process.is_alive():
+                self.read_messages(conn)
+                conn.close()
+                del self.running[conn]
+                self.finish_job(job)
+
+    def finish_job(self, job):
+        process = job.pop('process')
+        stats = job.pop('stats')
+        if job['cancelled']:
+            job['status'] = 'timeout'
+        elif job['status'] == 'running':
+            job['status'] = 'error'
+            job['error'] = f"爬虫进程异常退出(退出码 {process.exitcode})"
+        
+        report = {
+            'job_id': job['job_id'],
+            'url': job['url'],
+            'output_dir': job['output_dir'],
+            'status': job['status'],
+            'reason': stats.get('reason'),
+            'error': job.get('error'),
+            'pages': stats.get('pages', 0),
+            'bytes': stats.get('bytes', 0),
+            'errors': stats.get('errors', 0),
+            'started': job['started'],
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'duration': round(time.time() - job['start_time'], 3),
+            'exit_code': process.exitcode
+        }
+        self.results.append(report)
+        if self.report_path:
+            with open(self.report_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        print(f"[{job['job_id']}] {report['status']}: {report['pages']}页, "
+              f"{report['bytes']/1024/1024:.1f}MB, 用时{report['duration']:.1f}秒")
+
+def read_seed_file(path):
+    """读取种子文件，每行一个URL，#开头为注释"""
+    urls = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+    return urls
+
+def job_output_dir(output_root, layout, index, url):
+    host = re.sub(r'[^\w\-_.]', '_', urlparse(url).netloc) or 'unknown'
+    if layout == 'host':
+        return os.path.join(output_root, host)
+    if layout == 'job':
+        return os.path.join(output_root, f"{index:04d}-{host}")
+    return output_root
+
+class SyntheticSite:
+    """基准测试用的本地合成站点，内容按需生成，不占磁盘
+    
+    /pN.html 链接到fanout个其他页面和assets个图片；首页额外链接一个有segments个TS片段的HLS流
+    和一个可选的大文件(支持Range，走流式分段下载)。服务端统计实际发出的页面数和字节数。
+    """
+
+    def __init__(self, pages=500, fanout=8, assets=2, asset_size=32 * 1024, segments=20,
+                 segment_size=256 * 1024, large_size=0):
+        self.pages = max(1, pages)
+        self.fanout = fanout
+        self.assets = assets
+        self.asset_size = asset_size
+        self.segments = segments
+        self.segment_size = segment_size
+        self.large_size = large_size
+        # 随机块只生成一次，各资源在开头写入自己的路径，避免被内容去重合并
+        self.block = random.Random(0).randbytes(max(asset_size, segment_size, 1024 * 1024))
+        self.lock = threading.Lock()
+        self.served = {'page': 0, 'asset': 0, 'segment': 0, 'large': 0, 'bytes': 0}
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/p0.html"
+
+    def config(self):
+        return {
+            'pages': self.pages, 'fanout': self.fanout, 'assets': self.assets,
+            'asset_size': self.asset_size, 'segments': self.segments,
+            'segment_size': self.segment_size, 'large_size': self.large_size
+        }
+
+    def page(self, index):
+        links = [f'<a href="/p{(index * self.fanout + k) % self.pages}.html">p</a>'
+                 for k in range(1, self.fanout + 1)]
+        links += [f'<img src="/a{index}-{k}.png">' for k in range(self.assets)]
+        if index == 0:
+            if self.segments:
+                links.append('<a href="/hls/stream.m3u8">hls</a>')
+            if self.large_size:
+                links.append('<a href="/large.zip">large</a>')
+        return f"<html><head><title>p{index}</title></head><body>{''.join(links)}</body></html>".encode('utf-8')
+
+    def playlist(self):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0']
+        for k in range(self.segments):
+            lines += ['#EXTINF:4.0,', f'seg{k}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def blob(self, path, size):
+        """长度为size的确定性内容"""
+        head = path.encode('utf-8')
+        return head + self.block[len(head):size]
+
+    def resolve(self, path):
+        """返回(类型, Content-Type, 内容或长度)，不存在时返回None"""
+        match = re.fullmatch(r'/p(\d+)\.html', path)
+        if match and int(match.group(1)) < self.pages:
+            return 'page', 'text/html; charset=utf-8', self.page(int(match.group(1)))
+        if re.fullmatch(r'/a\d+-\d+\.png', path):
+            return 'asset', 'image/png', self.blob(path, self.asset_size)
+        if path == '/hls/stream.m3u8' and self.segments:
+            return 'page', 'application/vnd.apple.mpegurl', self.playlist()
+        match = re.fullmatch(r'/hls/seg(\d+)\.ts', path)
+        if match and int(match.group(1)) < self.segments:
+            return 'segment', 'video/mp2t', self.blob(path, self.segment_size)
+        if path == '/large.zip' and self.large_size:
+            return 'large', 'application/zip', self.large_size
+        return None
+
+    def count(self, kind, size):
+        with self.lock:
+            self.served[kind] += 1
+            self.served['bytes'] += size
+
+    def count_bytes(self, size):
+        with self.lock:
+            self.served['bytes'] += size
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.respond(send_body=False)
+
+            def do_GET(self):
+                self.respond(send_body=True)
+
+            def respond(self, send_body):
+                found = site.resolve(urlparse(self.path).path)
+                if found is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                kind, content_type, body = found
+                if kind != 'large':
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    if send_body:
+                        self.wfile.write(body)
+                        site.count(kind, len(body))
+                    return
+                
+                # 大文件支持Range，分段下载时每个区间单独计数
+                start, end = 0, body - 1
+                match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if match:
+                    start = int(match.group(1))
+                    end = min(end, int(match.group(2))) if match.group(2) else end
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{body}")
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+                if not send_body:
+                    return
+                if start == 0:
+                    site.count('large', 0)
+                block = memoryview(site.block)
+                position = start
+                while position <= end:
+                    offset = position % len(block)
+                    chunk = block[offset:min(len(block), offset + end - position + 1)]
+                    self.wfile.write(chunk)
+                    site.count_bytes(len(chunk))
+                    position += len(chunk)
+
+        return Handler
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+class ProcessSampler:
+    """基准测试期间统计子进程的CPU时间和峰值内存
+    
+    有resource模块时直接读取已回收子进程的rusage；否则用psutil定期采样子进程。
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu = {}
+        self.running = False
+        self.thread = None
+        self.before = None
+
+    def start(self):
+        if resource is not None:
+            self.before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        elif psutil is not None:
+            self.running = True
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+
+    def sample(self):
+        me = psutil.Process()
+        while self.running:
+            total_rss = 0
+            for child in me.children(recursive=True):
+                try:
+                    total_rss += child.memory_info().rss
+                    times = child.cpu_times()
+                    self.cpu[child.pid] = times.user + times.system
+                except psutil.Error:
+                    pass
+            self.peak_rss = max(self.peak_rss, total_rss)
+            time.sleep(self.interval)
+
+    def stop(self):
+        """返回(CPU秒数, 峰值RSS字节数)，无法测量时为None"""
+        if resource is not None:
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu = (after.ru_utime - self.before.ru_utime) + (after.ru_stime - self.before.ru_stime)
+            # Linux上ru_maxrss单位为KB，macOS上为字节
+            rss = after.ru_maxrss if sys.platform == 'darwin' else after.ru_maxrss * 1024
+            return cpu, rss
+        if self.thread is not None:
+            self.running = False
+            self.thread.join()
+            return sum(self.cpu.values()), self.peak_rss
+        return None, None
+
+def benchmark_compare(result, previous, threshold):
+    """与上一次相同配置的结果比较，返回退化超过threshold(%)的指标"""
+    regressions = []
+    # 数值越大越好的指标和越小越好的指标
+    higher = ('pages_per_sec', 'mb_per_sec')
+    lower = ('cpu_ms_per_response', 'peak_rss_mb')
+    for key in higher + lower:
+        old, new = previous.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) * 100.0 / old
+        worse = change < -threshold if key in higher else change > threshold
+        print(f"  {key}: {old} -> {new} ({change:+.1f}%){' 退化' if worse else ''}")
+        if worse:
+            regressions.append(key)
+    return regressions
+
+def run_benchmark(args):
+    site = SyntheticSite(
+        pages=args.pages,
+        fanout=args.fanout,
+        assets=args.assets,
+        asset_size=int(args.asset_size * 1024),
+        segments=args.hls_segments,
+        segment_size=int(args.segment_size * 1024),
+        large_size=int(args.large_size * 1024 * 1024)
+    )
+    site.start()
+    output_dir = tempfile.mkdtemp(prefix='blackwidow-bench-')
+    sampler = ProcessSampler()
+    try:
+        print(f"合成站点: {site.url} ({site.pages}页, 每页{site.fanout}个链接, "
+              f"{site.assets}个资源, HLS {site.segments}段)")
+        runner = CrawlJobRunner(
+            [{'job_id': 'bench', 'url': site.url, 'output_dir': output_dir,
+              'options': crawl_options(args, max(1, args.budget))}],
+            max_jobs=1,
+            download_delay=args.delay,
+            extra_settings={'DEPTH_LIMIT': args.depth, 'LOG_LEVEL': args.log_level},
+            timeout=args.timeout,
+            verbose=args.verbose
+        )
+        sampler.start()
+        report = runner.run()[0]
+        cpu, peak_rss = sampler.stop()
+    finally:
+        site.stop()
+        if args.keep:
+            print(f"抓取结果保留在: {output_dir}")
+        else:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    
+    served = dict(site.served)
+    duration = max(report['duration'], 0.001)
+    requests_served = served['page'] + served['asset'] + served['segment'] + served['large']
+    result = {
+        'label': args.label,
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'status': report['status'],
+        'site': site.config(),
+        'options': {key: value for key, value in vars(args).items()
+                    if key not in ('command', 'output', 'report', 'results', 'label', 'keep', 'verbose',
+                                   'threshold', 'fail_on_regression')
+                    and not callable(value)},
+        'duration': round(duration, 3),
+        'pages': served['page'],
+        'responses': requests_served,
+        'bytes': served['bytes'],
+        'pages_per_sec': round(served['page'] / duration, 2),
+        'mb_per_sec': round(served['bytes'] / 1024 / 1024 / duration, 2),
+        'cpu_seconds': round(cpu, 3) if cpu is not None else None,
+        'cpu_ms_per_response': round(cpu * 1000 / max(1, requests_served), 3) if cpu is not None else None,
+        'peak_rss_mb': round(peak_rss / 1024 / 1024, 1) if peak_rss else None,
+    }
+    print(f"页面: {result['pages']} ({result['pages_per_sec']}/秒), 响应: {result['responses']}, "
+          f"流量: {result['bytes']/1024/1024:.1f}MB ({result['mb_per_sec']}MB/秒), 用时{result['duration']}秒")
+    print(f"CPU: {result['cpu_seconds']}秒 ({result['cpu_ms_per_response']}毫秒/响应), 峰值内存: {result['peak_rss_mb']}MB")
+    
+    # 与同一站点配置、同一参数的上一次结果比较
+    previous = None
+    if os.path.exists(args.results):
+        with open(args.results, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('site') == result['site'] and record.get('options') == result['options']:
+                    previous = record
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    
+    if result['status'] != 'done':
+        return 1
+    if previous is None:
+        print(f"结果已记录到 {args.results}，暂无可比较的历史结果")
+        return 0
+    print(f"与 {previous['time']} ({previous.get('label') or '未命名'}) 比较:")
+    regressions = benchmark_compare(result, previous, args.threshold)
+    return 1 if regressions and args.fail_on_regression else 0
+
+def add_crawl_arguments(parser):
+    parser.add_argument('--output', default=os.path.join(os.getcwd(), "downloads"), help="输出根目录")
+    parser.add_argument('--budget', type=int, default=64, help="所有任务合计的最大并发请求数")
+    parser.add_argument('--max-per-host', type=int, default=32, help="每站最大并发(不超过任务分到的并发份额)")
+    parser.add_argument('--initial-concurrency', type=int, default=4, help="每站初始并发")
+    parser.add_argument('--delay', type=float, default=0.5, help="初始下载延迟(秒)")
+    parser.add_argument('--depth', type=int, default=3, help="最大爬取深度")
+    parser.add_argument('--stream-threshold', type=float, default=8, help="流式下载阈值(MB)")
+    parser.add_argument('--segments', type=int, default=4, help="大文件分段连接数")
+    parser.add_argument('--no-dedup', action='store_true', help="关闭内容去重")
+    parser.add_argument('--sitemaps', action='store_true', help="先从robots.txt和sitemap发现URL(按lastmod排优先级)")
+    parser.add_argument('--write-workers', type=int, default=4, help="写盘线程数")
+    parser.add_argument('--fsync', choices=['none', 'batch', 'always'], default='batch',
+                        help="刷盘策略: none不主动刷盘, batch每批文件刷一次, always每个文件都刷")
+    parser.add_argument('--pack-small', type=float, default=0,
+                        help="小于该大小(KB)的文件打包存入.packs/，0为关闭(仅在关闭去重时生效)")
+    parser.add_argument('--class-weights', default='',
+                        help="各类资源的调度权重, 如 page=8,image=4,hls=2,document=2,media=1")
+    parser.add_argument('--class-budgets', default='', help="各类资源的总下载量上限(MB), 如 media=2048,image=512")
+    parser.add_argument('--class-max-size', default='', help="各类资源的单文件大小上限(MB), 如 media=500")
+    parser.add_argument('--skip-ext', default='', help="不下载的扩展名, 逗号分隔, 如 .iso,.exe")
+    parser.add_argument('--format', choices=['files', 'warc'], default='files',
+                        help="输出格式: files按文件保存, warc写入warc/目录下的.warc.gz并生成CDX索引")
+    parser.add_argument('--warc-size', type=float, default=1024, help="单个WARC文件的滚动大小(MB)")
+    parser.add_argument('--timeout', type=float, help="单个任务的最长运行时间(秒)")
+    parser.add_argument('--report', help="任务报告输出文件(JSON Lines)")
+    parser.add_argument('--log-level', default='WARNING', help="Scrapy日志级别")
+    parser.add_argument('-v', '--verbose', action='store_true', help="输出爬虫日志")
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="黑寡妇 - 全能网络爬虫 (命令行模式)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    crawl = subparsers.add_parser('crawl', help="批量爬取一个或多个站点")
+    crawl.add_argument('urls', nargs='*', help="起始网址")
+    crawl.add_argument('--seeds', help="种子文件，每行一个网址")
+    crawl.add_argument('--layout', choices=['host', 'job', 'flat'], default='host',
+                       help="输出布局: host按域名分目录, job按任务分目录, flat全部放在输出根目录")
+    crawl.add_argument('--jobs', type=int, default=2, help="同时运行的爬取任务数")
+    crawl.add_argument('--frontier', help="分布式模式的共享队列, 如 sqlite:///frontier.db 或 redis://host:6379/0")
+    crawl.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="分布式模式下本机启动的工作进程数")
+    add_crawl_arguments(crawl)
+    
+    worker = subparsers.add_parser('worker', help="加入已有的分布式爬取(在其他机器上运行)")
+    worker.add_argument('--frontier', required=True, help="共享队列地址")
+    worker.add_argument('--worker-id', type=int, default=0, help="本机第一个工作进程的编号")
+    worker.add_argument('--processes', type=int, default=os.cpu_count() or 2, help="本机启动的工作进程数")
+    worker.add_argument('--workers', type=int, required=True, help="整个集群的工作进程总数")
+    add_crawl_arguments(worker)
+    
+    bench = subparsers.add_parser('bench', help="在本地合成站点上测量爬取吞吐量")
+    bench.add_argument('--pages', type=int, default=500, help="页面数")
+    bench.add_argument('--fanout', type=int, default=8, help="每页链接到的其他页面数")
+    bench.add_argument('--assets', type=int, default=2, help="每页图片数")
+    bench.add_argument('--asset-size', type=float, default=32, help="图片大小(KB)")
+    bench.add_argument('--hls-segments', type=int, default=20, help="HLS流的TS片段数，0为不生成")
+    bench.add_argument('--segment-size', type=float, default=256, help="TS片段大小(KB)")
+    bench.add_argument('--large-size', type=float, default=0, help="首页链接的大文件大小(MB)，0为不生成")
+    bench.add_argument('--results', default='bench_results.jsonl', help="基准结果文件(JSON Lines)，用于回归比较")
+    bench.add_argument('--label', default='', help="本次结果的标签，如修改说明")
+    bench.add_argument('--threshold', type=float, default=10, help="判定为退化的变化百分比")
+    bench.add_argument('--fail-on-regression', action='store_true', help="有指标退化时以非零状态退出")
+    bench.add_argument('--keep', action='store_true', help="保留抓取结果目录")
+    add_crawl_arguments(bench)
+    # 基准测试默认不限速，深度足够覆盖整个站点
+    bench.set_defaults(delay=0, depth=100)
+    return parser
+
+def crawl_options(args, concurrent_requests):
+    """concurrent_requests是单个任务分到的并发份额，各任务之和不超过--budget"""
+    max_concurrency = max(1, min(args.max_per_host, concurrent_requests))
+    return {
+        'stream_threshold': int(args.stream_threshold * 1024 * 1024),
+        'stream_workers': max(1, args.segments),
+        'concurrent_requests': concurrent_requests,
+        'max_concurrency': max_concurrency,
+        'initial_concurrency': min(args.initial_concurrency, max_concurrency),
+        'dedup': not args.no_dedup,
+        'write_workers': max(1, args.write_workers),
+        'fsync': args.fsync,
+        'pack_small': int(args.pack_small * 1024),
+        'output_format': args.format,
+        'sitemaps': args.sitemaps,
+        'class_weights': parse_class_values(args.class_weights),
+        'class_budgets': parse_class_values(args.class_budgets, 1024 * 1024),
+        'class_max_sizes': parse_class_values(args.class_max_size, 1024 * 1024),
+        'skip_extensions': parse_extensions(args.skip_ext),
+        'warc_max_size': int(args.warc_size * 1024 * 1024),
+    }
+
+def run_jobs(args, jobs, max_jobs):
+    runner = CrawlJobRunner(
+        jobs,
+        max_jobs=max_jobs,
+        download_delay=args.delay,
+        extra_settings={'DEPTH_LIMIT': args.depth, 'LOG_LEVEL': args.log_level},
+        timeout=args.timeout,
+        report_path=args.report,
+        verbose=args.verbose
+    )
+    results = runner.run()
+    
+    failed = [r for r in results if r['status'] != 'done']
+    print(f"全部完成: {len(results) - len(failed)}/{len(results)} 个任务成功")
+    return 1 if failed else 0
+
+def worker_jobs(args, frontier_uri, first_id, processes, num_workers):
+    """分布式模式下每个工作进程作为一个任务，共用输出目录"""
+    options = crawl_options(args, max(1, args.budget // processes))
+    return [{
+        'job_id': f"worker-{worker_id}",
+        'url': None,
+        'output_dir': args.output,
+        'options': dict(options, frontier=frontier_uri, worker_id=worker_id, num_workers=num_workers)
+    } for worker_id in range(first_id, first_id + processes)]
+
+def main_cli(argv):
+    args = build_arg_parser().parse_args(argv)
     try:
-        import scrapy 
-        import m3u8 
-        import requests 
-    except ImportError:
-        print("正在安装所需依赖...")
-        subprocess.check_call(["pip", "install", "scrapy", "m3u8", "requests", "tk"])
+        crawl_options(args, 1)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    
+    if args.command == 'bench':
+        return run_benchmark(args)
+    
+    if args.command == 'worker':
+        jobs = worker_jobs(args, args.frontier, args.worker_id, max(1, args.processes), args.workers)
+        return run_jobs(args, jobs, len(jobs))
+    
+    urls = list(args.urls)
+    if args.seeds:
+        urls.extend(read_seed_file(args.seeds))
+    if not urls:
+        print("错误: 请提供起始网址或种子文件", file=sys.stderr)
+        return 2
+    
+    if args.frontier:
+        # 把种子和允许的域名写入共享队列，再启动本机的工作进程
+        frontier = open_frontier(args.frontier)
+        allowed = sorted(set(frontier.get_meta('allowed_domains', [])) | {url_hostname(url) for url in urls})
+        frontier.set_meta('allowed_domains', allowed)
+        frontier.add((url, 'page', 0, 100) for url in urls)
+        if args.sitemaps:
+            frontier.add((robots_url(url), 'robots', 0, 200) for url in urls)
+        processes = max(1, args.workers)
+        return run_jobs(args, worker_jobs(args, args.frontier, 0, processes, processes), processes)
+    
+    # 全局并发预算平均分给同时运行的任务
+    max_jobs = max(1, min(args.jobs, len(urls)))
+    options = crawl_options(args, max(1, args.budget // max_jobs))
+    jobs = [{
+        'job_id': f"{index:04d}",
+        'url': url,
+        'output_dir': job_output_dir(args.output, args.layout, index, url),
+        'options': dict(options)
+    } for index, url in enumerate(urls)]
+    return run_jobs(args, jobs, max_jobs)
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    
+    # 带参数时以命令行模式运行，适合在无界面服务器上由cron调度
+    if len(sys.argv) > 1:
+        sys.exit(main_cli(sys.argv[1:]))
+    
+    if tk is None:
+        print("当前环境没有tkinter，请使用命令行模式，例如: crawl --seeds seeds.txt", file=sys.stderr)
+        sys.exit(2)
     
     # 运行GUI应用 
     root = tk.Tk()